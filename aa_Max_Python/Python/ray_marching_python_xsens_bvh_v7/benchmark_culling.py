@@ -0,0 +1,107 @@
+"""
+Measures the gpu time per frame of the same scene with and without the bounding sphere culling of primitives in sceneSDF
+and the screen tile binning of primitives in sceneSDF_surface.
+
+Uses an offscreen OpenGL context, so no window is opened. The scene is a random but fixed pose with spheres on the joints,
+capsules on the edges and rounded boxes as objects, rendered at full resolution.
+"""
+
+import json
+
+import numpy as np
+import OpenGL.GL as gl
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QOffscreenSurface, QOpenGLContext, QOpenGLFramebufferObject
+from PyQt5.QtCore import QSize
+
+from skeleton import Skeleton
+from visualization import Visualization
+from frame_profiler import FrameProfiler
+
+frame_count = 200
+frame_size = [1280, 720]
+object_count = 10
+
+def setup_scene(skeleton, jointSourceCount):
+
+    rng = np.random.default_rng(0)
+
+    positions = rng.uniform(-0.8, 0.8, (jointSourceCount, 3))
+    rotations = rng.normal(size=(jointSourceCount, 4))
+    rotations /= np.linalg.norm(rotations, axis=1)[:, np.newaxis]
+
+    skeleton.stageJointPositions(positions)
+    skeleton.stageJointRotations(rotations)
+    skeleton.commitPose()
+
+def frame_times(skeleton, vertex_code, fragment_code, culling, tiles):
+
+    visualization = Visualization(skeleton, vertex_code, fragment_code, object_count)
+    visualization.programCache = None
+    visualization.dynamicResolution = False
+    visualization.primitiveCulling = culling
+    visualization.tileBinning = tiles
+    visualization.resolution = [float(frame_size[0]), float(frame_size[1])]
+    visualization.profiler = FrameProfiler(frame_count)
+
+    visualization.setCamPosition(np.array([3.0, 3.0, 0.0]))
+    visualization.setJointPrimitives(0)
+    visualization.setJointSizes(np.array([0.05, 0.05, 0.05]))
+    visualization.setEdgePrimitives(2)
+    visualization.setEdgeSizes(np.array([0.03, 0.03, 1.0]))
+    visualization.setObjectPrimitives(1)
+    visualization.setObjectSizes(np.array([0.2, 0.2, 0.2]))
+
+    for oI in range(object_count):
+        angle = 2.0 * np.pi * oI / object_count
+        visualization.setObjectPosition(oI, np.array([np.cos(angle) * 1.5, np.sin(angle) * 1.5, 0.0]))
+
+    visualization.setupShader(gl)
+
+    for fI in range(frame_count):
+        visualization.render(gl)
+        gl.glFinish()
+
+    # the query of the last frame is read by one more render
+    visualization.render(gl)
+    gl.glFinish()
+
+    gl.glDeleteProgram(visualization.program)
+
+    return visualization.profiler.getStats()["gpu"]
+
+if __name__ == '__main__':
+
+    app = QApplication([])
+
+    surface = QOffscreenSurface()
+    surface.create()
+
+    context = QOpenGLContext()
+    context.create()
+    context.makeCurrent(surface)
+
+    framebuffer = QOpenGLFramebufferObject(QSize(frame_size[0], frame_size[1]))
+    framebuffer.bind()
+    gl.glViewport(0, 0, frame_size[0], frame_size[1])
+
+    print("renderer", gl.glGetString(gl.GL_RENDERER).decode(), gl.glGetString(gl.GL_VERSION).decode())
+
+    with open("joint_settings.json") as f:
+        joint_settings = json.load(f)
+
+    skeleton = Skeleton(joint_settings["jointFilter"], joint_settings["jointConnectivity"], joint_settings.get("jointPreRotations"), joint_settings.get("edgePreRotations"))
+    setup_scene(skeleton, max(joint_settings["jointFilter"]) + 1)
+
+    with open("shaderVert.glsl") as f:
+        vertex_code = f.read()
+
+    with open("shaderFrag.glsl") as f:
+        fragment_code = f.read()
+
+    for culling, tiles in [(False, False), (True, False), (True, True)]:
+        p50, p95, p99, maxTime = frame_times(skeleton, vertex_code, fragment_code, culling, tiles)
+        print("culling %-5s tiles %-5s gpu p50 %7.2f  p95 %7.2f  p99 %7.2f  max %7.2f ms" % (culling, tiles, p50, p95, p99, maxTime))
+
+    framebuffer.release()
+    context.doneCurrent()
@@ -0,0 +1,97 @@
+"""
+Measures per-packet latency and jitter of the OSC ingest backends of OscControl.
+
+Sends a mocap-like stream (joint positions, joint rotations and a burst of /vis/* messages per frame)
+to each backend over localhost and timestamps a /bench/ping message at the end of every frame.
+Latency is the time from sending a ping until its handler runs, jitter is the spread of that latency.
+"""
+
+import json
+import time
+import numpy as np
+
+from pythonosc import udp_client
+from pythonosc import osc_message_builder
+
+from skeleton import Skeleton
+from osc_control import OscControl
+
+backends = ["thread", "blocking", "asyncio"]
+address = "127.0.0.1"
+port = 9107
+frame_rate = 240.0
+duration = 5.0
+vis_messages_per_frame = 8
+joint_count = 27
+
+class NullVisualization():
+    """
+    Accepts every Visualization setter without doing anything
+    """
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+def build_ping():
+
+    builder = osc_message_builder.OscMessageBuilder(address="/bench/ping")
+    builder.add_arg(time.perf_counter(), arg_type=osc_message_builder.OscMessageBuilder.ARG_TYPE_DOUBLE)
+    return builder.build()
+
+def run_backend(backend, skeleton, port):
+
+    latencies = []
+
+    def on_ping(address, *args):
+        latencies.append(time.perf_counter() - args[0])
+
+    oscControl = OscControl(skeleton, NullVisualization(), address, port, backend)
+    oscControl.dispatcher.map("/bench/ping", on_ping)
+    oscControl.start()
+
+    time.sleep(0.2)
+
+    client = udp_client.SimpleUDPClient(address, port)
+
+    positions = np.random.rand(joint_count * 3).tolist()
+    rotations = np.random.rand(joint_count * 4).tolist()
+
+    frame_count = int(duration * frame_rate)
+    frame_interval = 1.0 / frame_rate
+    next_frame_time = time.perf_counter()
+
+    for fI in range(frame_count):
+
+        client.send_message("/mocap/joint/pos_world", positions)
+        client.send_message("/mocap/joint/rot_world", rotations)
+
+        for vI in range(vis_messages_per_frame):
+            client.send_message("/vis/jointcolor", [1.0, 1.0, 1.0])
+
+        client.send(build_ping())
+
+        next_frame_time += frame_interval
+        time.sleep(max(next_frame_time - time.perf_counter(), 0.0))
+
+    time.sleep(0.5)
+    oscControl.stop()
+
+    return np.array(latencies) * 1000.0, frame_count
+
+if __name__ == '__main__':
+
+    with open("joint_settings.json") as f:
+        joint_settings = json.load(f)
+
+    skeleton = Skeleton(joint_settings["jointFilter"], joint_settings["jointConnectivity"], joint_settings.get("jointPreRotations"), joint_settings.get("edgePreRotations"))
+
+    print("%d frames/s, %d packets per frame" % (frame_rate, vis_messages_per_frame + 3))
+    print("backend    received  mean ms   p50 ms   p99 ms   max ms   jitter (std) ms")
+
+    for bI, backend in enumerate(backends):
+
+        latencies, frame_count = run_backend(backend, skeleton, port + bI)
+
+        print("%-10s %4d/%-4d %8.3f %8.3f %8.3f %8.3f %8.3f" % (backend, latencies.shape[0], frame_count,
+                                                                np.mean(latencies), np.percentile(latencies, 50), np.percentile(latencies, 99),
+                                                                np.max(latencies), np.std(latencies)))
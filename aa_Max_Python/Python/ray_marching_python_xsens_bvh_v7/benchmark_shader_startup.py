@@ -0,0 +1,88 @@
+"""
+Measures the time from setupShader until the first frame is drawn, with an empty (cold) and a filled (warm) program binary cache.
+
+Uses an offscreen OpenGL context, so no window is opened. The cold run compiles the shaders from source
+and stores the linked binary, the warm runs load it with glProgramBinary.
+"""
+
+import json
+import shutil
+import tempfile
+import time
+
+import OpenGL.GL as gl
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QOffscreenSurface, QOpenGLContext, QOpenGLFramebufferObject
+from PyQt5.QtCore import QSize
+
+from skeleton import Skeleton
+from visualization import Visualization
+from program_cache import ProgramCache
+
+warm_runs = 3
+frame_size = [1280, 720]
+
+def startup_time(skeleton, vertex_code, fragment_code, cache_directory):
+
+    visualization = Visualization(skeleton, vertex_code, fragment_code)
+    visualization.programCache = ProgramCache(cache_directory)
+    visualization.resolution = [float(frame_size[0]), float(frame_size[1])]
+
+    start_time = time.perf_counter()
+
+    visualization.setupShader(gl)
+    visualization.render(gl)
+
+    # drivers may defer compilation until the first draw, wait for it to finish
+    gl.glFinish()
+
+    elapsed_time = time.perf_counter() - start_time
+
+    gl.glDeleteProgram(visualization.program)
+
+    return elapsed_time
+
+if __name__ == '__main__':
+
+    app = QApplication([])
+
+    surface = QOffscreenSurface()
+    surface.create()
+
+    context = QOpenGLContext()
+    context.create()
+    context.makeCurrent(surface)
+
+    framebuffer = QOpenGLFramebufferObject(QSize(frame_size[0], frame_size[1]))
+    framebuffer.bind()
+    gl.glViewport(0, 0, frame_size[0], frame_size[1])
+
+    print("renderer", gl.glGetString(gl.GL_RENDERER).decode(), gl.glGetString(gl.GL_VERSION).decode())
+
+    with open("joint_settings.json") as f:
+        joint_settings = json.load(f)
+
+    skeleton = Skeleton(joint_settings["jointFilter"], joint_settings["jointConnectivity"], joint_settings.get("jointPreRotations"), joint_settings.get("edgePreRotations"))
+
+    with open("shaderVert.glsl") as f:
+        vertex_code = f.read()
+
+    with open("shaderFrag.glsl") as f:
+        fragment_code = f.read()
+
+    if ProgramCache().isSupported(gl) == False:
+        print("program binaries are not supported by this context, warm start equals cold start")
+
+    cache_directory = tempfile.mkdtemp()
+
+    try:
+        cold_time = startup_time(skeleton, vertex_code, fragment_code, cache_directory)
+        warm_times = [startup_time(skeleton, vertex_code, fragment_code, cache_directory) for rI in range(warm_runs)]
+    finally:
+        shutil.rmtree(cache_directory)
+
+    print("cold start %8.3f s" % cold_time)
+    print("warm start %8.3f s (best of %d)" % (min(warm_times), warm_runs))
+
+    framebuffer.release()
+    context.doneCurrent()
@@ -0,0 +1,127 @@
+import functools
+import numpy as np
+
+# radius of the root of a tree without primitives, the shader never enters it
+empty_radius = -1.0e30
+
+# radius given to primitives without a known bound, such as the fractals, they are never skipped
+unbounded_radius = 1.0e30
+
+def bounding_spheres(transforms, primitives, sizes, roundings, sphereRadii, padding, out):
+    """
+    Expects the fields of all primitives of one kind: transforms (count, 4, 4) as stored in a PrimitiveBuffer,
+    primitive types, sizes (count, 3) with the height of capsules and cylinders in z, roundings,
+    the radii of spheres and the padding added to each radius
+    Writes into out (count, 4) the world position of the center and the radius of a sphere around each primitive
+    """
+
+    # the transforms map world to primitive space and are rigid, the center is the inverse transform of the origin
+    # (stored transposed, so the rotation part holds the inverse rotation and row 3 the translation)
+    np.einsum("nij,nj->ni", transforms[:, :3, :3], transforms[:, 3, :3], out=out[:, :3])
+    out[:, :3] *= -1.0
+
+    # the shader shrinks the shapes by the signed rounding and grows the result by it again,
+    # so a negative rounding enlarges the inner shape and insets the surface from it
+    inflations = np.maximum(roundings, 0.0)
+
+    boxRadii = np.linalg.norm(np.maximum((sizes - roundings[:, np.newaxis]) / 2.0, 0.0), axis=1) + inflations
+    capsuleRadii = np.abs(sizes[:, 2] - roundings) / 2.0 + np.maximum(sizes[:, 0] + roundings, 0.0)
+    cylinderRadii = np.hypot(np.maximum(sizes[:, 0] - roundings, 0.0), np.maximum(sizes[:, 2] - roundings, 0.0) / 2.0) + inflations
+
+    # radius of each primitive type in rows 0-3, row 4 for all other types
+    shapeRadii = np.stack((np.abs(sphereRadii), boxRadii, capsuleRadii, cylinderRadii, np.full(primitives.shape[0], unbounded_radius)))
+    shapeIndices = np.where((primitives >= 0) & (primitives <= 3), primitives, 4).astype(np.int64)
+
+    out[:, 3] = shapeRadii[shapeIndices, np.arange(primitives.shape[0])] + padding
+
+@functools.lru_cache(maxsize=None)
+def sphere_tree_layout(leafCount):
+    """
+    Shape of the tree over leafCount leaves, each level pairs neighbouring nodes of the level below,
+    a node without partner moves up as it is. Nodes are numbered from the root, level by level.
+    Returns links (nodeCount, 2) node indices of the children (-1 for leaves), leafNodes (leafCount,) node index of each leaf,
+    memberLeaves: the leaves below each node, one node after the other, memberNodes: the node of each entry of memberLeaves
+    and memberStarts (nodeCount,) the first entry of each node in memberLeaves
+    """
+
+    # nodes as [first leaf, last leaf + 1, children]
+    level = [[lI, lI + 1, []] for lI in range(leafCount)]
+    leaves = list(level)
+
+    while len(level) > 1:
+        parents = [[level[nI][0], level[nI + 1][1], [level[nI], level[nI + 1]]] for nI in range(0, len(level) - 1, 2)]
+
+        if len(level) % 2 == 1:
+            parents.append(level[-1])
+
+        level = parents
+
+    order = level
+    for node in order:
+        order.extend(node[2])
+
+    nodeIndices = {id(node): nI for nI, node in enumerate(order)}
+
+    links = np.full((len(order), 2), -1, dtype=np.int64)
+
+    for nI, node in enumerate(order):
+        for cI, child in enumerate(node[2]):
+            links[nI, cI] = nodeIndices[id(child)]
+
+    leafNodes = np.array([nodeIndices[id(leaf)] for leaf in leaves], dtype=np.int64)
+
+    memberLeaves = np.concatenate([np.arange(node[0], node[1]) for node in order])
+    memberNodes = np.concatenate([np.full(node[1] - node[0], nI) for nI, node in enumerate(order)])
+    memberStarts = np.cumsum([0] + [node[1] - node[0] for node in order[:-1]])
+
+    return links, leafNodes, memberLeaves, memberNodes, memberStarts
+
+def build_sphere_tree(bounds, primitiveIndices, nodes, first, leaves=None):
+    """
+    Builds a binary tree of bounding spheres over some primitives, leaves are ordered by primitive index,
+    so walking the tree left to right blends the primitives in the same order as a loop over all of them
+    Expects bounds (count, 4) of all primitives, the indices of the primitives that go into the tree,
+    nodes (nodeCount, 2, 4): texel 0 the sphere, texel 1 the node indices of the children and the primitive index of leaves (-1 for none)
+    and the index of the first node of the tree in nodes
+    Writes the tree into nodes starting with the root at first and, if leaves (count,) is given, the node index of each primitive's leaf (-1 for none)
+    Returns the number of nodes written, 2 * len(primitiveIndices) - 1 or 1 for an empty tree
+    """
+
+    if leaves is not None:
+        leaves[:] = -1
+
+    if primitiveIndices.shape[0] == 0:
+        nodes[first, 0] = [0.0, 0.0, 0.0, empty_radius]
+        nodes[first, 1] = [-1.0, -1.0, -1.0, 0.0]
+        return 1
+
+    primitiveIndices = np.sort(primitiveIndices)
+    links, leafNodes, memberLeaves, memberNodes, memberStarts = sphere_tree_layout(primitiveIndices.shape[0])
+
+    leafSpheres = bounds[primitiveIndices].astype(np.float64)
+    leafCenters = leafSpheres[:, :3]
+    leafRadii = leafSpheres[:, 3]
+
+    # each node is centered on the box around the spheres of its leaves and contains all of them,
+    # so its distance is never more than the distance to any of them
+    lower = np.minimum.reduceat((leafCenters - leafRadii[:, np.newaxis])[memberLeaves], memberStarts, axis=0)
+    upper = np.maximum.reduceat((leafCenters + leafRadii[:, np.newaxis])[memberLeaves], memberStarts, axis=0)
+    centers = (lower + upper) / 2.0
+
+    radii = np.linalg.norm(leafCenters[memberLeaves] - centers[memberNodes], axis=1) + leafRadii[memberLeaves]
+    radii = np.maximum.reduceat(radii, memberStarts)
+
+    treeNodes = nodes[first:first + links.shape[0]]
+    treeNodes[:, 0, :3] = centers
+    treeNodes[:, 0, 3] = radii
+    treeNodes[leafNodes, 0] = leafSpheres
+
+    treeNodes[:, 1, :2] = np.where(links >= 0, links + first, -1)
+    treeNodes[:, 1, 2] = -1.0
+    treeNodes[leafNodes, 1, 2] = primitiveIndices
+    treeNodes[:, 1, 3] = 0.0
+
+    if leaves is not None:
+        leaves[primitiveIndices] = leafNodes + first
+
+    return links.shape[0]
@@ -106,10 +106,69 @@ def qnormalize_np(q):
     
     return q_norm
 
-def qmul_np(q, r):
-    q = torch.from_numpy(q).contiguous()
-    r = torch.from_numpy(r).contiguous()
-    return qmul(q, r).numpy()
+def qmul_np(q, r, out=None):
+    """
+    Multiply quaternion(s) q with quaternion(s) r
+    Expects two arrays of shape (*, 4) that broadcast against each other
+    Returns q*r as an array of shape (*, 4), written into out if given
+    """
+    assert q.shape[-1] == 4
+    assert r.shape[-1] == 4
+
+    q0, q1, q2, q3 = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    r0, r1, r2, r3 = r[..., 0], r[..., 1], r[..., 2], r[..., 3]
+
+    w = q0 * r0 - q1 * r1 - q2 * r2 - q3 * r3
+    x = q0 * r1 + q1 * r0 + q2 * r3 - q3 * r2
+    y = q0 * r2 - q1 * r3 + q2 * r0 + q3 * r1
+    z = q0 * r3 + q1 * r2 - q2 * r1 + q3 * r0
+
+    if out is None:
+        out = np.empty(np.broadcast(q, r).shape, dtype=np.result_type(q, r))
+
+    out[..., 0] = w
+    out[..., 1] = x
+    out[..., 2] = y
+    out[..., 3] = z
+
+    return out
+
+def quat2mat_np(q, out=None):
+    """
+    Convert quaternion(s) q to rotation matrices.
+    Expects an array of shape (*, 4), quaternions don't need to be unit length
+    Returns an array of shape (*, 3, 3), written into out if given
+    Matches transforms3d.quaternions.quat2mat, including the identity for zero quaternions
+    """
+    assert q.shape[-1] == 4
+
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+    Nq = w * w + x * x + y * y + z * z
+    s = np.divide(2.0, Nq, out=np.zeros_like(Nq), where=Nq >= np.finfo(np.float64).eps)
+
+    X = x * s
+    Y = y * s
+    Z = z * s
+
+    wX = w * X; wY = w * Y; wZ = w * Z
+    xX = x * X; xY = x * Y; xZ = x * Z
+    yY = y * Y; yZ = y * Z; zZ = z * Z
+
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3, 3), dtype=q.dtype)
+
+    out[..., 0, 0] = 1.0 - (yY + zZ)
+    out[..., 0, 1] = xY - wZ
+    out[..., 0, 2] = xZ + wY
+    out[..., 1, 0] = xY + wZ
+    out[..., 1, 1] = 1.0 - (xX + zZ)
+    out[..., 1, 2] = yZ - wX
+    out[..., 2, 0] = xZ - wY
+    out[..., 2, 1] = yZ + wX
+    out[..., 2, 2] = 1.0 - (xX + yY)
+
+    return out
 
 def qrot_np(q, v):
     q = torch.from_numpy(q).contiguous()
@@ -237,65 +296,85 @@ def slerp(q0, q1, amount=0.5):
     qr = qnormalize_np(qr)
     return qr
 
-def slerp_np(q0, q1, amount=0.5):
+def slerp_np(q0, q1, amount=0.5, out=None, scratch=None):
+    """
+    Spherical linear interpolation between arrays of quaternions.
+    Expects q0 and q1 of shape (*, 4) and amount as a scalar or an array of shape (*) holding one weight per quaternion.
+    out and scratch are optional C-contiguous arrays of shape (*, 4), scratch holds the weighted q1 and must not be an input or out.
+    Returns an array of shape (*, 4), written into out if given. out may be q0 or q1 itself.
+    With out and scratch given only per-quaternion coefficients are allocated.
+    """
     orig_shape = q0.shape
 
     q0 = np.reshape(q0, (-1, 4))
     q1 = np.reshape(q1, (-1, 4))
-
     
+    if out is None:
+        out = np.empty(orig_shape, dtype=np.result_type(q0, q1))
+    elif not out.flags.c_contiguous:
+        # reshaping would copy and the result would never reach out
+        raise ValueError("slerp_np out must be C-contiguous")
+        
+    if scratch is None:
+        scratch = np.empty(q0.shape, dtype=out.dtype)
+    elif not scratch.flags.c_contiguous:
+        raise ValueError("slerp_np scratch must be C-contiguous")
+        
+    qr = np.reshape(out, (-1, 4))
+    qs = np.reshape(scratch, (-1, 4))
+
     # Ensure quaternion inputs are unit quaternions and 0 <= amount <=1
-    q0 = qnormalize_np(q0)
-    q1 = qnormalize_np(q1)
+    norm0 = np.sqrt(np.einsum('ij,ij->i', q0, q0))
+    norm0 += 0.000001
+    norm1 = np.sqrt(np.einsum('ij,ij->i', q1, q1))
+    norm1 += 0.000001
 
-    amount = np.clip(amount, 0, 1)
-    
-    dot = np.sum(np.multiply(q0, q1), axis=1)
+    amount = np.clip(np.reshape(amount, -1), 0, 1)
 
+    dot = np.einsum('ij,ij->i', q0, q1)
+    dot /= norm0
+    dot /= norm1
 
     # If the dot product is negative, slerp won't take the shorter path.
     # Note that v1 and -v1 are equivalent when the negation is applied to all four components.
     # Fix by reversing one quaternion
-    negdot = dot > 0.0
-    negdot = negdot.astype(np.float32)
-    negdot = negdot * 2.0 - 1.0
-    dot = dot * negdot
-    
-    negdot = np.expand_dims(negdot, axis=1)
-
-    
-    negdot = np.repeat(negdot, 4, axis=1)
+    s0 = np.where(dot < 0.0, -1.0, 1.0)
+    np.abs(dot, out=dot)
 
-    
-    q0 = q0 * negdot
-
-    # sin_theta_0 can not be zero
+    # sin_theta_0 can not be zero, fall back to linear interpolation for nearly identical quaternions
     bigdot = dot > 0.9995
-    bigdot = bigdot.astype(np.float32)
-    bigqr = q0 + (q1 - q0) * np.repeat(np.reshape(amount, (-1, 1)), 4, axis=1)
-    bigqr = qnormalize_np(bigqr)
-    dot = np.clip(dot, float('-inf'), 0.9995)
-    theta_0 = np.arccos(dot)
+    
+    theta_0 = np.arccos(np.minimum(dot, 0.9995))
     sin_theta_0 = np.sin(theta_0)
     
     theta = theta_0 * amount
-    sin_theta = np.sin(theta)
-    
-    s0 = np.cos(theta) - dot * sin_theta / sin_theta_0
-    s0 = np.repeat(np.reshape(s0, (-1, 1)), 4, axis=1)
     
-    s1 = sin_theta / sin_theta_0
-    s1 = np.repeat(np.reshape(s1, (-1, 1)), 4, axis=1)
+    s1 = np.sin(theta)
+    s1 /= sin_theta_0
     
-    smallqr = (s0 * q0) + (s1 * q1)
-    invbigdot = np.ones_like(bigdot) - bigdot
+    c0 = np.cos(theta)
+    c0 -= dot * s1
     
-    qr = bigqr * np.repeat(np.reshape(bigdot, (-1, 1)), 4, axis=1) + smallqr * np.repeat(np.reshape(invbigdot, (-1, 1)), 4, axis=1)
-    qr = qnormalize_np(qr)
+    np.copyto(c0, 1.0 - amount, where=bigdot)
+    np.copyto(s1, amount, where=bigdot)
+
+    # fold sign flip and input normalization into the two blend coefficients
+    s0 *= c0
+    s0 /= norm0
+    s1 /= norm1
+
+    # q1 is read before out is written, so out may alias either input
+    np.multiply(q1, s1[:, np.newaxis], out=qs)
+    np.multiply(q0, s0[:, np.newaxis], out=qr)
+    qr += qs
     
-    qr = np.reshape(qr, orig_shape)
+    # the input norms are no longer needed, norm0 holds the norms of the result
+    np.einsum('ij,ij->i', qr, qr, out=norm0)
+    np.sqrt(norm0, out=norm0)
+    norm0 += 0.000001
+    qr /= norm0[:, np.newaxis]
     
-    return qr
+    return out
 
 def slerp2(q0, q1, amount):
     
@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+t3d_quaternions = pytest.importorskip("transforms3d.quaternions")
+
+from common.quaternion import qmul, qmul_np, quat2mat_np, slerp, slerp_np
+
+def random_quaternions(rng, count):
+    q = rng.normal(size=(count, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+def rotated_quaternions(rng, q, angle):
+    """
+    Returns q rotated by angle about random axes, the dot product of each with its quaternion in q is cos(angle / 2)
+    """
+
+    axes = rng.normal(size=(q.shape[0], 3))
+    axes /= np.linalg.norm(axes, axis=1)[:, np.newaxis]
+    r = np.concatenate((np.full((q.shape[0], 1), np.cos(angle / 2.0)), axes * np.sin(angle / 2.0)), axis=1)
+
+    return qmul_np(q, r)
+
+def slerp_reference(q0, q1, amounts):
+    return np.stack([slerp(q0[qI], q1[qI], amounts[qI]) for qI in range(q0.shape[0])])
+
+def test_qmul_np_matches_qmul():
+    rng = np.random.default_rng(0)
+    q = rng.normal(size=(64, 4))
+    r = rng.normal(size=(64, 4))
+
+    expected = qmul(torch.from_numpy(q), torch.from_numpy(r)).numpy()
+
+    assert np.allclose(qmul_np(q, r), expected, atol=1e-12)
+
+def test_qmul_np_broadcasts():
+    rng = np.random.default_rng(1)
+    q = rng.normal(size=(5, 7, 4))
+    r = rng.normal(size=(7, 4))
+
+    expected = qmul(torch.from_numpy(q.reshape(-1, 4)), torch.from_numpy(np.tile(r, (5, 1)))).numpy().reshape(5, 7, 4)
+
+    assert np.allclose(qmul_np(q, r), expected, atol=1e-12)
+
+@pytest.mark.parametrize("aliased", ["q", "r"])
+def test_qmul_np_out_aliasing_input(aliased):
+    rng = np.random.default_rng(2)
+    q = rng.normal(size=(32, 4))
+    r = rng.normal(size=(32, 4))
+    expected = qmul_np(q, r)
+
+    out = q if aliased == "q" else r
+    result = qmul_np(q, r, out=out)
+
+    assert result is out
+    assert np.array_equal(result, expected)
+
+def test_quat2mat_np_matches_quat2mat():
+    rng = np.random.default_rng(3)
+
+    # unit, scaled and zero quaternions
+    q = np.concatenate((random_quaternions(rng, 32), rng.normal(size=(32, 4)) * 3.0, np.zeros((1, 4))))
+
+    expected = np.stack([t3d_quaternions.quat2mat(quaternion) for quaternion in q])
+
+    assert np.allclose(quat2mat_np(q), expected, atol=1e-12)
+
+    out = np.empty((q.shape[0], 3, 3))
+    assert quat2mat_np(q, out=out) is out
+    assert np.allclose(out, expected, atol=1e-12)
+
+@pytest.mark.parametrize("amount", [0.0, 1.0, 0.3])
+def test_slerp_np_matches_slerp(amount):
+    rng = np.random.default_rng(4)
+    q0 = random_quaternions(rng, 64)
+    q1 = random_quaternions(rng, 64)
+    amounts = np.full(64, amount)
+
+    assert np.allclose(slerp_np(q0, q1, amount), slerp_reference(q0, q1, amounts), atol=1e-6)
+
+def test_slerp_np_endpoints():
+    rng = np.random.default_rng(5)
+    q0 = random_quaternions(rng, 64)
+    q1 = random_quaternions(rng, 64)
+
+    # slerp takes the shorter path, so t=0 gives q0 with the sign that is nearer to q1
+    signs = np.where(np.sum(q0 * q1, axis=1) < 0.0, -1.0, 1.0)[:, np.newaxis]
+
+    assert np.allclose(slerp_np(q0, q1, 0.0), q0 * signs, atol=1e-6)
+    assert np.allclose(slerp_np(q0, q1, 1.0), q1, atol=1e-6)
+
+def test_slerp_np_per_quaternion_amounts():
+    rng = np.random.default_rng(6)
+    q0 = random_quaternions(rng, 64)
+    q1 = random_quaternions(rng, 64)
+    amounts = rng.uniform(-0.2, 1.2, 64)
+
+    assert np.allclose(slerp_np(q0, q1, amounts), slerp_reference(q0, q1, amounts), atol=1e-6)
+
+@pytest.mark.parametrize("angle", [1e-7, 1e-3, 0.063, 0.064, 0.5])
+def test_slerp_np_near_parallel(angle):
+    # dot products on both sides of the 0.9995 threshold where both fall back to linear interpolation
+    rng = np.random.default_rng(7)
+    q0 = random_quaternions(rng, 64)
+    q1 = rotated_quaternions(rng, q0, angle)
+    amounts = rng.uniform(0.0, 1.0, 64)
+
+    result = slerp_np(q0, q1, amounts)
+
+    assert np.all(np.isfinite(result))
+    assert np.allclose(result, slerp_reference(q0, q1, amounts), atol=1e-6)
+
+@pytest.mark.parametrize("angle", [0.0, 1e-3, 0.5])
+def test_slerp_np_antipodal(angle):
+    rng = np.random.default_rng(8)
+    q0 = random_quaternions(rng, 64)
+    q1 = -rotated_quaternions(rng, q0, angle)
+    amounts = rng.uniform(0.0, 1.0, 64)
+
+    result = slerp_np(q0, q1, amounts)
+
+    assert np.all(np.isfinite(result))
+    assert np.allclose(result, slerp_reference(q0, q1, amounts), atol=1e-6)
+
+def test_slerp_np_non_unit_inputs():
+    rng = np.random.default_rng(9)
+    q0 = rng.normal(size=(64, 4)) * 4.0
+    q1 = rng.normal(size=(64, 4)) * 0.25
+    amounts = rng.uniform(0.0, 1.0, 64)
+
+    assert np.allclose(slerp_np(q0, q1, amounts), slerp_reference(q0, q1, amounts), atol=1e-6)
+
+def test_slerp_np_shape():
+    rng = np.random.default_rng(10)
+    q0 = random_quaternions(rng, 12).reshape(3, 4, 4)
+    q1 = random_quaternions(rng, 12).reshape(3, 4, 4)
+    amounts = rng.uniform(0.0, 1.0, (3, 4))
+
+    expected = slerp_reference(q0.reshape(-1, 4), q1.reshape(-1, 4), amounts.reshape(-1)).reshape(3, 4, 4)
+
+    assert np.allclose(slerp_np(q0, q1, amounts), expected, atol=1e-6)
+
+def test_slerp_np_out_aliasing_q0():
+    rng = np.random.default_rng(11)
+    q0 = random_quaternions(rng, 64)
+    q1 = random_quaternions(rng, 64)
+    amounts = rng.uniform(0.0, 1.0, 64)
+    expected = slerp_np(q0, q1, amounts)
+
+    result = slerp_np(q0, q1, amounts, out=q0)
+
+    assert result is q0
+    assert np.array_equal(result, expected)
+
+def test_slerp_np_out_aliasing_q1_with_scratch():
+    rng = np.random.default_rng(12)
+    q0 = random_quaternions(rng, 64)
+    q1 = random_quaternions(rng, 64)
+    amounts = rng.uniform(0.0, 1.0, 64)
+    expected = slerp_np(q0, q1, amounts)
+
+    scratch = np.empty((64, 4))
+    result = slerp_np(q0, q1, amounts, out=q1, scratch=scratch)
+
+    assert result is q1
+    assert np.array_equal(result, expected)
+
+def test_slerp_np_rejects_non_contiguous_out():
+    rng = np.random.default_rng(13)
+    q0 = random_quaternions(rng, 8)
+    q1 = random_quaternions(rng, 8)
+
+    with pytest.raises(ValueError):
+        slerp_np(q0, q1, 0.5, out=np.empty((8, 8))[:, ::2])
@@ -0,0 +1,61 @@
+import threading
+import numpy as np
+
+class FrameProfiler():
+    """
+    Rolling durations of the stages of a frame, each stage keeps its last sampleCount durations in a ring buffer
+    Stages recorded by OscControl: "ingest" (decoding a mocap message), "skeleton" (committing a pose)
+    Stages recorded by Visualization: "upload" (pose and settings into the gl buffers), "submit" (issuing the draw calls),
+    "gpu" (ray marching on the gpu, GL_TIME_ELAPSED) and "frame" (time between two frames)
+    record is called from the ingest and the render thread.
+    """
+
+    def __init__(self, sampleCount=240):
+
+        self.sampleCount = sampleCount
+        self.samples = {}
+        self.sampleIndices = {}
+        self.sampleTotals = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+
+        with self.lock:
+
+            if stage not in self.samples:
+                self.samples[stage] = np.zeros(self.sampleCount)
+                self.sampleIndices[stage] = 0
+                self.sampleTotals[stage] = 0
+
+            sampleIndex = self.sampleIndices[stage]
+            self.samples[stage][sampleIndex] = seconds
+            self.sampleIndices[stage] = (sampleIndex + 1) % self.sampleCount
+            self.sampleTotals[stage] += 1
+
+    def getStats(self):
+        """
+        Returns dict of stage: (p50, p95, p99, max) in milliseconds, over the samples in the ring buffers
+        """
+
+        with self.lock:
+            samples = {stage: self.samples[stage][:min(self.sampleTotals[stage], self.sampleCount)].copy() for stage in self.samples}
+
+        stats = {}
+
+        for stage, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000.0
+            stats[stage] = (p50, p95, p99, np.max(values) * 1000.0)
+
+        return stats
+
+    def formatStats(self):
+        """
+        Returns the stats as one line of text per stage
+        """
+
+        lines = []
+
+        for stage, (p50, p95, p99, maxTime) in self.getStats().items():
+            lines.append("%-8s p50 %6.2f  p95 %6.2f  p99 %6.2f  max %6.2f ms" % (stage, p50, p95, p99, maxTime))
+
+        return "\n".join(lines)
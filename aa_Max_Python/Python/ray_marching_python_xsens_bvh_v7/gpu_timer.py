@@ -0,0 +1,72 @@
+import collections
+import numpy as np
+
+class GpuTimer():
+    """
+    Measures the gpu time of a span of gl commands with GL_TIME_ELAPSED queries
+    Results arrive a few frames after the span was drawn. takeResults only returns queries whose result is available,
+    so reading them never waits for the gpu. If all queries are still in flight, the span isn't measured.
+    """
+
+    def __init__(self, queryCount=4):
+
+        self.queryCount = queryCount
+        self.freeQueries = []
+        self.pendingQueries = collections.deque()
+        self.activeQuery = None
+
+    def setup(self, gl):
+
+        self.freeQueries = [int(query) for query in np.atleast_1d(gl.glGenQueries(self.queryCount))]
+        self.pendingQueries.clear()
+        self.activeQuery = None
+
+    def begin(self, gl, tag=None):
+        """
+        Expects tag: any value that is returned with the result of this span
+        """
+
+        if len(self.freeQueries) == 0:
+            self.activeQuery = None
+            return
+
+        self.activeQuery = (self.freeQueries.pop(), tag)
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, self.activeQuery[0])
+
+    def end(self, gl):
+
+        if self.activeQuery is None:
+            return
+
+        gl.glEndQuery(gl.GL_TIME_ELAPSED)
+
+        self.pendingQueries.append(self.activeQuery)
+        self.activeQuery = None
+
+    def takeResults(self, gl):
+        """
+        Returns list of (seconds, tag) of the spans whose result is available, oldest first
+        """
+
+        results = []
+
+        available = np.zeros(1, dtype=np.int32)
+        elapsed = np.zeros(1, dtype=np.uint64)
+
+        while len(self.pendingQueries) > 0:
+
+            query, tag = self.pendingQueries[0]
+
+            # queries complete in order, so the first one that isn't available ends the search
+            gl.glGetQueryObjectiv(query, gl.GL_QUERY_RESULT_AVAILABLE, available)
+            if available[0] == 0:
+                break
+
+            gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT, elapsed)
+
+            self.pendingQueries.popleft()
+            self.freeQueries.append(query)
+
+            results.append((float(elapsed[0]) * 1e-9, tag))
+
+        return results
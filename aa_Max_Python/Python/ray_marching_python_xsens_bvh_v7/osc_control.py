@@ -1,25 +1,136 @@
 import threading
+import asyncio
+import logging
+import select
+import socket
+import time
 import numpy as np
 
 from pythonosc import dispatcher
 from pythonosc import osc_server
+from pythonosc import udp_client
+
+def osc_float_array(data, addressEnd):
+    """
+    Decodes the arguments of a raw OSC message without building python objects
+    Expects data: datagram of a single OSC message, addressEnd: index of the null terminator of its address
+    Returns a read-only view into data: big endian float32 for messages with only float arguments,
+    little endian float32 for messages with a single blob argument of packed floats.
+    Returns None for any other message.
+    Raises ValueError if the float or blob arguments are cut short, which the generic parser would fill up with zeros,
+    or if the blob doesn't hold whole float32.
+    """
+
+    # OSC strings are null terminated and padded to a multiple of 4 bytes
+    tagStart = (addressEnd + 4) & ~3
+    tagEnd = data.find(b"\0", tagStart)
+
+    if tagEnd < 0 or data[tagStart:tagStart + 1] != b",":
+        return None
+
+    tagCount = tagEnd - tagStart - 1
+    argStart = (tagEnd + 4) & ~3
+
+    if tagCount == 1 and data[tagStart + 1:tagEnd] == b"b":
+        blobSize = int.from_bytes(data[argStart:argStart + 4], "big")
+        if blobSize % 4 != 0:
+            raise ValueError("blob of " + str(blobSize) + " bytes is not an array of float32")
+        if argStart + 4 + blobSize > len(data):
+            raise ValueError("truncated float blob")
+        return np.frombuffer(data, dtype="<f4", count=blobSize // 4, offset=argStart + 4)
+
+    if data.count(b"f", tagStart + 1, tagEnd) != tagCount:
+        return None
+
+    if argStart + tagCount * 4 > len(data):
+        raise ValueError("truncated float arguments")
+
+    return np.frombuffer(data, dtype=">f4", count=tagCount, offset=argStart)
+
+def osc_float_args(args):
+    """
+    Expects the arguments of a message decoded by pythonosc: floats or a single blob of packed little endian float32
+    Returns a numpy array of floats
+    """
+
+    if len(args) == 1 and isinstance(args[0], (bytes, bytearray)):
+        return np.frombuffer(args[0], dtype="<f4")
+
+    return np.array(args)
+
+class MocapDispatcher(dispatcher.Dispatcher):
+    """
+    Dispatcher that hands the float arrays of selected addresses straight from the datagram to a handler(values),
+    bypassing the generic OSC parser. Bundles and all other messages are dispatched as usual,
+    truncated float arrays are dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        self.floatArrayHandlers = {}
+        self.logger = logging.getLogger(__name__)
+
+    def mapFloatArray(self, address, handler):
+
+        self.floatArrayHandlers[address.encode()] = handler
+
+    def call_handlers_for_packet(self, data, client_address):
+
+        addressEnd = data.find(b"\0")
+        handler = self.floatArrayHandlers.get(data[:addressEnd])
+
+        if handler is not None:
+            try:
+                values = osc_float_array(data, addressEnd)
+            except ValueError as error:
+                self.logger.warning("dropping osc message %s from %s: %s", data[:addressEnd].decode(errors="replace"), client_address, error)
+                return []
+
+            if values is not None:
+                handler(values)
+                return []
+
+        return super().call_handlers_for_packet(data, client_address)
+
+class PoseDeadline():
+    """
+    Pose commit timeout of the blocking ingest backend, polled by the ingest loop instead of running a timer thread
+    """
+    
+    def __init__(self, deadline):
+        self.deadline = deadline
+        
+    def cancel(self):
+        pass
 
 class OscControl():
+    """
+    backend selects how OSC packets are received:
+    "thread"   : osc_server.ThreadingOSCUDPServer, one new thread per datagram
+    "blocking" : a single ingest thread that waits on the socket and drains it in batches
+    "asyncio"  : osc_server.AsyncIOOSCUDPServer running in its own event loop thread
+    With "blocking" and "asyncio", packets are handled in arrival order on a single thread.
+    """
     
-    def __init__(self, skeleton, visualization, address, port):
+    def __init__(self, skeleton, visualization, address, port, backend="blocking"):
         
         self.skeleton = skeleton
         self.visualization = visualization
         self.address = address 
         self.port = port
+        self.backend = backend
+        self.logger = logging.getLogger(__name__)
          
-        self.dispatcher = dispatcher.Dispatcher()
+        self.dispatcher = MocapDispatcher()
         self.dispatcher.map("/mocap/updatesmoothing", self.setMocapUpdateSmoothing)
         
         self.dispatcher.map("/mocap/skelposworld", self.setMocapSkeletonPosition)
         self.dispatcher.map("/mocap/rootzero", self.setMocapRootZero)
         self.dispatcher.map("/mocap/joint/pos_world", self.setMocapJointPositions)
         self.dispatcher.map("/mocap/joint/rot_world", self.setMocapJointRotations)
+        self.dispatcher.mapFloatArray("/mocap/joint/pos_world", self.stagePositions)
+        self.dispatcher.mapFloatArray("/mocap/joint/rot_world", self.stageRotations)
         
         self.dispatcher.map("/vis/camposition", self.setVisCamPosition)
         self.dispatcher.map("/vis/camangle", self.setVisCamAngle)
@@ -84,21 +195,263 @@ class OscControl():
         self.dispatcher.map("/vis/jointedgesmooth", self.setVisJointEdgeSmoothing)
         self.dispatcher.map("/vis/skelobjectsmooth", self.setVisSkelObjectSmoothing)
         
-        self.server = osc_server.ThreadingOSCUDPServer((self.address, self.port), self.dispatcher)
+        self.dispatcher.map("/stats", self.replyStats, needs_reply_address=True)
+        
+        if self.backend == "thread":
+            self.server = osc_server.ThreadingOSCUDPServer((self.address, self.port), self.dispatcher)
+        elif self.backend == "blocking":
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.bind((self.address, self.port))
+            self.socket.setblocking(False)
+        elif self.backend == "asyncio":
+            self.loop = asyncio.new_event_loop()
+            self.server = osc_server.AsyncIOOSCUDPServer((self.address, self.port), self.dispatcher, self.loop)
+        else:
+            raise ValueError("unknown osc backend " + str(self.backend))
+        
+        # blocking backend: maximum number of datagrams handled per socket wakeup and maximum datagram size
+        self.ingestBatchSize = 64
+        self.maxPacketSize = 65536
+        self.running = False
+        self.th = None
         
         self.fix_root = False
         
+        # frame assembly: joint positions and rotations of one mocap frame are committed together,
+        # or on their own if the other half hasn't arrived within poseCommitTimeout seconds
+        self.poseCommitTimeout = 0.005
+        self.poseLock = threading.Lock()
+        self.poseTimer = None
+
+        # right handed to left handed: axis order of incoming joint positions and rotations
+        self.positionAxisOrder = np.array([1, 0, 2])
+        self.rotationAxisOrder = np.array([0, 2, 1, 3])
+
+        # incoming joint arrays are converted into these buffers, (re)allocated whenever the joint count changes
+        self.positionInput = np.zeros((0, 3))
+        self.positionBuffer = np.zeros((0, 3))
+        self.rotationInput = np.zeros((0, 4))
+        self.rotationBuffer = np.zeros((0, 4))
+        
+        # FrameProfiler or None, receives the durations of the ingest and skeleton stages
+        self.profiler = None
+        self.statsClients = {}
+        
     def start_server(self):
-        self.server.serve_forever()
+        
+        if self.backend == "thread":
+            self.server.serve_forever()
+        elif self.backend == "blocking":
+            self.ingest_loop()
+        elif self.backend == "asyncio":
+            asyncio.set_event_loop(self.loop)
+            self.transport, self.protocol = self.loop.run_until_complete(self.server.create_serve_endpoint())
+            self.loop.run_forever()
+            self.transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
 
     def start(self):
         
+        self.running = True
+        
         self.th = threading.Thread(target=self.start_server)
         self.th.start()
         
     def stop(self):
-        self.server.server_close()
+        
+        self.running = False
+        
+        if self.backend == "thread":
+            if self.th is not None:
+                self.server.shutdown()
+                self.th.join()
+            self.server.server_close()
+        elif self.backend == "blocking":
+            if self.th is not None:
+                self.th.join()
+            self.socket.close()
+        elif self.backend == "asyncio":
+            if self.th is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.th.join()
+        
+        with self.poseLock:
+            self.cancelPoseTimer()
+            
+    def ingest_loop(self):
+        
+        while self.running == True:
+            
+            # sleep until a packet arrives, the pending pose times out, or it's time to check for stop()
+            timeout = 0.1
+            poseTimer = self.poseTimer
+            if poseTimer is not None:
+                timeout = max(poseTimer.deadline - time.perf_counter(), 0.0)
+            
+            readable, _, _ = select.select([self.socket], [], [], timeout)
+            
+            if len(readable) > 0:
+                # drain whatever is queued on the socket, in order
+                for pI in range(self.ingestBatchSize):
+                    try:
+                        data, client_address = self.socket.recvfrom(self.maxPacketSize)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except ConnectionResetError: # windows reports unreachable senders on the receiving socket
+                        continue
+                    
+                    # a handler failing on a malformed message must not end the ingest thread
+                    try:
+                        self.dispatcher.call_handlers_for_packet(data, client_address)
+                    except Exception:
+                        self.logger.exception("error handling osc packet from %s", client_address)
+            
+            poseTimer = self.poseTimer
+            if poseTimer is not None and time.perf_counter() >= poseTimer.deadline:
+                self.onPoseTimeout(poseTimer)
+        
+    def convertJointPositions(self, values):
+        
+        if values.shape[0] % 3 != 0:
+            return None
+        
+        values = values.reshape(-1, 3)
+        
+        if self.positionBuffer.shape != values.shape:
+            self.positionInput = np.zeros(values.shape)
+            self.positionBuffer = np.zeros(values.shape)
+        
+        np.copyto(self.positionInput, values)
+        np.take(self.positionInput, self.positionAxisOrder, axis=1, out=self.positionBuffer)
+        
+        if self.fix_root == True:
+            # set root positions to zero
+            self.positionBuffer -= self.positionBuffer[0]
+            
+        return self.positionBuffer
     
+    def convertJointRotations(self, values):
+        
+        if values.shape[0] % 4 != 0:
+            return None
+        
+        values = values.reshape(-1, 4)
+        
+        if self.rotationBuffer.shape != values.shape:
+            self.rotationInput = np.zeros(values.shape)
+            self.rotationBuffer = np.zeros(values.shape)
+        
+        np.copyto(self.rotationInput, values)
+        np.take(self.rotationInput, self.rotationAxisOrder, axis=1, out=self.rotationBuffer)
+            
+        return self.rotationBuffer
+        
+    def stagePositions(self, values):
+        
+        with self.poseLock:
+            stageTime = time.perf_counter()
+            
+            # the conversion buffers are shared by all packets
+            positions = self.convertJointPositions(values)
+            if positions is None:
+                return
+            
+            self.recordStage("ingest", stageTime)
+            
+            # the rotations of the previous frame never arrived
+            if self.skeleton.positionsStaged == True:
+                self.commitPose()
+            
+            self.skeleton.stageJointPositions(positions)
+            self.schedulePoseCommit()
+            
+    def stageRotations(self, values):
+        
+        with self.poseLock:
+            stageTime = time.perf_counter()
+            
+            rotations = self.convertJointRotations(values)
+            if rotations is None:
+                return
+            
+            self.recordStage("ingest", stageTime)
+            
+            # the positions of the previous frame never arrived
+            if self.skeleton.rotationsStaged == True:
+                self.commitPose()
+            
+            self.skeleton.stageJointRotations(rotations)
+            self.schedulePoseCommit()
+            
+    def schedulePoseCommit(self):
+        
+        if self.skeleton.isPoseComplete() == True:
+            self.commitPose()
+        elif self.skeleton.isPoseStaged() == True and self.poseTimer is None:
+            self.poseTimer = self.startPoseTimer()
+            
+    def startPoseTimer(self):
+        
+        if self.backend == "blocking":
+            return PoseDeadline(time.perf_counter() + self.poseCommitTimeout)
+        elif self.backend == "asyncio":
+            # handlers run on the event loop thread, so the handle can be created directly
+            timer = self.loop.call_later(self.poseCommitTimeout, lambda: self.onPoseTimeout(timer))
+            return timer
+        else:
+            timer = threading.Timer(self.poseCommitTimeout, self.onPoseTimeout)
+            timer.args = (timer, )
+            timer.daemon = True
+            timer.start()
+            return timer
+            
+    def onPoseTimeout(self, timer):
+        
+        with self.poseLock:
+            # the frame this timer was started for has been committed in the meantime
+            if timer is not self.poseTimer:
+                return
+            
+            self.commitPose()
+            
+    def commitPose(self):
+        
+        self.cancelPoseTimer()
+        
+        stageTime = time.perf_counter()
+        self.skeleton.commitPose()
+        self.recordStage("skeleton", stageTime)
+        
+    def cancelPoseTimer(self):
+        
+        if self.poseTimer is not None:
+            self.poseTimer.cancel()
+            self.poseTimer = None
+    
+    def recordStage(self, stage, startTime):
+        
+        if self.profiler is not None:
+            self.profiler.record(stage, time.perf_counter() - startTime)
+            
+    def replyStats(self, client_address, address, *args):
+        """
+        Sends one message /stats/<stage> p50 p95 p99 max (milliseconds) per profiled stage back to the sender,
+        to the port given as argument or to the port the request came from
+        """
+        
+        if self.profiler is None:
+            return
+        
+        replyAddress = (client_address[0], int(args[0]) if len(args) > 0 else client_address[1])
+        
+        if replyAddress not in self.statsClients:
+            self.statsClients[replyAddress] = udp_client.SimpleUDPClient(*replyAddress)
+        client = self.statsClients[replyAddress]
+        
+        for stage, stats in self.profiler.getStats().items():
+            client.send_message(address + "/" + stage, [float(value) for value in stats])
+            
     def setMocapUpdateSmoothing(self, address, *args):
         
         self.skeleton.setUpdateSmoothing(args[0])
@@ -114,44 +467,13 @@ class OscControl():
         self.skeleton.setPosition(position)
         
     def setMocapJointPositions(self, address, *args):
-
-        argCount = len(args)
-        posCount = argCount // 3
         
-        positions = np.array(args)
-        positions = np.reshape(positions, (-1, 3))
-        
-        #print("positions ", positions)
-        
-        if self.fix_root == True:
-            # set root positions to zero
-            positions -= positions[0]
-        
-        # right handed to left handed
-        tmp = np.copy(positions)
-        positions[:, 0] = tmp[:, 1]
-        positions[:, 1] = tmp[:, 0]
-        positions[:, 2] = tmp[:, 2]
-        
-        #print("positions ", positions)
-        
-        self.skeleton.setJointPositions(positions)
+        # only reached for bundled messages, plain messages take the MocapDispatcher fast path
+        self.stagePositions(osc_float_args(args))
 
     def setMocapJointRotations(self, address, *args):
-
-        argCount = len(args)
-        rotCount = argCount // 4
-        
-        rotations = np.array(args)
-        rotations = np.reshape(rotations, (-1, 4))
-
-        tmp = np.copy(rotations)
-        rotations[:, 0] = tmp[:, 0]
-        rotations[:, 1] = tmp[:, 2]
-        rotations[:, 2] = tmp[:, 1]
-        rotations[:, 3] = tmp[:, 3]
         
-        self.skeleton.setJointRotations(rotations)
+        self.stageRotations(osc_float_args(args))
         
     def setVisCamPosition(self, address, *args):
         
@@ -0,0 +1,72 @@
+import threading
+import numpy as np
+
+from uniform_block import merge_ranges
+
+class PrimitiveBuffer():
+    """
+    CPU side copy of a texture buffer (GL_RGBA32F) that stores one record of texelCount texels per primitive
+    texels has shape (count, texelCount, 4), view and matrixView return writable views of one field of all records.
+    Writes into a view have to be followed by markDirty(index), takeDirtyRanges returns the byte ranges
+    that need to be uploaded since it was last called.
+    """
+
+    def __init__(self, count, texelCount):
+
+        self.count = count
+        self.texelCount = texelCount
+        self.texels = np.zeros((count, texelCount, 4), dtype=np.float32)
+        self.bytes = self.texels.reshape(-1).view(np.uint8)
+        self.recordSize = texelCount * 16
+
+        # byte ranges written since the last upload, marked from other threads than the one uploading
+        self.dirtyRanges = []
+        self.dirtyLock = threading.Lock()
+        self.markDirty()
+
+    def view(self, texel, component, componentCount=1):
+        """
+        Expects the texel index within a record, the first component and the number of components of a field
+        Returns view of shape (count,) for single components, (count, componentCount) otherwise
+        """
+
+        if componentCount == 1:
+            return self.texels[:, texel, component]
+
+        return self.texels[:, texel, component:component + componentCount]
+
+    def matrixView(self, texel):
+        """
+        Expects the index of the first of 4 texels holding the columns of a mat4
+        Returns view of shape (count, 4, 4), laid out like matrices uploaded with glUniformMatrix4fv(transpose=GL_FALSE)
+        """
+
+        return self.texels[:, texel:texel + 4, :]
+
+    def markDirty(self, index=None):
+
+        if index is None:
+            dirtyRange = (0, self.bytes.shape[0])
+        else:
+            dirtyRange = (index * self.recordSize, (index + 1) * self.recordSize)
+
+        with self.dirtyLock:
+            self.dirtyRanges.append(dirtyRange)
+
+    def isDirty(self):
+        return len(self.dirtyRanges) > 0
+
+    def takeDirtyRanges(self, mergeGap=256):
+        """
+        Expects mergeGap: ranges closer than this many bytes are merged into one upload
+        Returns sorted list of non overlapping (start, end) byte ranges and clears them
+        """
+
+        with self.dirtyLock:
+            dirtyRanges = self.dirtyRanges
+            self.dirtyRanges = []
+
+        return merge_ranges(dirtyRanges, mergeGap)
+
+    def getSize(self):
+        return self.bytes.shape[0]
@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import os
+import numpy as np
+
+class ProgramCache():
+    """
+    Disk cache of linked shader program binaries (glGetProgramBinary / glProgramBinary)
+    Entries are keyed by a hash of the shader sources, the defines and the GL vendor, renderer and version,
+    so a driver update or a changed shader never loads a stale binary. The driver may still reject a binary,
+    load then returns False and the caller compiles from source.
+    Every set of defines is its own entry, store evicts the least recently used entries beyond maxEntries or maxBytes.
+    """
+
+    def __init__(self, directory=None, maxEntries=64, maxBytes=256 * 1024 * 1024):
+
+        # next to the sources, independent of the working directory
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shader_cache")
+
+        self.directory = directory
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.logger = logging.getLogger(__name__)
+
+    def isSupported(self, gl):
+        """
+        Returns True if the context can save and load program binaries
+        """
+
+        if not bool(gl.glGetProgramBinary) or not bool(gl.glProgramBinary):
+            return False
+
+        formatCount = np.zeros(1, dtype=np.int32)
+        gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS, formatCount)
+
+        return int(formatCount[0]) > 0
+
+    def getKey(self, gl, sources, defines):
+        """
+        Expects list of shader sources and dict of defines the program is compiled with
+        Returns hex digest identifying the program binary for this context
+        """
+
+        key = hashlib.sha1()
+
+        for source in sources:
+            key.update(source.encode())
+            key.update(b"\0")
+
+        for name in sorted(defines):
+            key.update((name + "=" + str(defines[name]) + "\0").encode())
+
+        for name in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION):
+            key.update(bytes(gl.glGetString(name) or b""))
+            key.update(b"\0")
+
+        return key.hexdigest()
+
+    def getPath(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def load(self, gl, program, key):
+        """
+        Expects a program without attached shaders
+        Returns True if a cached binary was found and linked successfully
+        An entry that can't be read or linked is removed, load then returns False and the caller compiles from source
+        """
+
+        path = self.getPath(key)
+
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as error:
+            self.discard(path, key, "unreadable: " + str(error))
+            return False
+
+        # 4 bytes binary format followed by the binary
+        if len(data) <= 4:
+            self.discard(path, key, "truncated")
+            return False
+
+        binaryFormat = int(np.frombuffer(data[:4], dtype="<u4")[0])
+        binary = np.frombuffer(data[4:], dtype=np.uint8)
+
+        try:
+            gl.glProgramBinary(program, binaryFormat, binary, binary.shape[0])
+        except Exception as error:
+            # PyOpenGL raises GLError, such as GL_INVALID_ENUM for a format the driver doesn't know
+            self.discard(path, key, "not accepted by the driver: " + str(error))
+            return False
+
+        if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+            self.discard(path, key, "rejected")
+            return False
+
+        # the modification time orders the entries for evict
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return True
+
+    def discard(self, path, key, reason):
+        """
+        Removes a cache entry that can't be used
+        """
+
+        self.logger.info("cached program binary %s %s, compiling from source", key, reason)
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def store(self, gl, program, key):
+        """
+        Expects a linked program created with GL_PROGRAM_BINARY_RETRIEVABLE_HINT
+        """
+
+        binaryLength = int(gl.glGetProgramiv(program, gl.GL_PROGRAM_BINARY_LENGTH))
+
+        if binaryLength <= 0:
+            return
+
+        length = np.zeros(1, dtype=np.int32)
+        binaryFormat = np.zeros(1, dtype=np.uint32)
+        binary = np.zeros(binaryLength, dtype=np.uint8)
+
+        gl.glGetProgramBinary(program, binaryLength, length, binaryFormat, binary)
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # write to a temporary file first so a crash never leaves a truncated entry
+        path = self.getPath(key)
+        tmpPath = path + ".tmp"
+
+        with open(tmpPath, "wb") as f:
+            f.write(np.array([binaryFormat[0]], dtype="<u4").tobytes())
+            f.write(binary[:int(length[0])].tobytes())
+
+        os.replace(tmpPath, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until at most maxEntries remain and they take at most maxBytes
+        """
+
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        # newest first
+        entries.sort(reverse=True)
+
+        totalBytes = 0
+
+        for eI, (mtime, size, path) in enumerate(entries):
+            totalBytes += size
+
+            if eI < self.maxEntries and totalBytes <= self.maxBytes:
+                continue
+
+            self.logger.info("evicting cached program binary %s", os.path.basename(path))
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
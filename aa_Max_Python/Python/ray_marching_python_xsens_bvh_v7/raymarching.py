@@ -10,7 +10,7 @@ import logging
 import numpy as np
 import OpenGL.GL as gl
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtGui import QOpenGLWindow
+from PyQt5.QtGui import QOpenGLWindow, QPainter, QColor, QFont
 from PyQt5 import QtCore
 import time
 import json
@@ -25,20 +25,26 @@ from pythonosc import osc_server
 from skeleton import Skeleton
 from visualization import Visualization
 from osc_control import OscControl
+from frame_profiler import FrameProfiler
+from shader_program import enable_parallel_shader_compile
+from shader_compile_thread import ShaderCompileThread
    
 """
 Setup Skeleton
 """
 
 joint_settings_file = "joint_settings.json"
+#joint_settings_file = "joint_settings_hand.json"
 
 with open(joint_settings_file) as f:
     joint_settings = json.load(f)
     
 jointFilter = joint_settings["jointFilter"]
 jointConnectivity = joint_settings["jointConnectivity"]
+jointPreRotations = joint_settings.get("jointPreRotations")
+edgePreRotations = joint_settings.get("edgePreRotations")
 
-skeleton = Skeleton(jointFilter, jointConnectivity)
+skeleton = Skeleton(jointFilter, jointConnectivity, jointPreRotations, edgePreRotations)
 
 jointCount = skeleton.getJointCount()
 edgeCount = skeleton.getEdgeCount()
@@ -57,6 +63,7 @@ fragment_file_path = "shaderFrag.glsl"
 window_size = [1280, 720]
 #window_size = [640, 360]
 #window_size = [720, 405]
+object_count = 10
 
 with open(vertex_file_path) as f:
     vertex_code = f.read()
@@ -64,48 +71,128 @@ with open(vertex_file_path) as f:
 with open(fragment_file_path) as f:
     fragment_code = f.read()
 
-visualization = Visualization(skeleton, vertex_code, fragment_code)
+visualization = Visualization(skeleton, vertex_code, fragment_code, object_count)
+
+# ray march at a lower resolution when the gpu can't hold the target frame rate, the image is scaled up to the window
+dynamic_resolution = True
+target_frame_rate = 60.0
+
+visualization.dynamicResolution = dynamic_resolution
+visualization.resolutionGovernor.setTargetFrameRate(target_frame_rate)
 
 """
 Osc Control
 """
 
-oscControl = OscControl(skeleton, visualization, "127.0.0.1", 9007)
+# "blocking", "asyncio" or "thread" (see OscControl)
+osc_backend = "blocking"
+
+oscControl = OscControl(skeleton, visualization, "127.0.0.1", 9007, osc_backend)
 oscControl.start()
 
 oscControl.fix_root = True
 
+"""
+Profiling
+"""
+
+# percentiles of the frame stages, shown with the s-Key and sent as reply to /stats
+profiler = FrameProfiler()
+
+visualization.profiler = profiler
+oscControl.profiler = profiler
+
+show_stats = False
+
 """
 GUI
 """
 
+# "vsync" draws the next frame as soon as the previous one has been swapped, paced by the display refresh and swap_interval,
+# "timer" draws every render_interval ms
+render_loop = "vsync"
+swap_interval = 1
+
+# "continuous" draws every frame of the loop, "on_change" only when a new pose arrived,
+# a /vis/* setting changed or an animated object is shown (see Visualization.needsRender)
+render_mode = "on_change"
+render_interval = 10
+
 start_time = time.time()
 
 class MinimalGLWidget(QOpenGLWindow):
     
-    def __init__(self, visualization):
+    def __init__(self, visualization, renderLoop="timer", renderMode="continuous", renderInterval=10, swapInterval=1, profiler=None, showStats=False):
         self.visualization = visualization
+        self.renderLoop = renderLoop
+        self.renderMode = renderMode
+        self.renderInterval = renderInterval
         self.fullscreen = False
         
+        # stats overlay, the text is refreshed every statsInterval seconds
+        self.profiler = profiler
+        self.showStats = showStats
+        self.statsInterval = 0.25
+        self.statsTime = 0.0
+        self.statsText = ""
+        
+        # compiles shader variants if the driver can't, started in initializeGL
+        self.shaderCompileThread = None
+        
+        if self.renderLoop not in ("vsync", "timer"):
+            raise ValueError("unknown render loop " + str(self.renderLoop))
+        
+        if self.renderMode not in ("continuous", "on_change"):
+            raise ValueError("unknown render mode " + str(self.renderMode))
+        
         super().__init__()
+        
+        # number of display refreshes per buffer swap, 0 doesn't wait for vsync
+        surfaceFormat = self.format()
+        surfaceFormat.setSwapInterval(swapInterval)
+        self.setFormat(surfaceFormat)
  
     
     def initializeGL(self):
         
+        # without parallel compilation in the driver, shader variants are compiled on a second context
+        if enable_parallel_shader_compile(gl) == False:
+            shaderCompileThread = ShaderCompileThread(self.context())
+            
+            if shaderCompileThread.isValid() == True:
+                shaderCompileThread.start()
+                self.shaderCompileThread = shaderCompileThread
+                self.visualization.shaderCompileThread = shaderCompileThread
+        
         self.visualization.setupShader(gl)
-
-        self.renderTimer = QtCore.QTimer(self)
-        self.renderTimer.setInterval(10)
-        self.renderTimer.timeout.connect(self.onRenderTimer)
-        self.renderTimer.start()
         
-    def onRenderTimer(self):
+        if self.renderLoop == "vsync":
+            self.frameSwapped.connect(self.requestFrame)
+
+        # the timer drives the timer loop, in the vsync loop it restarts drawing after a static scene changed
+        if self.renderLoop == "timer" or self.renderMode == "on_change":
+            self.renderTimer = QtCore.QTimer(self)
+            self.renderTimer.setInterval(self.renderInterval)
+            self.renderTimer.timeout.connect(self.requestFrame)
+            self.renderTimer.start()
+            
+        self.update()
+        
+    def resizeGL(self, width, height):
+        
+        # the default framebuffer has device pixels
+        ratio = self.devicePixelRatio()
+        self.visualization.setResolution(width * ratio, height * ratio)
+        
+    def paintGL(self):
         
         global start_time
-
-        visualization.render(gl)
         
-        self.update()
+        # render takes the newest pose snapshot right before drawing
+        self.visualization.render(gl)
+        
+        if self.showStats == True and self.profiler is not None:
+            self.paintStats()
         
         new_time = time.time()
         
@@ -114,6 +201,29 @@ class MinimalGLWidget(QOpenGLWindow):
         start_time = new_time
         
         #print("fr ", 1.0 / elapsed_time)
+        
+    def paintStats(self):
+        
+        now = time.time()
+        
+        if now - self.statsTime > self.statsInterval:
+            self.statsText = self.profiler.formatStats()
+            self.statsTime = now
+        
+        painter = QPainter(self)
+        painter.setFont(QFont("Monospace", 10))
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(10, 10, self.width() - 20, self.height() - 20, QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, self.statsText)
+        painter.end()
+        
+    def requestFrame(self):
+        
+        # in on_change mode static scenes aren't redrawn, Qt still repaints on expose and resize
+        if self.renderMode == "on_change" and self.visualization.needsRender() == False:
+            return
+        
+        # several requests before the next paint result in a single frame
+        self.update()
 
     def keyPressEvent(self, event):
         super(MinimalGLWidget, self).keyPressEvent(event)
@@ -126,14 +236,20 @@ class MinimalGLWidget(QOpenGLWindow):
             else:
                 self.showFullScreen()
                 self.fullscreen = True
+        elif event.key() == 83: # s-Key
+            self.showStats = not self.showStats
+            self.update()
 
 if __name__ == '__main__':
     app = QApplication([])
-    widget = MinimalGLWidget(visualization)
+    widget = MinimalGLWidget(visualization, render_loop, render_mode, render_interval, swap_interval, profiler, show_stats)
     widget.show()
     widget.resize(window_size[0], window_size[1])
     app.exec_()
     
+    if widget.shaderCompileThread is not None:
+        widget.shaderCompileThread.stop()
+    
     widget.close()
     oscControl.stop()
     
\ No newline at end of file
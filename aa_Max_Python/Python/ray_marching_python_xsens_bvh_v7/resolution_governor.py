@@ -0,0 +1,48 @@
+import math
+
+class ResolutionGovernor():
+    """
+    Chooses the render scale, the fraction of the window width and height that is ray marched, to hold a gpu time per frame
+    Ray marching cost grows with the pixel count, that is with the square of the scale. The governor estimates the
+    cost of a full resolution frame from each measurement and picks the scale whose cost matches targetTime.
+    Changes smaller than tolerance are ignored, so the image doesn't change its sharpness every frame.
+    """
+
+    def __init__(self, targetTime=0.014, minScale=0.25, maxScale=1.0, smoothing=0.8, tolerance=0.05):
+
+        self.targetTime = targetTime
+        self.minScale = minScale
+        self.maxScale = maxScale
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+
+        self.scale = maxScale
+        self.fullFrameTime = None
+
+    def setTargetFrameRate(self, frameRate, headroom=0.85):
+        """
+        Expects frames per second and the part of a frame the ray marching may take
+        """
+
+        self.targetTime = headroom / frameRate
+
+    def update(self, gpuTime, scale):
+        """
+        Expects the gpu time in seconds of a frame that was rendered with scale
+        Returns the scale for the next frames
+        """
+
+        fullFrameTime = gpuTime / (scale * scale)
+
+        if self.fullFrameTime is None:
+            self.fullFrameTime = fullFrameTime
+        else:
+            self.fullFrameTime = self.smoothing * self.fullFrameTime + (1.0 - self.smoothing) * fullFrameTime
+
+        targetScale = math.sqrt(self.targetTime / max(self.fullFrameTime, 1e-9))
+        targetScale = min(max(targetScale, self.minScale), self.maxScale)
+
+        if abs(targetScale - self.scale) > self.tolerance or targetScale in (self.minScale, self.maxScale):
+            self.scale = targetScale
+
+        return self.scale
@@ -6,9 +6,15 @@ const float MAX_DIST = 100.0;
 const float EPSILON = 0.0001;
 const float PI = 3.1415926535897932384626433832795; // there is no PI defined in GLSL?
 
-const int jointCount = 23;
-const int edgeCount = 22;
-const int objectCount = 10;
+// primitive counts, JOINT_COUNT, EDGE_COUNT and OBJECT_COUNT are defined by Visualization.getShaderDefines
+const int jointCount = JOINT_COUNT;
+const int edgeCount = EDGE_COUNT;
+const int objectCount = OBJECT_COUNT;
+
+// JOINT_PRIMITIVES, EDGE_PRIMITIVES and OBJECT_PRIMITIVES are bit masks of the primitive types in use
+// and OBJECT_RIPPLES is 1 if any object ripples, the sceneSDF branches of everything else are left out
+// PRIMITIVE_CULLING is 1 if sceneSDF finds the primitives near the sample point by trees of bounding spheres
+// TILE_BINNING is 1 if the primary march only evaluates the primitives binned into the screen tile of the fragment, tiles are TILE_SIZE pixels
 
 uniform float iGlobalTime;
 vec4 vectorTime = vec4(iGlobalTime / 20.0, iGlobalTime, iGlobalTime * iGlobalTime, iGlobalTime * iGlobalTime * iGlobalTime); // this is for some of the fractals
@@ -16,23 +22,6 @@ vec4 vectorTime = vec4(iGlobalTime / 20.0, iGlobalTime, iGlobalTime * iGlobalTim
 in vec2 fragCoord;
 out vec4 fragColor;
 
-// camera settings
-uniform vec3 camPosition;
-uniform float camAngle;
-
-// light settings
-uniform vec3 lightPosition;
-uniform float shadowSmooth;
-uniform float shadowStrength;
-
-// background color
-uniform vec3 bgColor;
-uniform vec3 bgOcclusionColor;
-
-// fog limits
-uniform float fog_min_dist;
-uniform float fog_max_dist;
-
 // surface struct
 
 struct Surface 
@@ -49,66 +38,236 @@ struct Surface
     float signedDistance;
 };
 
+// scene state, uploaded from Visualization.sceneBlock in one buffer update
+// the member order has to match Visualization.getSceneBlockMembers
+
+layout(std140) uniform SceneBlock
+{
+    // camera settings
+    vec3 camPosition;
+    float camAngle;
+
+    // light settings
+    vec3 lightPosition;
+    float shadowSmooth;
+    float shadowStrength;
+
+    // background color
+    vec3 bgColor;
+    vec3 bgOcclusionColor;
+
+    // fog limits
+    float fog_min_dist;
+    float fog_max_dist;
+
+    // skeleton joint settings
+    vec3 jointColor;
+    float jointAmbientScale;
+    float jointDiffuseScale;
+    float jointSpecularScale;
+    float jointSpecularPow;
+    float jointOcclusionScale;
+    float jointOcclusionRange;
+    float jointOcclusionResolution;
+    vec3 jointOcclusionColor;
+
+    // skeleton edge settings
+    vec3 edgeColor;
+    float edgeAmbientScale;
+    float edgeDiffuseScale;
+    float edgeSpecularScale;
+    float edgeSpecularPow;
+    float edgeOcclusionScale;
+    float edgeOcclusionRange;
+    float edgeOcclusionResolution;
+    vec3 edgeOcclusionColor;
+
+    // combined smoothing factors
+    float jointEdgeSmoothing;
+    float skelObjectSmoothing;
+    
+    // sphere around all drawn primitives (center, radius), radius < 0 for none
+    vec4 sceneBound;
+};
+
+// per primitive settings, uploaded from Visualization.jointData, edgeData and objectData
+// one record of RGBA32F texels per primitive, the texel layout has to match Visualization.__init__
+
+uniform samplerBuffer jointData;
+uniform samplerBuffer edgeData;
+uniform samplerBuffer objectData;
+
+const int jointTexelCount = 7;
+const int edgeTexelCount = 7;
+const int objectTexelCount = 13;
+
+mat4 fetchTransform(samplerBuffer data, int first)
+{
+    return mat4(texelFetch(data, first), texelFetch(data, first + 1), texelFetch(data, first + 2), texelFetch(data, first + 3));
+}
+
 // skeleton joint settings
-uniform vec3 jointColor;
-uniform float jointAmbientScale;
-uniform float jointDiffuseScale;
-uniform float jointSpecularScale;
-uniform float jointSpecularPow;
-uniform float jointOcclusionScale;
-uniform float jointOcclusionRange;
-uniform float jointOcclusionResolution;
-uniform vec3 jointOcclusionColor;
-
-uniform int jointPrimitives[jointCount];
-uniform mat4 jointTransforms[jointCount];
-uniform vec3 jointSizes[jointCount];
-uniform float jointRoundings[jointCount];
-uniform float jointSmoothings[jointCount];
+mat4 jointTransform(int jI) { return fetchTransform(jointData, jI * jointTexelCount); }
+vec3 jointSize(int jI) { return texelFetch(jointData, jI * jointTexelCount + 4).xyz; }
+float jointRounding(int jI) { return texelFetch(jointData, jI * jointTexelCount + 4).w; }
+float jointSmoothing(int jI) { return texelFetch(jointData, jI * jointTexelCount + 5).x; }
+int jointPrimitive(int jI) { return int(texelFetch(jointData, jI * jointTexelCount + 5).y); }
+vec4 jointBound(int jI) { return texelFetch(jointData, jI * jointTexelCount + 6); }
 
 // skeleton edge settings
-uniform vec3 edgeColor;
-uniform float edgeAmbientScale;
-uniform float edgeDiffuseScale;
-uniform float edgeSpecularScale;
-uniform float edgeSpecularPow;
-uniform float edgeOcclusionScale;
-uniform float edgeOcclusionRange;
-uniform float edgeOcclusionResolution;
-uniform vec3 edgeOcclusionColor;
-
-uniform int edgePrimitives[edgeCount];
-uniform mat4 edgeTransforms[edgeCount];
-uniform float edgeLengths[edgeCount];
-uniform vec3 edgeSizes[edgeCount];
-uniform float edgeRoundings[edgeCount];
-uniform float edgeSmoothings[edgeCount];
+mat4 edgeTransform(int eI) { return fetchTransform(edgeData, eI * edgeTexelCount); }
+vec3 edgeSize(int eI) { return texelFetch(edgeData, eI * edgeTexelCount + 4).xyz; }
+float edgeRounding(int eI) { return texelFetch(edgeData, eI * edgeTexelCount + 4).w; }
+float edgeSmoothing(int eI) { return texelFetch(edgeData, eI * edgeTexelCount + 5).x; }
+int edgePrimitive(int eI) { return int(texelFetch(edgeData, eI * edgeTexelCount + 5).y); }
+float edgeLength(int eI) { return texelFetch(edgeData, eI * edgeTexelCount + 5).z; }
+vec4 edgeBound(int eI) { return texelFetch(edgeData, eI * edgeTexelCount + 6); }
 
 // object settings
-uniform vec3 objectColors[objectCount];
-uniform float objectAmbientScales[objectCount];
-uniform float objectDiffuseScales[objectCount];
-uniform float objectSpecularScales[objectCount];
-uniform float objectSpecularPows[objectCount];
-uniform float objectOcclusionScales[objectCount];
-uniform float objectOcclusionRanges[objectCount];
-uniform float objectOcclusionResolutions[objectCount];
-uniform vec3 objectOcclusionColors[objectCount];
-
-uniform vec3 objectFrequencies[objectCount];
-uniform vec3 objectAmplitudes[objectCount];
-uniform vec3 objectPhases[objectCount];
-
-uniform int objectPrimitives[objectCount];
-uniform mat4 objectTransforms[objectCount];
-uniform vec3 objectSizes[objectCount];
-uniform float objectRoundings[objectCount];
-uniform float objectSmoothings[objectCount];
-
-// combined smoothing factors
-
-uniform float jointEdgeSmoothing;
-uniform float skelObjectSmoothing;
+mat4 objectTransform(int oI) { return fetchTransform(objectData, oI * objectTexelCount); }
+vec3 objectSize(int oI) { return texelFetch(objectData, oI * objectTexelCount + 4).xyz; }
+float objectRounding(int oI) { return texelFetch(objectData, oI * objectTexelCount + 4).w; }
+float objectSmoothing(int oI) { return texelFetch(objectData, oI * objectTexelCount + 5).x; }
+int objectPrimitive(int oI) { return int(texelFetch(objectData, oI * objectTexelCount + 5).y); }
+vec3 objectColor(int oI) { return texelFetch(objectData, oI * objectTexelCount + 6).xyz; }
+float objectAmbientScale(int oI) { return texelFetch(objectData, oI * objectTexelCount + 6).w; }
+vec3 objectOcclusionColor(int oI) { return texelFetch(objectData, oI * objectTexelCount + 7).xyz; }
+float objectDiffuseScale(int oI) { return texelFetch(objectData, oI * objectTexelCount + 7).w; }
+vec3 objectFrequency(int oI) { return texelFetch(objectData, oI * objectTexelCount + 8).xyz; }
+float objectSpecularScale(int oI) { return texelFetch(objectData, oI * objectTexelCount + 8).w; }
+vec3 objectAmplitude(int oI) { return texelFetch(objectData, oI * objectTexelCount + 9).xyz; }
+float objectSpecularPow(int oI) { return texelFetch(objectData, oI * objectTexelCount + 9).w; }
+vec3 objectPhase(int oI) { return texelFetch(objectData, oI * objectTexelCount + 10).xyz; }
+float objectOcclusionScale(int oI) { return texelFetch(objectData, oI * objectTexelCount + 10).w; }
+float objectOcclusionRange(int oI) { return texelFetch(objectData, oI * objectTexelCount + 11).x; }
+float objectOcclusionResolution(int oI) { return texelFetch(objectData, oI * objectTexelCount + 11).y; }
+vec4 objectBound(int oI) { return texelFetch(objectData, oI * objectTexelCount + 12); }
+
+// distance to a bounding sphere (world center, radius padded by the smoothing radius), never more than the distance to the primitive plus its smoothing radius
+// primitives whose bound is at least as far as the smooth union of the primitives before them don't change the union and are skipped
+float boundDistance(vec3 samplePoint, vec4 bound)
+{
+    return length(samplePoint - bound.xyz) - bound.w;
+}
+
+// bounding sphere trees over the drawn joints, edges and objects, built by Visualization.updateBvh
+// node texels: 0 sphere, 1 indices of the child nodes and of the primitive of a leaf, -1 for none
+uniform samplerBuffer bvhData;
+
+const int jointBvhRoot = 0;
+const int edgeBvhRoot = 2 * jointCount;
+const int objectBvhRoot = 2 * (jointCount + edgeCount);
+
+#if TILE_BINNING != 0
+// leaves of the primitives whose bounding sphere covers a screen tile, binned by Visualization.updateTileBins
+// header texel per tile: first entry, number of joints, edges and objects, entries: leaf node, joints first, then edges and objects
+uniform isamplerBuffer tileHeaders;
+uniform isamplerBuffer tileEntries;
+uniform vec2 iResolution;
+
+// header of the tile of this fragment, set in main
+ivec4 fragmentTile;
+
+// true while main marches the primary ray and looks up its material, the other rays leave the tile
+bool tileMarch = false;
+
+ivec4 tileHeader(vec2 fragCoord)
+{
+    // fragCoord has x scaled by the aspect ratio, tiles count in pixels of the window from the bottom left
+    vec2 pixel = (fragCoord / vec2(iResolution.x / iResolution.y, 1.0) * 0.5 + 0.5) * iResolution;
+    ivec2 tileCount = ivec2(ceil(iResolution / float(TILE_SIZE)));
+    ivec2 tile = clamp(ivec2(pixel / float(TILE_SIZE)), ivec2(0), tileCount - 1);
+    
+    return texelFetch(tileHeaders, tile.y * tileCount.x + tile.x);
+}
+
+// entries of the joints (kind 0), edges (1) or objects (2) in the tile of this fragment
+ivec2 tileRange(int kind)
+{
+    int first = fragmentTile.x + (kind > 0 ? fragmentTile.y : 0) + (kind > 1 ? fragmentTile.z : 0);
+    
+    return ivec2(first, first + fragmentTile[kind + 1]);
+}
+#endif
+
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+struct BvhTraversal
+{
+    int stack[BVH_STACK_SIZE];
+    int stackSize;
+    
+    // tile entries still to visit, walked instead of the tree during the primary march
+    int entry;
+    int entryEnd;
+};
+
+BvhTraversal bvhBegin(int root, int kind)
+{
+    BvhTraversal traversal;
+    traversal.stack[0] = root;
+    traversal.stackSize = 1;
+    traversal.entry = 0;
+    traversal.entryEnd = 0;
+    
+#if TILE_BINNING != 0
+    if(tileMarch)
+    {
+        ivec2 range = tileRange(kind);
+        traversal.stackSize = 0;
+        traversal.entry = range.x;
+        traversal.entryEnd = range.y;
+    }
+#endif
+    
+    return traversal;
+}
+
+// returns the next primitive whose bound is nearer than dist, the smooth union of the primitives so far, or -1 if there is none
+// children are visited left to right, the leaves are ordered by primitive index, so the smooth union is taken in the same order
+// as without the tree and only skipped primitives, which don't change it, are left out
+// without PRIMITIVE_CULLING the tree is walked without skipping, to visit every drawn primitive
+int bvhNext(inout BvhTraversal traversal, vec3 samplePoint, float dist)
+{
+#if TILE_BINNING != 0
+    while(traversal.entry < traversal.entryEnd)
+    {
+        int leaf = texelFetch(tileEntries, traversal.entry).x;
+        traversal.entry += 1;
+        
+        if(boundDistance(samplePoint, texelFetch(bvhData, leaf * 2)) >= dist)
+            continue;
+        
+        return int(texelFetch(bvhData, leaf * 2 + 1).z);
+    }
+#endif
+    
+    while(traversal.stackSize > 0)
+    {
+        traversal.stackSize -= 1;
+        int node = traversal.stack[traversal.stackSize];
+        
+#if PRIMITIVE_CULLING != 0
+        if(boundDistance(samplePoint, texelFetch(bvhData, node * 2)) >= dist)
+            continue;
+#endif
+        
+        ivec4 links = ivec4(texelFetch(bvhData, node * 2 + 1));
+        
+        if(links.z >= 0)
+            return links.z;
+        
+        // inner nodes always have two children, a node without a primitive or a second child is the root of an empty tree
+        if(links.y < 0)
+            continue;
+        
+        traversal.stack[traversal.stackSize] = links.y;
+        traversal.stack[traversal.stackSize + 1] = links.x;
+        traversal.stackSize += 2;
+    }
+    
+    return -1;
+}
+#endif
 
 /*
 Affine Transformations
@@ -1183,154 +1342,231 @@ float sceneSDF(vec3 samplePoint)
 
     float distJoints = 1000.0;
     
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal jointTraversal = bvhBegin(jointBvhRoot, 0);
+    for(int jI = bvhNext(jointTraversal, samplePoint, distJoints); jI >= 0; jI = bvhNext(jointTraversal, samplePoint, distJoints))
+#else
     for(int jI=0; jI<jointCount; ++jI)
+#endif
     {
-        if(jointPrimitives[jI] < 0) // do nothing
+        if(jointPrimitive(jI) < 0) // do nothing
         {}
-        else if(jointPrimitives[jI] == 0) // sphere
+#if (JOINT_PRIMITIVES & (1 << 0)) != 0
+        else if(jointPrimitive(jI) == 0) // sphere
         {
-            distJoints = poly_smin( distJoints, sphereSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].x), jointSmoothings[jI] );
+            distJoints = poly_smin( distJoints, sphereSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).x), jointSmoothing(jI) );
         }
-        else if(jointPrimitives[jI] == 1) // box
+#endif
+#if (JOINT_PRIMITIVES & (1 << 1)) != 0
+        else if(jointPrimitive(jI) == 1) // box
         {
-            //distJoints = poly_smin( distJoints, boxSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI]), jointSmoothings[jI] );
-            distJoints = poly_smin( distJoints, roundBoxSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI], jointRoundings[jI]), jointSmoothings[jI] );
+            //distJoints = poly_smin( distJoints, boxSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI)), jointSmoothing(jI) );
+            distJoints = poly_smin( distJoints, roundBoxSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI), jointRounding(jI)), jointSmoothing(jI) );
         }
-        else if(jointPrimitives[jI] == 2) // capsule
+#endif
+#if (JOINT_PRIMITIVES & (1 << 2)) != 0
+        else if(jointPrimitive(jI) == 2) // capsule
         {
-            //distJoints = poly_smin( distJoints, CapsuleSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x), jointSmoothings[jI] ); 
-            distJoints = poly_smin( distJoints, roundCapsuleSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x, jointRoundings[jI]), jointSmoothings[jI] ); 
+            //distJoints = poly_smin( distJoints, CapsuleSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x), jointSmoothing(jI) ); 
+            distJoints = poly_smin( distJoints, roundCapsuleSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x, jointRounding(jI)), jointSmoothing(jI) ); 
         }
-        else if(jointPrimitives[jI] == 3) // cylinder
+#endif
+#if (JOINT_PRIMITIVES & (1 << 3)) != 0
+        else if(jointPrimitive(jI) == 3) // cylinder
         {
-            //distJoints = poly_smin( distJoints, cylinderSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x), jointSmoothings[jI] ); 
-            distJoints = poly_smin( distJoints, roundCylinderSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x, jointRoundings[jI]), jointSmoothings[jI] ); 
+            //distJoints = poly_smin( distJoints, cylinderSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x), jointSmoothing(jI) ); 
+            distJoints = poly_smin( distJoints, roundCylinderSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x, jointRounding(jI)), jointSmoothing(jI) ); 
         }
+#endif
     }
     
     float distEdges = 1000.0;
     
 
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal edgeTraversal = bvhBegin(edgeBvhRoot, 1);
+    for(int eI = bvhNext(edgeTraversal, samplePoint, distEdges); eI >= 0; eI = bvhNext(edgeTraversal, samplePoint, distEdges))
+#else
     for(int eI=0; eI<edgeCount; ++eI)
+#endif
     {
-        if(edgePrimitives[eI] < 0) // do nothing
+        if(edgePrimitive(eI) < 0) // do nothing
         {}
-        else if(edgePrimitives[eI] == 0) // sphere
+#if (EDGE_PRIMITIVES & (1 << 0)) != 0
+        else if(edgePrimitive(eI) == 0) // sphere
         {
-            distEdges = poly_smin( distEdges, sphereSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z), edgeSmoothings[eI] );
+            distEdges = poly_smin( distEdges, sphereSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z), edgeSmoothing(eI) );
         }
-        else if(edgePrimitives[eI] == 1) // box
+#endif
+#if (EDGE_PRIMITIVES & (1 << 1)) != 0
+        else if(edgePrimitive(eI) == 1) // box
         {
-            //distEdges = poly_smin( distEdges, boxSDF((edgeTransforms[eI] * samplePoint4D).xyz, vec3(edgeSizes[eI].x, edgeSizes[eI].y, edgeLengths[eI] * edgeSizes[eI].z)), edgeSmoothings[eI] );
-            distEdges = poly_smin( distEdges, roundBoxSDF((edgeTransforms[eI] * samplePoint4D).xyz, vec3(edgeSizes[eI].x, edgeSizes[eI].y, edgeLengths[eI] * edgeSizes[eI].z), edgeRoundings[eI]), edgeSmoothings[eI] );
+            //distEdges = poly_smin( distEdges, boxSDF((edgeTransform(eI) * samplePoint4D).xyz, vec3(edgeSize(eI).x, edgeSize(eI).y, edgeLength(eI) * edgeSize(eI).z)), edgeSmoothing(eI) );
+            distEdges = poly_smin( distEdges, roundBoxSDF((edgeTransform(eI) * samplePoint4D).xyz, vec3(edgeSize(eI).x, edgeSize(eI).y, edgeLength(eI) * edgeSize(eI).z), edgeRounding(eI)), edgeSmoothing(eI) );
         }
-        else if(edgePrimitives[eI] == 2) // capsule
+#endif
+#if (EDGE_PRIMITIVES & (1 << 2)) != 0
+        else if(edgePrimitive(eI) == 2) // capsule
         {
-            //distEdges = poly_smin( distEdges, CapsuleSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x), edgeSmoothings[eI] ); 
-            distEdges = poly_smin( distEdges, roundCapsuleSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x, edgeRoundings[eI]), edgeSmoothings[eI] ); 
+            //distEdges = poly_smin( distEdges, CapsuleSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x), edgeSmoothing(eI) ); 
+            distEdges = poly_smin( distEdges, roundCapsuleSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x, edgeRounding(eI)), edgeSmoothing(eI) ); 
         }
-        else if(edgePrimitives[eI] == 3) // cylinder
+#endif
+#if (EDGE_PRIMITIVES & (1 << 3)) != 0
+        else if(edgePrimitive(eI) == 3) // cylinder
         {
-            //distEdges = poly_smin( distEdges, cylinderSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x), edgeSmoothings[eI] ); 
-            distEdges = poly_smin( distEdges, roundCylinderSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x, edgeRoundings[eI]), edgeSmoothings[eI] ); 
+            //distEdges = poly_smin( distEdges, cylinderSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x), edgeSmoothing(eI) ); 
+            distEdges = poly_smin( distEdges, roundCylinderSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x, edgeRounding(eI)), edgeSmoothing(eI) ); 
         }
+#endif
     }
     
     float distObjects = 1000.0;
     
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal objectTraversal = bvhBegin(objectBvhRoot, 2);
+    for(int oI = bvhNext(objectTraversal, samplePoint, distObjects); oI >= 0; oI = bvhNext(objectTraversal, samplePoint, distObjects))
+#else
     for(int oI=0; oI<objectCount; ++oI)
+#endif
     {    
-        if(objectPrimitives[oI] < 0) // do nothing
+        if(objectPrimitive(oI) < 0) // do nothing
         {}
-        else if(objectPrimitives[oI] == 0) // sphere
+#if (OBJECT_PRIMITIVES & (1 << 0)) != 0
+        else if(objectPrimitive(oI) == 0) // sphere
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, sphereSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, sphereSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x), objectSmoothing(oI) );
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleSphereSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x, objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI] ), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleSphereSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x, objectFrequency(oI), objectAmplitude(oI), objectPhase(oI) ), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 1) // box
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 1)) != 0
+        else if(objectPrimitive(oI) == 1) // box
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, roundBoxSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI], objectRoundings[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, roundBoxSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI), objectRounding(oI)), objectSmoothing(oI) );
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleBoxSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI], objectRoundings[oI], objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleBoxSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI), objectRounding(oI), objectFrequency(oI), objectAmplitude(oI), objectPhase(oI)), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 2) // capsule
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 2)) != 0
+        else if(objectPrimitive(oI) == 2) // capsule
         {
-            distObjects = poly_smin( distObjects, roundCapsuleSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI]), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, roundCapsuleSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI)), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 3) // cylinder
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 3)) != 0
+        else if(objectPrimitive(oI) == 3) // cylinder
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, roundCylinderSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI]), objectSmoothings[oI] ); 
+                distObjects = poly_smin( distObjects, roundCylinderSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI)), objectSmoothing(oI) ); 
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleCylinderSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI], objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleCylinderSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI), objectFrequency(oI), objectAmplitude(oI), objectPhase(oI)), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 4) // truchetTower
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 4)) != 0
+        else if(objectPrimitive(oI) == 4) // truchetTower
         {
-            distObjects = poly_smin( distObjects, truchetTower((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, truchetTower((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 5) // apollonian1
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 5)) != 0
+        else if(objectPrimitive(oI) == 5) // apollonian1
         {
-            distObjects = poly_smin( distObjects, apollonian1((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, apollonian1((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 6) // Thing2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 6)) != 0
+        else if(objectPrimitive(oI) == 6) // Thing2
         {
-            distObjects = poly_smin( distObjects, Thing2((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, Thing2((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 7) // kaliBox
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 7)) != 0
+        else if(objectPrimitive(oI) == 7) // kaliBox
         {
-            distObjects = poly_smin( distObjects, kaliBox((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, kaliBox((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }        
-        else if(objectPrimitives[oI] == 8) // mandelbulb_v2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 8)) != 0
+        else if(objectPrimitive(oI) == 8) // mandelbulb_v2
         {
-            distObjects = poly_smin( distObjects, mandelbulb_v2(((objectTransforms[oI] * samplePoint4D).xyz) * 0.2, objectSizes[oI]), objectSmoothings[oI] ) / 0.2; 
+            distObjects = poly_smin( distObjects, mandelbulb_v2(((objectTransform(oI) * samplePoint4D).xyz) * 0.2, objectSize(oI)), objectSmoothing(oI) ) / 0.2; 
         }                
-        else if(objectPrimitives[oI] == 9) // merger
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 9)) != 0
+        else if(objectPrimitive(oI) == 9) // merger
         {
-            distObjects = poly_smin( distObjects, merger((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, merger((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }    
-        else if(objectPrimitives[oI] == 10) // sierpinskiPyramid
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 10)) != 0
+        else if(objectPrimitive(oI) == 10) // sierpinskiPyramid
         {
-            distObjects = poly_smin( distObjects, sierpinskiPyramid((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, sierpinskiPyramid((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }                
-        else if(objectPrimitives[oI] == 11) // mengerSponge
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 11)) != 0
+        else if(objectPrimitive(oI) == 11) // mengerSponge
         {
-            distObjects = poly_smin( distObjects, mengerSponge((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, mengerSponge((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }   
-        else if(objectPrimitives[oI] == 12) // alteredMenger
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 12)) != 0
+        else if(objectPrimitive(oI) == 12) // alteredMenger
         {
-            distObjects = poly_smin( distObjects, alteredMenger((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, alteredMenger((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }                 
-        else if(objectPrimitives[oI] == 13) // evolvingFractal
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 13)) != 0
+        else if(objectPrimitive(oI) == 13) // evolvingFractal
         {
-            distObjects = poly_smin( distObjects, evolvingFractal((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, evolvingFractal((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }  
-        else if(objectPrimitives[oI] == 14) // evolvingFractal2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 14)) != 0
+        else if(objectPrimitive(oI) == 14) // evolvingFractal2
         {
-            distObjects = poly_smin( distObjects, evolvingFractal2((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, evolvingFractal2((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }      
-        else if(objectPrimitives[oI] == 15) // mandelbulbSDF
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 15)) != 0
+        else if(objectPrimitive(oI) == 15) // mandelbulbSDF
         {
-            distObjects = poly_smin( distObjects, mandelbulbSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, mandelbulbSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 16) // julia
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 16)) != 0
+        else if(objectPrimitive(oI) == 16) // julia
         {
-            distObjects = poly_smin( distObjects, julia((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI]), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, julia((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI)), objectSmoothing(oI) ); 
         }        
+#endif
 
     }
     
@@ -1370,26 +1606,39 @@ Surface sceneSDF_surface(vec3 samplePoint)
     // skeleton joints
     float distJoints = 1000.0;
     
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal jointTraversal = bvhBegin(jointBvhRoot, 0);
+    for(int jI = bvhNext(jointTraversal, samplePoint, distJoints); jI >= 0; jI = bvhNext(jointTraversal, samplePoint, distJoints))
+#else
     for(int jI=0; jI<jointCount; ++jI)
+#endif
     {
-        if(jointPrimitives[jI] < 0) // do nothing
+        if(jointPrimitive(jI) < 0) // do nothing
         {}
-        else if(jointPrimitives[jI] == 0) // sphere
+#if (JOINT_PRIMITIVES & (1 << 0)) != 0
+        else if(jointPrimitive(jI) == 0) // sphere
         {
-            distJoints = poly_smin( distJoints, sphereSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].x), jointSmoothings[jI] );
+            distJoints = poly_smin( distJoints, sphereSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).x), jointSmoothing(jI) );
         }
-        else if(jointPrimitives[jI] == 1) // box
+#endif
+#if (JOINT_PRIMITIVES & (1 << 1)) != 0
+        else if(jointPrimitive(jI) == 1) // box
         {
-            distJoints = poly_smin( distJoints, roundBoxSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI], jointRoundings[jI]), jointSmoothings[jI] );
+            distJoints = poly_smin( distJoints, roundBoxSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI), jointRounding(jI)), jointSmoothing(jI) );
         }
-        else if(jointPrimitives[jI] == 2) // capsule
+#endif
+#if (JOINT_PRIMITIVES & (1 << 2)) != 0
+        else if(jointPrimitive(jI) == 2) // capsule
         {
-            distJoints = poly_smin( distJoints, roundCapsuleSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x, jointRoundings[jI]), jointSmoothings[jI] ); 
+            distJoints = poly_smin( distJoints, roundCapsuleSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x, jointRounding(jI)), jointSmoothing(jI) ); 
         }
-        else if(jointPrimitives[jI] == 3) // cylinder
+#endif
+#if (JOINT_PRIMITIVES & (1 << 3)) != 0
+        else if(jointPrimitive(jI) == 3) // cylinder
         {
-            distJoints = poly_smin( distJoints, roundCylinderSDF((jointTransforms[jI] * samplePoint4D).xyz, jointSizes[jI].z, jointSizes[jI].x, jointRoundings[jI]), jointSmoothings[jI] ); 
+            distJoints = poly_smin( distJoints, roundCylinderSDF((jointTransform(jI) * samplePoint4D).xyz, jointSize(jI).z, jointSize(jI).x, jointRounding(jI)), jointSmoothing(jI) ); 
         }
+#endif
     }
     
     Surface jointSurface = Surface(jointColor, jointAmbientScale, jointDiffuseScale, jointSpecularScale, jointSpecularPow, jointOcclusionScale, jointOcclusionRange, jointOcclusionResolution, jointOcclusionColor, distJoints);
@@ -1397,26 +1646,39 @@ Surface sceneSDF_surface(vec3 samplePoint)
     // skeleton edges
     float distEdges = 1000.0;
     
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal edgeTraversal = bvhBegin(edgeBvhRoot, 1);
+    for(int eI = bvhNext(edgeTraversal, samplePoint, distEdges); eI >= 0; eI = bvhNext(edgeTraversal, samplePoint, distEdges))
+#else
     for(int eI=0; eI<edgeCount; ++eI)
+#endif
     {
-        if(edgePrimitives[eI] < 0) // do nothing
+        if(edgePrimitive(eI) < 0) // do nothing
         {}
-        else if(edgePrimitives[eI] == 0) // sphere
+#if (EDGE_PRIMITIVES & (1 << 0)) != 0
+        else if(edgePrimitive(eI) == 0) // sphere
         {
-            distEdges = poly_smin( distEdges, sphereSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z), edgeSmoothings[eI] );
+            distEdges = poly_smin( distEdges, sphereSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z), edgeSmoothing(eI) );
         }
-        else if(edgePrimitives[eI] == 1) // box
+#endif
+#if (EDGE_PRIMITIVES & (1 << 1)) != 0
+        else if(edgePrimitive(eI) == 1) // box
         {
-            distEdges = poly_smin( distEdges, roundBoxSDF((edgeTransforms[eI] * samplePoint4D).xyz, vec3(edgeSizes[eI].x, edgeSizes[eI].y, edgeLengths[eI] * edgeSizes[eI].z), edgeRoundings[eI]), edgeSmoothings[eI] );
+            distEdges = poly_smin( distEdges, roundBoxSDF((edgeTransform(eI) * samplePoint4D).xyz, vec3(edgeSize(eI).x, edgeSize(eI).y, edgeLength(eI) * edgeSize(eI).z), edgeRounding(eI)), edgeSmoothing(eI) );
         }
-        else if(edgePrimitives[eI] == 2) // capsule
+#endif
+#if (EDGE_PRIMITIVES & (1 << 2)) != 0
+        else if(edgePrimitive(eI) == 2) // capsule
         {
-            distEdges = poly_smin( distEdges, roundCapsuleSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x, edgeRoundings[eI]), edgeSmoothings[eI] ); 
+            distEdges = poly_smin( distEdges, roundCapsuleSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x, edgeRounding(eI)), edgeSmoothing(eI) ); 
         }
-        else if(edgePrimitives[eI] == 3) // cylinder
+#endif
+#if (EDGE_PRIMITIVES & (1 << 3)) != 0
+        else if(edgePrimitive(eI) == 3) // cylinder
         {
-            distEdges = poly_smin( distEdges, roundCylinderSDF((edgeTransforms[eI] * samplePoint4D).xyz, edgeLengths[eI] * edgeSizes[eI].z, edgeSizes[eI].x, edgeRoundings[eI]), edgeSmoothings[eI] ); 
+            distEdges = poly_smin( distEdges, roundCylinderSDF((edgeTransform(eI) * samplePoint4D).xyz, edgeLength(eI) * edgeSize(eI).z, edgeSize(eI).x, edgeRounding(eI)), edgeSmoothing(eI) ); 
         }
+#endif
     }
     
     Surface edgeSurface = Surface(edgeColor, edgeAmbientScale, edgeDiffuseScale, edgeSpecularScale, edgeSpecularPow, edgeOcclusionScale, edgeOcclusionRange, edgeOcclusionResolution, edgeOcclusionColor, distEdges);
@@ -1426,104 +1688,155 @@ Surface sceneSDF_surface(vec3 samplePoint)
     float maxDistObjects = 1000.0;
     Surface objectSurface = Surface(vec3(0.0, 0.0, 0.0), 0.0, 0.0, 0.0, 10.0, 0.0, 0.5, 0.5, vec3(0.0, 0.0, 0.0), 1000.0);
     
+#if PRIMITIVE_CULLING != 0 || TILE_BINNING != 0
+    BvhTraversal objectTraversal = bvhBegin(objectBvhRoot, 2);
+    for(int oI = bvhNext(objectTraversal, samplePoint, objectSurface.signedDistance); oI >= 0; oI = bvhNext(objectTraversal, samplePoint, objectSurface.signedDistance))
+#else
     for(int oI=0; oI<objectCount; ++oI)
+#endif
     {    
         distObjects = 1000.0;
     
-        if(objectPrimitives[oI] < 0) // do nothing
+        if(objectPrimitive(oI) < 0) // do nothing
         {}
-        else if(objectPrimitives[oI] == 0) // sphere
+#if (OBJECT_PRIMITIVES & (1 << 0)) != 0
+        else if(objectPrimitive(oI) == 0) // sphere
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, sphereSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, sphereSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x), objectSmoothing(oI) );
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleSphereSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x, objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI] ), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleSphereSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x, objectFrequency(oI), objectAmplitude(oI), objectPhase(oI) ), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 1) // box
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 1)) != 0
+        else if(objectPrimitive(oI) == 1) // box
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, roundBoxSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI], objectRoundings[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, roundBoxSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI), objectRounding(oI)), objectSmoothing(oI) );
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleBoxSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI], objectRoundings[oI], objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleBoxSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI), objectRounding(oI), objectFrequency(oI), objectAmplitude(oI), objectPhase(oI)), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 2) // capsule
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 2)) != 0
+        else if(objectPrimitive(oI) == 2) // capsule
         {
-            distObjects = poly_smin( distObjects, roundCapsuleSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI]), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, roundCapsuleSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI)), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 3) // cylinder
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 3)) != 0
+        else if(objectPrimitive(oI) == 3) // cylinder
         {
-            if(objectAmplitudes[oI] == 0) // non-rippling
+#if OBJECT_RIPPLES != 0
+            if(objectAmplitude(oI) == vec3(0.0)) // non-rippling
+#endif
             {
-                distObjects = poly_smin( distObjects, roundCylinderSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI]), objectSmoothings[oI] ); 
+                distObjects = poly_smin( distObjects, roundCylinderSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI)), objectSmoothing(oI) ); 
             }
+#if OBJECT_RIPPLES != 0
             else
             {
-                distObjects = poly_smin( distObjects, rippleCylinderSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z, objectSizes[oI].x, objectRoundings[oI], objectFrequencies[oI], objectAmplitudes[oI], objectPhases[oI]), objectSmoothings[oI] );
+                distObjects = poly_smin( distObjects, rippleCylinderSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z, objectSize(oI).x, objectRounding(oI), objectFrequency(oI), objectAmplitude(oI), objectPhase(oI)), objectSmoothing(oI) );
             }
+#endif
         }
-        else if(objectPrimitives[oI] == 4) // truchetTower
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 4)) != 0
+        else if(objectPrimitive(oI) == 4) // truchetTower
         {
-            distObjects = poly_smin( distObjects, truchetTower((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, truchetTower((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 5) // apollonian1
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 5)) != 0
+        else if(objectPrimitive(oI) == 5) // apollonian1
         {
-            distObjects = poly_smin( distObjects, apollonian1((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].z), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, apollonian1((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).z), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 6) // Thing2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 6)) != 0
+        else if(objectPrimitive(oI) == 6) // Thing2
         {
-            distObjects = poly_smin( distObjects, Thing2((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, Thing2((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 7) // kaliBox
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 7)) != 0
+        else if(objectPrimitive(oI) == 7) // kaliBox
         {
-            distObjects = poly_smin( distObjects, kaliBox((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, kaliBox((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 8) // mandelbulb_v2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 8)) != 0
+        else if(objectPrimitive(oI) == 8) // mandelbulb_v2
         {
-            distObjects = poly_smin( distObjects, mandelbulb_v2((objectTransforms[oI] * samplePoint4D).xyz * 0.2, objectSizes[oI]), objectSmoothings[oI] ) / 0.2; 
+            distObjects = poly_smin( distObjects, mandelbulb_v2((objectTransform(oI) * samplePoint4D).xyz * 0.2, objectSize(oI)), objectSmoothing(oI) ) / 0.2; 
         }
-        else if(objectPrimitives[oI] == 9) // merger
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 9)) != 0
+        else if(objectPrimitive(oI) == 9) // merger
         {
-            distObjects = poly_smin( distObjects, merger((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, merger((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }       
-        else if(objectPrimitives[oI] == 10) // sierpinskiPyramid
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 10)) != 0
+        else if(objectPrimitive(oI) == 10) // sierpinskiPyramid
         {
-            distObjects = poly_smin( distObjects, sierpinskiPyramid((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, sierpinskiPyramid((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }    
-        else if(objectPrimitives[oI] == 11) // mengerSponge
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 11)) != 0
+        else if(objectPrimitive(oI) == 11) // mengerSponge
         {
-            distObjects = poly_smin( distObjects, mengerSponge((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, mengerSponge((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         } 
-        else if(objectPrimitives[oI] == 12) // alteredMenger
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 12)) != 0
+        else if(objectPrimitive(oI) == 12) // alteredMenger
         {
-            distObjects = poly_smin( distObjects, alteredMenger((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, alteredMenger((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }   
-        else if(objectPrimitives[oI] == 13) // evolvingFractal
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 13)) != 0
+        else if(objectPrimitive(oI) == 13) // evolvingFractal
         {
-            distObjects = poly_smin( distObjects, evolvingFractal((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, evolvingFractal((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }     
-        else if(objectPrimitives[oI] == 14) // evolvingFractal2
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 14)) != 0
+        else if(objectPrimitive(oI) == 14) // evolvingFractal2
         {
-            distObjects = poly_smin( distObjects, evolvingFractal2((objectTransforms[oI] * samplePoint4D).xyz), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, evolvingFractal2((objectTransform(oI) * samplePoint4D).xyz), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 15) // mandelbulbSDF
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 15)) != 0
+        else if(objectPrimitive(oI) == 15) // mandelbulbSDF
         {
-            distObjects = poly_smin( distObjects, mandelbulbSDF((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI].x), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, mandelbulbSDF((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI).x), objectSmoothing(oI) ); 
         }
-        else if(objectPrimitives[oI] == 16) // julia
+#endif
+#if (OBJECT_PRIMITIVES & (1 << 16)) != 0
+        else if(objectPrimitive(oI) == 16) // julia
         {
-            distObjects = poly_smin( distObjects, julia((objectTransforms[oI] * samplePoint4D).xyz, objectSizes[oI]), objectSmoothings[oI] ); 
+            distObjects = poly_smin( distObjects, julia((objectTransform(oI) * samplePoint4D).xyz, objectSize(oI)), objectSmoothing(oI) ); 
         }   
+#endif
         
-        Surface tmpSurface = Surface(objectColors[oI], objectAmbientScales[oI], objectDiffuseScales[oI], objectSpecularScales[oI], objectSpecularPows[oI], objectOcclusionScales[oI], objectOcclusionRanges[oI], objectOcclusionResolutions[oI], objectOcclusionColors[oI], distObjects);
-        objectSurface = union_surface(tmpSurface, objectSurface, objectSmoothings[oI]);
+        Surface tmpSurface = Surface(objectColor(oI), objectAmbientScale(oI), objectDiffuseScale(oI), objectSpecularScale(oI), objectSpecularPow(oI), objectOcclusionScale(oI), objectOcclusionRange(oI), objectOcclusionResolution(oI), objectOcclusionColor(oI), distObjects);
+        objectSurface = union_surface(tmpSurface, objectSurface, objectSmoothing(oI));
         
         if(maxDistObjects > distObjects)
         {
@@ -1672,6 +1985,34 @@ Surface shortestDistanceToSurface_surface(vec3 eye, vec3 marchingDirection, floa
 }
             
 
+/**
+ * Return the distances along a ray at which it enters and leaves the scene bound, clamped to MIN_DIST and MAX_DIST,
+ * x >= y if the ray misses it. There is no surface outside of the bound.
+ * 
+ * eye: the eye point, acting as the origin of the ray
+ * direction: the normalized direction of the ray
+ */
+vec2 sceneBoundRange(vec3 eye, vec3 direction)
+{
+    if(sceneBound.w < 0.0)
+    {
+        return vec2(MIN_DIST, MAX_DIST);
+    }
+    
+    vec3 offset = eye - sceneBound.xyz;
+    float b = dot(offset, direction);
+    float h = b * b - dot(offset, offset) + sceneBound.w * sceneBound.w;
+    
+    if(h < 0.0)
+    {
+        return vec2(MAX_DIST, MIN_DIST);
+    }
+    
+    h = sqrt(h);
+    
+    return vec2(max(-b - h, MIN_DIST), min(-b + h, MAX_DIST));
+}
+
 /**
  * Return the normalized direction to march in from the eye point for a single pixel.
  * 
@@ -1687,14 +2028,18 @@ vec3 rayDirection(float fieldOfView, vec2 fragCoord)
 
 /**
  * Using the gradient of the SDF, estimate the normal on the surface at point p.
+ * The SDF is sampled at the 4 corners of a tetrahedron EPSILON away from p, instead of 6 central differences.
  */
 vec3 estimateNormal(vec3 p) 
 {
-    return normalize(vec3(
-        sceneSDF(vec3(p.x + EPSILON, p.y, p.z)) - sceneSDF(vec3(p.x - EPSILON, p.y, p.z)),
-        sceneSDF(vec3(p.x, p.y + EPSILON, p.z)) - sceneSDF(vec3(p.x, p.y - EPSILON, p.z)),
-        sceneSDF(vec3(p.x, p.y, p.z  + EPSILON)) - sceneSDF(vec3(p.x, p.y, p.z - EPSILON))
-    ));
+    const vec2 k = vec2(1.0, -1.0) * 0.5773;
+    
+    return normalize(
+        k.xyy * sceneSDF(p + k.xyy * EPSILON) +
+        k.yyx * sceneSDF(p + k.yyx * EPSILON) +
+        k.yxy * sceneSDF(p + k.yxy * EPSILON) +
+        k.xxx * sceneSDF(p + k.xxx * EPSILON)
+    );
 }
 
 /**
@@ -1707,15 +2052,15 @@ vec3 estimateNormal(vec3 p)
  * k_s: Specular color
  * alpha: Shininess coefficient
  * p: position of point being lit
+ * N: surface normal at p
  * eye: the position of the camera
  * lightPos: the position of the light
  * lightIntensity: color/intensity of the light
  *
  * See https://en.wikipedia.org/wiki/Phong_reflection_model#Description
  */
-vec3 phongContribForLight(vec3 p, vec3 eye, vec3 lightPos, vec3 diffuseColor, float diffuseScale, vec3 specularColor, float specularScale, float specularPow) 
+vec3 phongContribForLight(vec3 p, vec3 N, vec3 eye, vec3 lightPos, vec3 diffuseColor, float diffuseScale, vec3 specularColor, float specularScale, float specularPow) 
 {
-    vec3 N = estimateNormal(p);
     vec3 L = normalize(lightPos - p);
     vec3 V = normalize(eye - p);
     vec3 R = normalize(reflect(-L, N));
@@ -1791,18 +2136,32 @@ mat4 viewMatrix(vec3 eye, vec3 center, vec3 up)
 
 void main()
 {
+#if TILE_BINNING != 0
+    fragmentTile = tileHeader(fragCoord);
+    tileMarch = true;
+#endif
+    
     vec3 viewDir = rayDirection(camAngle, fragCoord);
     vec3 eye = camPosition;
     mat4 viewToWorld = viewMatrix(eye, vec3(0.0, 0.0, 0.0), vec3(0.0, 0.0, -1.0));
     vec3 worldDir = (viewToWorld * vec4(viewDir, 0.0)).xyz;
     
-    Surface surface = shortestDistanceToSurface_surface(eye, worldDir, MIN_DIST, MAX_DIST);
-    float dist = surface.signedDistance;
+    // rays that miss the scene bound are background, the others are marched from where they enter it to where they leave it
+    vec2 marchRange = sceneBoundRange(eye, worldDir);
+    
+    if (marchRange.x >= marchRange.y)
+    {
+        fragColor = vec4(bgColor, 1.0);
+        return;
+    }
+    
+    // the march only needs distances, the material is looked up once at the hit
+    float dist = shortestDistanceToSurface(eye, worldDir, marchRange.x, marchRange.y);
     
-    if (dist > MAX_DIST - EPSILON) 
+    if (dist > marchRange.y - EPSILON) 
     {
         // Didn't hit anything
-        fragColor = vec4(surface.color, 1.0);
+        fragColor = vec4(bgColor, 1.0);
         return;
     }
 
@@ -1810,6 +2169,15 @@ void main()
     // The closest point on the surface to the eyepoint along the view ray
     vec3 p = eye + dist * worldDir;
     
+    Surface surface = sceneSDF_surface(p);
+    
+#if TILE_BINNING != 0
+    tileMarch = false;
+#endif
+    
+    // one normal for lighting and ambient occlusion
+    vec3 surfaceNormal = estimateNormal(p);
+    
     vec3 color1 = surface.color * surface.ambientScale;
     
     // soft shadows
@@ -1825,13 +2193,12 @@ void main()
         lightStrength = (1.0 - shadowStrength) + lightStrength * shadowStrength;
     }
 
-    color1 += phongContribForLight(p, eye, lightPosition, surface.color, surface.diffuseScale, surface.color, surface.specularScale, surface.specularPow ) * lightStrength;
+    color1 += phongContribForLight(p, surfaceNormal, eye, lightPosition, surface.color, surface.diffuseScale, surface.color, surface.specularScale, surface.specularPow ) * lightStrength;
     
     // ambient occlusion
     vec3 colorDiff = color1 - surface.occlusionColor;
  
     vec3 surfacePos = eye + dist * worldDir;
-    vec3 surfaceNormal = estimateNormal(surfacePos);
     float occlusionStrength = ambientOcclusion(surfacePos, surfaceNormal, surface.occlusionRange, surface.occlusionResolution);
     //float occlusionStrength = doAoSSS(surfacePos, surfaceNormal, surface.occlusionRange, surface.occlusionResolution);
     
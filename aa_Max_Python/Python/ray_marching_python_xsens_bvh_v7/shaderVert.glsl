@@ -1,6 +1,7 @@
 #version 330 core
 
-in vec2 position;
+// the same location in every shader variant, the render quad is set up once
+layout(location = 0) in vec2 position;
 
 out vec2 fragCoord;
 
@@ -0,0 +1,83 @@
+import logging
+import queue
+
+import OpenGL.GL as gl
+from PyQt5.QtCore import QThread, QCoreApplication
+from PyQt5.QtGui import QOpenGLContext, QOffscreenSurface
+
+class ShaderCompileThread(QThread):
+    """
+    Compiles ShaderPrograms on a second OpenGL context that shares its objects with the render context,
+    for drivers without ARB_parallel_shader_compile, where compiling on the render thread would stall drawing.
+    Has to be created on the GUI thread, compile queues a program, its isReady turns True once it is built.
+    """
+
+    def __init__(self, shareContext):
+
+        super().__init__()
+
+        self.logger = logging.getLogger(__name__)
+        self.jobs = queue.Queue()
+
+        # the surface must be created on the GUI thread, the context is used on this thread only
+        self.surface = QOffscreenSurface()
+        self.surface.setFormat(shareContext.format())
+        self.surface.create()
+
+        self.context = QOpenGLContext()
+        self.context.setFormat(shareContext.format())
+        self.context.setShareContext(shareContext)
+        self.context.create()
+        self.context.moveToThread(self)
+
+    def isValid(self):
+        """
+        Returns True if the context was created and shares objects with the render context
+        """
+
+        return self.surface.isValid() == True and self.context.isValid() == True and self.context.shareContext() is not None
+
+    def compile(self, shaderProgram, programCache):
+        """
+        Expects a ShaderProgram that wasn't started and a ProgramCache or None
+        """
+
+        # the program isn't ready until the thread built it
+        shaderProgram.background = True
+
+        self.jobs.put((shaderProgram, programCache))
+
+    def run(self):
+
+        current = self.context.makeCurrent(self.surface)
+
+        if current == False:
+            self.logger.error("shader compile context can't be made current, variants are not compiled")
+
+        while True:
+            job = self.jobs.get()
+
+            if job is None:
+                break
+
+            shaderProgram, programCache = job
+
+            if current == True:
+                shaderProgram.build(gl, programCache)
+            else:
+                shaderProgram.failed = True
+                shaderProgram.built.set()
+
+        if current == True:
+            self.context.doneCurrent()
+
+        # the context is destroyed by the GUI thread
+        self.context.moveToThread(QCoreApplication.instance().thread())
+
+    def stop(self):
+        """
+        Finishes the queued programs and ends the thread
+        """
+
+        self.jobs.put(None)
+        self.wait()
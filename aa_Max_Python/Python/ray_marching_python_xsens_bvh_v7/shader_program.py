@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+
+try:
+    from OpenGL.GL.ARB.parallel_shader_compile import glMaxShaderCompilerThreadsARB, GL_COMPLETION_STATUS_ARB
+except ImportError:
+    glMaxShaderCompilerThreadsARB = None
+    GL_COMPLETION_STATUS_ARB = 0x91B1
+
+def shader_with_defines(code, defines):
+    """
+    Expects glsl source starting with a #version line and a dict of macro names and values
+    Returns the source with a #define line per macro inserted after the #version line
+    """
+
+    lines = code.split("\n")
+    versionIndex = 0
+
+    for lI, line in enumerate(lines):
+        if line.strip().startswith("#version"):
+            versionIndex = lI + 1
+            break
+
+    defineLines = ["#define " + name + " " + str(value) for name, value in defines.items()]
+
+    return "\n".join(lines[:versionIndex] + defineLines + lines[versionIndex:])
+
+def enable_parallel_shader_compile(gl):
+    """
+    Returns True if the context compiles and links on driver threads (ARB_parallel_shader_compile),
+    the completion of a program can then be polled without blocking
+    """
+
+    if glMaxShaderCompilerThreadsARB is None or not bool(glMaxShaderCompilerThreadsARB):
+        return False
+
+    # let the driver choose the number of threads
+    glMaxShaderCompilerThreadsARB(0xFFFFFFFF)
+
+    return True
+
+class ShaderProgram():
+    """
+    One variant of the vertex and fragment shader, compiled with a set of defines
+    start begins compiling (or loads the variant from a ProgramCache), isReady tells if it can be used.
+    With parallel compilation isReady doesn't block while the driver is still working on the program,
+    without it the first call to isReady waits for the compilation to finish.
+    A ShaderCompileThread compiles the variant in the background instead, see build.
+    A variant that fails to compile or link is never ready, isFailed tells it apart from one still compiling.
+    """
+
+    def __init__(self, vertexCode, fragmentCode, defines):
+
+        self.defines = defines
+        self.vertexSource = vertexCode
+        self.fragmentSource = shader_with_defines(fragmentCode, defines)
+
+        self.program = None
+        self.vertex = None
+        self.fragment = None
+        self.cacheKey = None
+        self.programCache = None
+        self.parallel = False
+        self.linked = False
+        self.failed = False
+        self.startTime = 0.0
+
+        # set by build once the program compiled on another context can be used
+        self.background = False
+        self.built = threading.Event()
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self, gl, programCache, parallel):
+        """
+        Expects a ProgramCache or None and whether the context compiles in parallel
+        """
+
+        self.programCache = programCache
+        self.parallel = parallel
+        self.startTime = time.time()
+
+        self.program = gl.glCreateProgram()
+
+        if programCache is not None and programCache.isSupported(gl) == True:
+            self.cacheKey = programCache.getKey(gl, [self.vertexSource, self.fragmentSource], self.defines)
+
+            if programCache.load(gl, self.program, self.cacheKey) == True:
+                self.logger.info("shader program %s loaded from cache in %.3f s", self.defines, time.time() - self.startTime)
+                self.linked = True
+                return
+
+        self.vertex = gl.glCreateShader(gl.GL_VERTEX_SHADER)
+        self.fragment = gl.glCreateShader(gl.GL_FRAGMENT_SHADER)
+
+        # Set shaders source
+        gl.glShaderSource(self.vertex, self.vertexSource)
+        gl.glShaderSource(self.fragment, self.fragmentSource)
+
+        # compile and link without querying the status, which would wait for the driver
+        gl.glCompileShader(self.vertex)
+        gl.glCompileShader(self.fragment)
+
+        gl.glAttachShader(self.program, self.vertex)
+        gl.glAttachShader(self.program, self.fragment)
+
+        if self.cacheKey is not None:
+            gl.glProgramParameteri(self.program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+
+        gl.glLinkProgram(self.program)
+
+    def build(self, gl, programCache):
+        """
+        Compiles and links the program on the calling thread's context, waiting for the result
+        Called by a ShaderCompileThread, whose context shares its objects with the render context
+        """
+
+        self.background = True
+
+        try:
+            self.start(gl, programCache, False)
+            self.finish(gl)
+
+            # the program is complete before the render context uses it
+            gl.glFinish()
+        except Exception:
+            self.logger.exception("shader program %s failed to build", self.defines)
+            self.failed = True
+
+        self.built.set()
+
+    def isReady(self, gl):
+        """
+        Returns True if the program is linked and can be used
+        """
+
+        if self.background == True:
+            return self.built.is_set() and self.linked == True
+
+        if self.linked == True:
+            return True
+
+        if self.failed == True:
+            return False
+
+        if self.parallel == True and not gl.glGetProgramiv(self.program, GL_COMPLETION_STATUS_ARB):
+            return False
+
+        return self.finish(gl)
+
+    def isFailed(self):
+        """
+        Returns True if compiling or linking the program failed
+        """
+
+        return self.failed == True and (self.background == False or self.built.is_set())
+
+    def isPending(self):
+        """
+        Returns True while a ShaderCompileThread works on the program, it must not be deleted then
+        """
+
+        return self.background == True and not self.built.is_set()
+
+    def finish(self, gl):
+        """
+        Waits for compiling and linking to finish and checks the results
+        Returns True if the program is linked, False if compiling or linking failed (the error is logged)
+        """
+
+        if self.linked == True:
+            return True
+
+        if self.failed == True:
+            return False
+
+        if not gl.glGetShaderiv(self.vertex, gl.GL_COMPILE_STATUS):
+            error = gl.glGetShaderInfoLog(self.vertex).decode()
+            self.logger.error("Vertex shader compilation error: %s", error)
+
+        if not gl.glGetShaderiv(self.fragment, gl.GL_COMPILE_STATUS):
+            error = gl.glGetShaderInfoLog(self.fragment).decode()
+            self.logger.error("Fragment shader compilation error in variant %s: %s", self.defines, error)
+            self.failed = True
+            return False
+
+        if not gl.glGetProgramiv(self.program, gl.GL_LINK_STATUS):
+            error = gl.glGetProgramInfoLog(self.program).decode()
+            self.logger.error("Linking error in variant %s: %s", self.defines, error)
+            self.failed = True
+            return False
+
+        gl.glDetachShader(self.program, self.vertex)
+        gl.glDetachShader(self.program, self.fragment)
+        gl.glDeleteShader(self.vertex)
+        gl.glDeleteShader(self.fragment)
+
+        self.logger.info("shader program %s compiled in %.3f s", self.defines, time.time() - self.startTime)
+
+        if self.cacheKey is not None:
+            self.programCache.store(gl, self.program, self.cacheKey)
+
+        self.linked = True
+
+        return True
+
+    def delete(self, gl):
+
+        if self.linked == False and self.vertex is not None:
+            gl.glDeleteShader(self.vertex)
+            gl.glDeleteShader(self.fragment)
+
+        gl.glDeleteProgram(self.program)
@@ -1,23 +1,13 @@
 import numpy as np
 import transforms3d as t3d
-from common.quaternion import slerp
+from common.quaternion import slerp_np, qmul_np, quat2mat_np
 
-def slerp_pose(q0, q1, t=0.5):
+def slerp_pose(q0, q1, t=0.5, out=None, scratch=None):
+    """
+    Blend all joint rotations of a pose at once, t holds one blend weight per joint
+    """
     
-    joint_count = q0.shape[0]
-    
-    qm = np.zeros_like(q0)
-    
-    for ji in range(joint_count): 
-    
-        current_quat = q0[ji, :]
-        target_quat = q1[ji, :]
-        
-        quat_mix = t[ji]
-        mix_quat = slerp(current_quat, target_quat, quat_mix )
-        qm[ji, :] = mix_quat
-        
-    return qm
+    return slerp_np(q0, q1, t, out=out, scratch=scratch)
 
 # def slerp(q0, q1, t=0.5, unit=True):
 #     """
@@ -53,9 +43,39 @@ def slerp_pose(q0, q1, t=0.5):
 #     res[flag] = (np.expand_dims(va, axis=-1) * q0_n[flag] + np.expand_dims(vb, axis=-1) * q1_n[flag])
 #     return res
 
+def compile_rotations(eulerAngles, count):
+    """
+    Convert a table of euler angles in degrees (sxyz) into an array of quaternions of shape (count, 4)
+    Missing tables produce identity rotations
+    """
+    
+    rotations = np.zeros((count, 4))
+    rotations[:, 0] = 1.0
+    
+    if eulerAngles is None:
+        return rotations
+    
+    for rI, angles in enumerate(eulerAngles):
+        rotations[rI] = t3d.euler.euler2quat(*np.radians(angles), axes='sxyz')
+        
+    return rotations
+
+class PoseSnapshot():
+    """
+    Transforms of one committed mocap frame, as read by the renderer.
+    A published snapshot is never written to while the renderer holds it.
+    """
+    
+    def __init__(self, jointCount, edgeCount):
+        
+        self.frameIndex = 0
+        self.jointTransforms = np.zeros((jointCount, 4, 4), dtype=np.float32)
+        self.edgeTransforms = np.zeros((edgeCount, 4, 4), dtype=np.float32)
+        self.edgeLengths = np.ones(edgeCount, dtype=np.float32)
+
 class Skeleton():
     
-    def __init__(self, jointFilter, jointConnectivity):
+    def __init__(self, jointFilter, jointConnectivity, jointPreRotations=None, edgePreRotations=None):
 
         self.jointFilter = jointFilter
         self.jointConnectivity = jointConnectivity
@@ -66,21 +86,78 @@ class Skeleton():
         self.jointCount = len(self.jointFilter)
         self.jointPositions = np.random.rand(self.jointCount, 3)
         self.jointRotations = np.random.rand(self.jointCount, 4)
-        self.jointTransforms = np.zeros((self.jointCount, 4, 4))
         
-        self.edgeCount = 0
-        for jointChildren in self.jointConnectivity:
-            self.edgeCount += len(jointChildren)
-            
-        self.edgeTransforms = np.zeros((self.edgeCount, 4, 4))
-        self.edgeLengths = np.ones(self.edgeCount)
+        # edges as flat parent / child joint index arrays, in the same order as jointConnectivity
+        self.edgeParents = []
+        self.edgeChildren = []
+        for pjI, jointChildren in enumerate(self.jointConnectivity):
+            for cjI in jointChildren:
+                self.edgeParents.append(pjI)
+                self.edgeChildren.append(cjI)
+        self.edgeParents = np.array(self.edgeParents, dtype=np.int64)
+        self.edgeChildren = np.array(self.edgeChildren, dtype=np.int64)
+        
+        self.edgeCount = self.edgeParents.shape[0]
+        
+        # triple buffered pose snapshots: the ingest thread writes into a snapshot that is neither
+        # published nor acquired by the renderer and then publishes it by swapping the index
+        self.poseSnapshots = [PoseSnapshot(self.jointCount, self.edgeCount) for _ in range(3)]
+        self.publishedSnapshotIndex = 0
+        self.acquiredSnapshotIndex = 0
+        self.writeSnapshot = self.poseSnapshots[1]
+        self.frameIndex = 0
+        
+        # prerotations applied to incoming joint rotations, one entry per filtered joint (see joint_settings.json)
+        self.jointPreRotations = compile_rotations(jointPreRotations, self.jointCount)
+        
+        # extra rotations of individual edges, given as {"parent", "child", "rotation"} entries
+        edgeEulerAngles = [[0.0, 0.0, 0.0]] * self.edgeCount
+        
+        if edgePreRotations is not None:
+            for edgePreRotation in edgePreRotations:
+                edgeIndices = np.nonzero((self.edgeParents == edgePreRotation["parent"]) & (self.edgeChildren == edgePreRotation["child"]))[0]
+                
+                if edgeIndices.shape[0] == 0:
+                    print("skel edge ", edgePreRotation["parent"], " ", edgePreRotation["child"], " does not exist")
+                    continue
+                
+                edgeEulerAngles[edgeIndices[0]] = edgePreRotation["rotation"]
+                
+        self.edgePreRotations = compile_rotations(edgeEulerAngles, self.edgeCount)
+        
+        # constant rotations that align the joint and edge shapes, applied in front of the joint rotations
+        alignRotation = t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz')
+        
+        self.jointAlignRotations = np.tile(alignRotation, (self.jointCount, 1))
+        self.edgeAlignRotations = qmul_np(alignRotation, self.edgePreRotations)
+        
+        # preallocated work buffers for the batched transform update
+        self.jointRotationBuffer = np.zeros((self.jointCount, 4))
+        self.jointRotMats = np.tile(np.eye(4), (self.jointCount, 1, 1))
+        self.jointTransMats = np.tile(np.eye(4), (self.jointCount, 1, 1))
+        self.jointSkelTransMats = np.zeros((self.jointCount, 4, 4))
+        
+        self.edgeRotationBuffer = np.zeros((self.edgeCount, 4))
+        self.edgeVectors = np.zeros((self.edgeCount, 3))
+        self.edgeRotMats = np.tile(np.eye(4), (self.edgeCount, 1, 1))
+        self.edgeTransMats = np.tile(np.eye(4), (self.edgeCount, 1, 1))
+        self.edgeSkelTransMats = np.zeros((self.edgeCount, 4, 4))
         
         self.udateSmoothing = 0.0
+        self.jointRotationWeights = np.ones(self.jointCount)
+        self.jointRotationScratch = np.zeros((self.jointCount, 4))
+        
+        # halves of the current mocap frame that have arrived but not been committed yet
+        self.stagedJointPositions = np.zeros((self.jointCount, 3))
+        self.stagedJointRotations = np.zeros((self.jointCount, 4))
+        self.positionsStaged = False
+        self.rotationsStaged = False
         
         print("skel jointCount ", self.jointCount, " edgeCount ", self.edgeCount)
         
     def setUpdateSmoothing(self, updateSmoothing):
         self.udateSmoothing = updateSmoothing
+        self.jointRotationWeights[:] = 1.0 - updateSmoothing
         
     def setPosition(self, position):
 
@@ -89,156 +166,121 @@ class Skeleton():
 
     def setJointPositions(self, positions):
         
+        self.stageJointPositions(positions)
+        self.commitPose()
+        
+    def setJointRotations(self, rotations):
+        
+        self.stageJointRotations(rotations)
+        self.commitPose()
+        
+    def stageJointPositions(self, positions):
+        
         positions = positions[self.jointFilter, :]
         
         if positions.shape != self.jointPositions.shape:
             return
-
-        self.jointPositions = self.jointPositions * self.udateSmoothing + positions * (1.0 - self.udateSmoothing)
         
-        self.updateJointTransforms()
-        self.updateEdgeTransforms()
+        self.stagedJointPositions[:] = positions
+        self.positionsStaged = True
         
-    def setJointRotations(self, rotations):
+    def stageJointRotations(self, rotations):
         
         rotations = rotations[self.jointFilter, :]
         
-        # prerotations of joints to align joint shapes
+        if rotations.shape != self.jointRotations.shape:
+            return
         
-
-        # 0  : Hips
-        rotations[0,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[0,:])
-        # 9 : Spine
-        rotations[9,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[9,:])
-        # 12 : Spine1
-        rotations[10,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[10,:])
-        # 13 : Spine2
-        rotations[11,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[11,:])
-        # 14 : Spine3
-        rotations[12,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[12,:])
-        # 25 : Neck
-        rotations[21,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[21,:])
-        # 26 : Head
-        rotations[22,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[22,:])
-                                         
-        # 1  : RightUpLeg
-        rotations[1,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[1,:])
-        # 2  : RightLeg
-        rotations[2,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[2,:])
-        # 3  : RightFoot
-        #rotations[3,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[3,:])
-        # 4  : RightToeBase
-        rotations[4,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[4,:])
-        
-        # 6  : LeftUpLeg
-        rotations[5,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[5,:])
-        # 7  : LeftLeg
-        rotations[6,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[6,:])
-        # 8  : LeftFoot
-        #rotations[7,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[7,:])
-        # 9  : LeftToeBase
-        rotations[8,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), rotations[8,:])
-        
-        # 15 : LeftShoulder
-        rotations[13,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[13,:])
-        # 16 : LeftArm
-        rotations[14,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[14,:])
-        # 17 : LeftForeArm
-        rotations[15,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[15,:])
-        # 18 : LeftHand
-        rotations[16,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[16,:])
+        # prerotations of joints to align joint shapes
+        qmul_np(self.jointPreRotations, rotations, out=self.stagedJointRotations)
+        self.rotationsStaged = True
         
+    def isPoseStaged(self):
+        return self.positionsStaged or self.rotationsStaged
     
-        # 17 : RightShoulder
-        rotations[17,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[17,:])
-        # 21 : RightArm
-        rotations[18,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[18,:])
-        # 22 : RightForeArm
-        rotations[19,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[19,:])
-        # 23 : RightHand
-        rotations[20,:] = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, np.pi / 2.0, axes='sxyz'), rotations[20,:])     
- 
-        if rotations.shape != self.jointRotations.shape:
+    def isPoseComplete(self):
+        return self.positionsStaged and self.rotationsStaged
+        
+    def commitPose(self):
+        
+        # apply whatever part of the mocap frame has been staged and update all transforms once
+        if self.isPoseStaged() == False:
             return
-
-        # TODO: address problem where rotation and position interpolation doesn't match
-        self.jointRotations = slerp_pose(self.jointRotations, rotations, np.ones(self.jointCount) * (1.0 - self.udateSmoothing))
-        self.jointRotations = self.jointRotations / np.linalg.norm(self.jointRotations)
-
-        #self.jointRotations = rotations
+        
+        if self.positionsStaged == True:
+            self.jointPositions *= self.udateSmoothing
+            self.jointPositions += self.stagedJointPositions * (1.0 - self.udateSmoothing)
+            
+        if self.rotationsStaged == True:
+            slerp_pose(self.jointRotations, self.stagedJointRotations, self.jointRotationWeights, out=self.jointRotations, scratch=self.jointRotationScratch)
+        
+        self.positionsStaged = False
+        self.rotationsStaged = False
+        
+        snapshotIndex = self.getWriteSnapshotIndex()
+        self.writeSnapshot = self.poseSnapshots[snapshotIndex]
         
         self.updateJointTransforms()
         self.updateEdgeTransforms()
         
-    def updateJointTransforms(self):
+        self.frameIndex += 1
+        self.writeSnapshot.frameIndex = self.frameIndex
         
-        defaultScale = np.ones((3))
-        defaultRot = np.array([1.0, 0.0, 0.0, 0.0])
-        defaultPos = np.array([0.0, 0.0, 0.0])
-        defaultRotMat = (t3d.quaternions.quat2mat(defaultRot))
-
-        for jI in range(self.jointCount):
+        # a single attribute store, readers see either the previous or the new snapshot
+        self.publishedSnapshotIndex = snapshotIndex
+        
+    def getWriteSnapshotIndex(self):
+        
+        publishedIndex = self.publishedSnapshotIndex
+        acquiredIndex = self.acquiredSnapshotIndex
+        
+        for sI in range(len(self.poseSnapshots)):
+            if sI != publishedIndex and sI != acquiredIndex:
+                return sI
             
-            jointPosition = self.jointPositions[jI]
-            jointRotation = self.jointRotations[jI] # / np.linalg.norm(self.jointRotations[jI])
-            jointRotation = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), jointRotation)
+    def acquirePoseSnapshot(self):
+        """
+        Return the newest complete pose snapshot without copying or locking.
+        The snapshot stays unchanged until the next call, meant for a single reader (the render thread).
+        """
+        
+        while True:
+            snapshotIndex = self.publishedSnapshotIndex
+            self.acquiredSnapshotIndex = snapshotIndex
             
-            jointRotMat = t3d.quaternions.quat2mat(jointRotation)
-            jointRotMat = t3d.affines.compose(defaultPos, jointRotMat, defaultScale)
-   
-            jointTransMat = t3d.affines.compose(jointPosition, defaultRotMat, defaultScale)
-
-            self.jointTransforms[jI] = np.transpose(np.matmul(jointRotMat, np.matmul(self.skelTransform, jointTransMat)))
-
+            # the writer only ever writes into an unpublished snapshot, so if this one is still
+            # published after claiming it, it is complete and won't be picked for writing anymore
+            if self.publishedSnapshotIndex == snapshotIndex:
+                return self.poseSnapshots[snapshotIndex]
+        
+    def updateJointTransforms(self):
+        
+        # all joints at once: transpose(rotation * skelTransform * translation)
+        qmul_np(self.jointAlignRotations, self.jointRotations, out=self.jointRotationBuffer)
+        quat2mat_np(self.jointRotationBuffer, out=self.jointRotMats[:, :3, :3])
+        
+        self.jointTransMats[:, :3, 3] = self.jointPositions
+        
+        np.matmul(self.skelTransform, self.jointTransMats, out=self.jointSkelTransMats)
+        np.matmul(self.jointRotMats, self.jointSkelTransMats, out=np.transpose(self.writeSnapshot.jointTransforms, (0, 2, 1)))
 
     def updateEdgeTransforms(self):
-
-        defaultScale = np.ones((3))
-        defaultRot = np.array([1.0, 0.0, 0.0, 0.0])
-        defaultPos = np.array([0.0, 0.0, 0.0])
-        defaultRotMat = (t3d.quaternions.quat2mat(defaultRot))
-        refDir = np.array([0.0, 0.0, 1.0])
         
-        eI = 0
-
-        for pjI in range(self.jointCount):
-            
-            parentJointPos = self.jointPositions[pjI]
-            parentJointRot = self.jointRotations[pjI] / np.linalg.norm(self.jointRotations[pjI])
-
-            children = self.jointConnectivity[pjI]
-            
-            for cjI in children:
-                
-                childJointPos = self.jointPositions[cjI]
-                
-                edgePos = (parentJointPos + childJointPos) / 2
-                
-                edgeVec = childJointPos - parentJointPos
-                edgeLength = np.linalg.norm(edgeVec)
-                
-                #print("pjI ", pjI, " cjI ", cjI, " edgeVec ", edgeVec, " edgeLength ", edgeLength)
-                
-                edgeRotation = self.jointRotations[pjI] # / np.linalg.norm(self.jointRotations[pjI])
-                
-                if pjI == 0 and cjI == 1: # hip to RightUpLeg
-                    edgeRotation = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, -np.pi / 2.0, axes='sxyz'), edgeRotation)
-                if pjI == 0 and cjI == 5: # hip to LeftUpLeg
-                    edgeRotation = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, 0.0, -np.pi / 2.0, axes='sxyz'), edgeRotation)   
-                    
-                edgeRotation = t3d.quaternions.qmult(t3d.euler.euler2quat(0.0, np.pi / 2.0, 0.0, axes='sxyz'), edgeRotation)
-                
-                edgeRotMat = t3d.quaternions.quat2mat(edgeRotation)
-                edgeRotMat = t3d.affines.compose(defaultPos, edgeRotMat, defaultScale)
-
-                edgeTransMat = t3d.affines.compose(edgePos, defaultRotMat, defaultScale)
-                
-                self.edgeLengths[eI] = edgeLength
-                
-                #self.edgeTransforms[eI] = np.transpose(np.matmul(edgeRotMat, edgeTransMat))
-                self.edgeTransforms[eI] = np.transpose(np.matmul(edgeRotMat, np.matmul(self.skelTransform, edgeTransMat)))
-                
-                eI += 1
+        parentJointPositions = self.jointPositions[self.edgeParents]
+        childJointPositions = self.jointPositions[self.edgeChildren]
+        
+        # edges sit halfway between parent and child joint and take the rotation of the parent joint
+        np.subtract(childJointPositions, parentJointPositions, out=self.edgeVectors)
+        np.sqrt(np.einsum('ij,ij->i', self.edgeVectors, self.edgeVectors), out=self.writeSnapshot.edgeLengths)
+        
+        np.add(parentJointPositions, childJointPositions, out=self.edgeTransMats[:, :3, 3])
+        self.edgeTransMats[:, :3, 3] *= 0.5
+        
+        qmul_np(self.edgeAlignRotations, self.jointRotations[self.edgeParents], out=self.edgeRotationBuffer)
+        quat2mat_np(self.edgeRotationBuffer, out=self.edgeRotMats[:, :3, :3])
+        
+        np.matmul(self.skelTransform, self.edgeTransMats, out=self.edgeSkelTransMats)
+        np.matmul(self.edgeRotMats, self.edgeSkelTransMats, out=np.transpose(self.writeSnapshot.edgeTransforms, (0, 2, 1)))
 
     def getJointCount(self):
         return self.jointCount
@@ -247,7 +289,7 @@ class Skeleton():
         return self.edgeCount
     
     def getEdgeLengths(self):
-        return self.edgeLengths
+        return self.poseSnapshots[self.publishedSnapshotIndex].edgeLengths
     
     def getJointPositions(self):
         return self.jointPositions
@@ -256,9 +298,12 @@ class Skeleton():
         return self.jointRotations
     
     def getJointTransforms(self):
-        return self.jointTransforms
+        return self.poseSnapshots[self.publishedSnapshotIndex].jointTransforms
     
     def getEdgeTransforms(self):
-        return self.edgeTransforms
+        return self.poseSnapshots[self.publishedSnapshotIndex].edgeTransforms
+    
+    def getPoseFrameIndex(self):
+        return self.poseSnapshots[self.publishedSnapshotIndex].frameIndex
     
     
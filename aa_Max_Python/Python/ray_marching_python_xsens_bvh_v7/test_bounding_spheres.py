@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from bvh import bounding_spheres
+
+# numpy versions of sphereSDF, roundBoxSDF, roundCapsuleSDF and roundCylinderSDF in shaderFrag.glsl, points (count, 3) in primitive space
+
+def sphere_sdf(p, size, rounding):
+    return np.linalg.norm(p, axis=1) - size[0]
+
+def round_box_sdf(p, size, rounding):
+    d = np.abs(p) - (size - rounding) / 2.0
+    insideDistance = np.minimum(np.max(d, axis=1), 0.0)
+    outsideDistance = np.linalg.norm(np.maximum(d, 0.0), axis=1)
+    return insideDistance + outsideDistance - rounding
+
+def round_capsule_sdf(p, size, rounding):
+    halfHeight = (size[2] - rounding) / 2.0
+    # glsl clamp is min(max(x, lower), upper)
+    z = p[:, 2] - np.minimum(np.maximum(p[:, 2], -halfHeight), halfHeight)
+    return np.linalg.norm(np.stack((p[:, 0], p[:, 1], z), axis=1), axis=1) - size[0] - rounding
+
+def round_cylinder_sdf(p, size, rounding):
+    inOutRadius = np.linalg.norm(p[:, :2], axis=1) - (size[0] - rounding)
+    inOutHeight = np.abs(p[:, 2]) - (size[2] - rounding) / 2.0
+    insideDistance = np.minimum(np.maximum(inOutRadius, inOutHeight), 0.0)
+    outsideDistance = np.linalg.norm(np.maximum(np.stack((inOutRadius, inOutHeight), axis=1), 0.0), axis=1)
+    return insideDistance + outsideDistance - rounding
+
+primitive_sdfs = [sphere_sdf, round_box_sdf, round_capsule_sdf, round_cylinder_sdf]
+
+def random_transform(rng):
+    """
+    Returns a rigid world to primitive transform (4, 4) and the same transform stored transposed as in a PrimitiveBuffer
+    """
+
+    rotation, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    rotation *= np.sign(np.diag(r))
+
+    transform = np.eye(4)
+    transform[:3, :3] = rotation
+    transform[:3, 3] = rng.uniform(-2.0, 2.0, 3)
+
+    return transform, transform.T.copy()
+
+@pytest.mark.parametrize("primitive", [0, 1, 2, 3])
+@pytest.mark.parametrize("rounding", [0.15, 0.0, -0.15])
+def test_bound_below_sdf(primitive, rounding):
+    rng = np.random.default_rng(1)
+
+    for tI in range(20):
+        transform, stored = random_transform(rng)
+        size = rng.uniform(0.05, 0.6, 3)
+
+        bounds = np.zeros((1, 4))
+        bounding_spheres(stored[np.newaxis], np.array([primitive]), size[np.newaxis], np.array([rounding]), size[np.newaxis, 0], 0.0, bounds)
+
+        # samples inside and around the bound
+        points = bounds[0, :3] + rng.normal(size=(4000, 3)) * bounds[0, 3]
+        localPoints = points @ transform[:3, :3].T + transform[:3, 3]
+        sdf = primitive_sdfs[primitive](localPoints, size, rounding)
+
+        # the shader skips a primitive if the distance to its bound is at least the current distance,
+        # that is only exact if the bound is never farther than the surface
+        boundDistances = np.linalg.norm(points - bounds[0, :3], axis=1) - bounds[0, 3]
+
+        assert np.all(boundDistances <= sdf + 1e-9)
+        assert np.all(np.linalg.norm(points[sdf <= 0.0] - bounds[0, :3], axis=1) <= bounds[0, 3] + 1e-9)
+
+def test_negative_rounding_covers_grown_box():
+    # a box of size 1 with rounding -0.2 reaches (1 + 0.2) / 2 along each axis
+    bounds = np.zeros((1, 4))
+    bounding_spheres(np.eye(4)[np.newaxis], np.array([1]), np.ones((1, 3)), np.array([-0.2]), np.ones(1), 0.0, bounds)
+
+    assert bounds[0, 3] >= np.sqrt(3.0) * 0.6 - 1e-9
@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+
+from pythonosc import dispatcher
+from pythonosc import osc_bundle_builder
+from pythonosc import osc_message_builder
+
+from osc_control import osc_float_array, osc_float_args, MocapDispatcher
+
+address = "/mocap/joint/rot_world"
+client_address = ("127.0.0.1", 9004)
+
+def build_message(args, messageAddress=address):
+    """
+    Expects list of (value, osc type tag) pairs
+    Returns the datagram of the message
+    """
+
+    builder = osc_message_builder.OscMessageBuilder(address=messageAddress)
+
+    for value, argType in args:
+        builder.add_arg(value, argType)
+
+    return builder.build().dgram
+
+def fast_path(data):
+    return osc_float_array(data, data.find(b"\0"))
+
+def generic_path(data):
+    """
+    Returns the arrays the generic pythonosc dispatcher passes to osc_float_args for each message of data
+    """
+
+    received = []
+    genericDispatcher = dispatcher.Dispatcher()
+    genericDispatcher.map(address, lambda messageAddress, *args: received.append(osc_float_args(args)))
+    genericDispatcher.call_handlers_for_packet(data, client_address)
+
+    return received
+
+def dispatch(data):
+    """
+    Returns the arrays MocapDispatcher hands to the float array handler and the argument tuples it hands to the generic handler of the address
+    """
+
+    fastReceived = []
+    genericReceived = []
+
+    mocapDispatcher = MocapDispatcher()
+    mocapDispatcher.mapFloatArray(address, lambda values: fastReceived.append(np.array(values)))
+    mocapDispatcher.map(address, lambda messageAddress, *args: genericReceived.append(args))
+    mocapDispatcher.call_handlers_for_packet(data, client_address)
+
+    return fastReceived, genericReceived
+
+# addresses whose padding ends on each of the 4 byte offsets
+@pytest.mark.parametrize("messageAddress", ["/a", "/ab", "/abc", "/abcd", address])
+@pytest.mark.parametrize("count", [0, 1, 3, 4, 92])
+def test_float_args_match_generic(messageAddress, count):
+    rng = np.random.default_rng(count)
+    values = rng.normal(size=count).astype(np.float32)
+    data = build_message([(float(value), "f") for value in values], messageAddress)
+
+    result = fast_path(data)
+
+    assert result is not None
+    assert result.dtype.byteorder == ">"
+    assert np.array_equal(result, values)
+    assert result.flags.writeable == False
+
+def test_float_args_dispatch_matches_generic():
+    values = np.random.default_rng(0).normal(size=23 * 4).astype(np.float32)
+    data = build_message([(float(value), "f") for value in values])
+
+    fastReceived, genericReceived = dispatch(data)
+
+    assert len(fastReceived) == 1 and len(genericReceived) == 0
+    assert np.array_equal(fastReceived[0], generic_path(data)[0])
+
+# pythonosc doesn't build empty blobs
+@pytest.mark.parametrize("count", [1, 92])
+def test_blob_matches_generic(count):
+    values = np.random.default_rng(count).normal(size=count).astype("<f4")
+    data = build_message([(values.tobytes(), "b")])
+
+    result = fast_path(data)
+
+    assert result is not None
+    assert np.array_equal(result, values)
+    assert np.array_equal(result, generic_path(data)[0])
+
+    fastReceived, genericReceived = dispatch(data)
+
+    assert len(fastReceived) == 1 and len(genericReceived) == 0
+    assert np.array_equal(fastReceived[0], values)
+
+@pytest.mark.parametrize("args", [
+    [(1.0, "f"), (2, "i")],
+    [(1, "i"), (2.0, "f")],
+    [(1.0, "f"), (1.0, "d")],
+    [(1.0, "f"), ("joint", "s")],
+    [(np.zeros(2, dtype="<f4").tobytes(), "b"), (1.0, "f")],
+    [(1.0, "f"), (np.zeros(2, dtype="<f4").tobytes(), "b")],
+    [(np.zeros(2, dtype="<f4").tobytes(), "b"), (np.zeros(2, dtype="<f4").tobytes(), "b")],
+    ])
+def test_mixed_tags_fall_back_to_generic(args):
+    data = build_message(args)
+
+    assert fast_path(data) is None
+
+    fastReceived, genericReceived = dispatch(data)
+
+    assert len(fastReceived) == 0 and len(genericReceived) == 1
+    assert len(genericReceived[0]) == len(args)
+
+@pytest.mark.parametrize("args", [
+    [(1.0, "f"), (2.0, "f"), (3.0, "f")],
+    [(np.arange(8, dtype="<f4").tobytes(), "b")],
+    ])
+def test_truncated_datagrams_rejected(args):
+    data = build_message(args)
+
+    for length in range(len(data)):
+        truncated = data[:length]
+        addressEnd = truncated.find(b"\0")
+
+        if addressEnd < 0:
+            continue
+
+        # None while the type tags are incomplete, the generic parser then drops the message
+        # or, cut right after the address, reads it as a message without arguments
+        try:
+            assert osc_float_array(truncated, addressEnd) is None, length
+        except ValueError:
+            pass
+
+        fastReceived, genericReceived = dispatch(truncated)
+
+        assert len(fastReceived) == 0, length
+        assert all(len(args) == 0 for args in genericReceived), length
+
+def test_truncated_floats_not_zero_filled():
+    data = build_message([(1.0, "f"), (2.0, "f"), (3.0, "f")])[:-4]
+
+    # pythonosc reads the missing float as 0.0
+    assert list(generic_path(data)[0]) == [1.0, 2.0, 0.0]
+
+    with pytest.raises(ValueError):
+        fast_path(data)
+
+    assert dispatch(data) == ([], [])
+
+def test_partial_float_blob_dropped():
+    data = build_message([(b"\0" * 6, "b")])
+
+    with pytest.raises(ValueError):
+        fast_path(data)
+
+    assert dispatch(data) == ([], [])
+
+def test_other_addresses_and_bundles_use_generic_handlers():
+    message = build_message([(1.0, "f"), (2.0, "f")])
+    other = build_message([(1.0, "f")], "/mocap/joint/pos_world")
+
+    bundleBuilder = osc_bundle_builder.OscBundleBuilder(osc_bundle_builder.IMMEDIATELY)
+    bundleBuilder.add_content(osc_message_builder.OscMessageBuilder(address=address).build())
+    bundle = bundleBuilder.build().dgram
+
+    assert dispatch(other) == ([], [])
+
+    fastReceived, genericReceived = dispatch(bundle)
+
+    assert len(fastReceived) == 0 and len(genericReceived) == 1
+
+    fastReceived, genericReceived = dispatch(message)
+
+    assert len(fastReceived) == 1 and len(genericReceived) == 0
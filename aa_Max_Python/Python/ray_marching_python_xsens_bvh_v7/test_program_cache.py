@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from program_cache import ProgramCache
+
+class FakeGL():
+    """
+    The GL calls of ProgramCache.load, glProgramBinary raises for unknown formats like PyOpenGL with error checking
+    """
+
+    GL_LINK_STATUS = 0x8B82
+
+    def __init__(self, knownFormat=7, linkStatus=True):
+        self.knownFormat = knownFormat
+        self.linkStatus = linkStatus
+        self.binaries = []
+
+    def glProgramBinary(self, program, binaryFormat, binary, length):
+        if binaryFormat != self.knownFormat:
+            raise RuntimeError("GLError: GL_INVALID_ENUM")
+        self.binaries.append(bytes(binary))
+
+    def glGetProgramiv(self, program, name):
+        return self.linkStatus
+
+def write_entry(cache, key, data):
+    os.makedirs(cache.directory, exist_ok=True)
+    with open(cache.getPath(key), "wb") as f:
+        f.write(data)
+
+def test_load_valid_entry(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    write_entry(cache, "k", np.array([7], dtype="<u4").tobytes() + b"binary")
+    gl = FakeGL()
+
+    assert cache.load(gl, 1, "k") == True
+    assert gl.binaries == [b"binary"]
+    assert os.path.exists(cache.getPath("k"))
+
+def test_load_missing_entry(tmp_path):
+    assert ProgramCache(str(tmp_path)).load(FakeGL(), 1, "k") == False
+
+@pytest.mark.parametrize("data, gl", [
+    (b"", FakeGL()),
+    (b"\x07\x00", FakeGL()),
+    (np.array([7], dtype="<u4").tobytes(), FakeGL()),
+    (np.array([3], dtype="<u4").tobytes() + b"binary", FakeGL()),
+    (np.array([7], dtype="<u4").tobytes() + b"binary", FakeGL(linkStatus=False)),
+    ], ids=["empty", "short", "no binary", "unknown format", "rejected"])
+def test_load_discards_unusable_entry(tmp_path, data, gl):
+    cache = ProgramCache(str(tmp_path))
+    write_entry(cache, "k", data)
+
+    assert cache.load(gl, 1, "k") == False
+    assert not os.path.exists(cache.getPath("k"))
+
+def test_load_discards_unreadable_entry(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+
+    # a directory in place of the entry can't be opened for reading
+    os.makedirs(cache.getPath("k"))
+
+    assert cache.load(FakeGL(), 1, "k") == False
@@ -0,0 +1,143 @@
+import numpy as np
+
+def view_axes(eye, center, up):
+    """
+    Returns the side, up and forward axes of a camera at eye looking at center, as viewMatrix in shaderFrag.glsl
+    """
+
+    forward = (center - eye) / np.linalg.norm(center - eye)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+
+    return side, np.cross(side, forward), forward
+
+def screen_rects(spheres, eye, center, up, fieldOfView, resolution):
+    """
+    Expects spheres (count, 4) as world center and radius, the camera as passed to viewMatrix and rayDirection in shaderFrag.glsl
+    and the resolution in pixels
+    Returns pixel rectangles (count, 4) as x0, y0, x1, y1 that contain the projection of each sphere, spheres behind the camera get
+    a rectangle with x0 > x1
+    """
+
+    side, upAxis, forward = view_axes(eye, center, up)
+
+    offsets = spheres[:, :3].astype(np.float64) - eye
+    radii = spheres[:, 3].astype(np.float64)
+    depths = offsets @ forward
+
+    # rayDirection maps fragCoord (x scaled by the aspect ratio, y in -1..1) to the direction (fragCoord, -z) in view space
+    z = 1.0 / np.tan(np.radians(fieldOfView) / 2.0)
+    aspect = resolution[0] / resolution[1]
+
+    rects = np.zeros((spheres.shape[0], 4))
+
+    for aI, (axis, scale, size) in enumerate([(side, aspect, resolution[0]), (upAxis, 1.0, resolution[1])]):
+        lateral = offsets @ axis
+        distances = np.hypot(lateral, depths)
+
+        # angles of the tangents to the sphere in the plane of this axis and the view direction
+        centerAngles = np.arctan2(lateral, depths)
+        halfAngles = np.arcsin(np.clip(radii / np.maximum(distances, 1e-9), 0.0, 1.0))
+
+        lowerAngles = np.maximum(centerAngles - halfAngles, -np.pi / 2.0 + 1e-6)
+        upperAngles = np.minimum(centerAngles + halfAngles, np.pi / 2.0 - 1e-6)
+
+        lower = (z * np.tan(lowerAngles) / scale * 0.5 + 0.5) * size
+        upper = (z * np.tan(upperAngles) / scale * 0.5 + 0.5) * size
+
+        # the eye is inside the sphere
+        inside = distances <= radii
+        rects[:, aI] = np.where(inside, -np.inf, lower)
+        rects[:, aI + 2] = np.where(inside, np.inf, upper)
+
+    # entirely behind the camera
+    behind = depths + radii <= 0.0
+    rects[behind, 0] = np.inf
+    rects[behind, 2] = -np.inf
+
+    return rects
+
+class TileBinning():
+    """
+    Lists of the primitives whose bounding sphere covers each tileSize x tileSize pixel tile of the screen
+    update bins groups of primitives (joints, edges, objects), upload writes two texture buffers:
+    tile headers (RGBA32I: first entry, number of primitives of group 0, 1 and 2) and the entries (R32I: a value given for each primitive),
+    the entries of a tile are ordered by group and primitive index.
+    """
+
+    def __init__(self, tileSize=32):
+
+        self.tileSize = tileSize
+        self.tileCount = (1, 1)
+        self.tileHeaders = np.zeros((1, 4), dtype=np.int32)
+        self.tileEntries = np.zeros(1, dtype=np.int32)
+
+        self.headerBuffer = None
+        self.entryBuffer = None
+
+    def setup(self, gl, headerUnit, entryUnit):
+
+        self.headerBuffer, self.headerTexture = self.setupBuffer(gl, headerUnit, gl.GL_RGBA32I)
+        self.entryBuffer, self.entryTexture = self.setupBuffer(gl, entryUnit, gl.GL_R32I)
+
+    def setupBuffer(self, gl, unit, internalFormat):
+
+        buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, buffer)
+        gl.glBufferData(gl.GL_TEXTURE_BUFFER, 16, None, gl.GL_DYNAMIC_DRAW)
+
+        texture = gl.glGenTextures(1)
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(gl.GL_TEXTURE_BUFFER, texture)
+        gl.glTexBuffer(gl.GL_TEXTURE_BUFFER, internalFormat, buffer)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+
+        return buffer, texture
+
+    def update(self, groups, eye, center, up, fieldOfView, resolution):
+        """
+        Expects groups: list of (spheres (count, 4), entries (count,) the value stored for each primitive, negative to leave it out)
+        and the camera and resolution as for screen_rects
+        """
+
+        self.tileCount = (int(np.ceil(resolution[0] / self.tileSize)), int(np.ceil(resolution[1] / self.tileSize)))
+
+        spheres = np.concatenate([groupSpheres for groupSpheres, groupEntries in groups], axis=0)
+        entries = np.concatenate([groupEntries for groupSpheres, groupEntries in groups], axis=0)
+        groupSizes = [groupSpheres.shape[0] for groupSpheres, groupEntries in groups]
+        primitiveGroups = np.repeat(np.arange(len(groups)), groupSizes)
+
+        rects = screen_rects(spheres, eye, center, up, fieldOfView, resolution)
+
+        # covered tile columns and rows of each primitive
+        tileX = np.arange(self.tileCount[0]) * self.tileSize
+        tileY = np.arange(self.tileCount[1]) * self.tileSize
+        coverX = (rects[:, 0:1] < tileX + self.tileSize) & (rects[:, 2:3] >= tileX)
+        coverY = (rects[:, 1:2] < tileY + self.tileSize) & (rects[:, 3:4] >= tileY)
+
+        # (tile row, tile column, primitive), so the entries come out ordered by tile, group and index
+        coverage = coverY.T[:, np.newaxis, :] & coverX.T[np.newaxis, :, :] & (entries >= 0)
+        covered = np.flatnonzero(coverage)
+
+        tiles = covered // spheres.shape[0]
+        primitives = covered % spheres.shape[0]
+        tileCount = self.tileCount[0] * self.tileCount[1]
+
+        groupCounts = np.bincount(tiles * len(groups) + primitiveGroups[primitives], minlength=tileCount * len(groups)).reshape(tileCount, len(groups))
+
+        self.tileHeaders = np.zeros((tileCount, 4), dtype=np.int32)
+        self.tileHeaders[:, 1:len(groups) + 1] = groupCounts
+        self.tileHeaders[1:, 0] = np.cumsum(groupCounts.sum(axis=1))[:-1]
+
+        self.tileEntries = entries[primitives].astype(np.int32)
+
+    def upload(self, gl):
+
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, self.headerBuffer)
+        gl.glBufferData(gl.GL_TEXTURE_BUFFER, self.tileHeaders.nbytes, self.tileHeaders, gl.GL_DYNAMIC_DRAW)
+
+        # buffers can't be empty
+        entries = self.tileEntries if self.tileEntries.shape[0] > 0 else np.zeros(1, dtype=np.int32)
+
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, self.entryBuffer)
+        gl.glBufferData(gl.GL_TEXTURE_BUFFER, entries.nbytes, entries, gl.GL_DYNAMIC_DRAW)
@@ -0,0 +1,151 @@
+import threading
+import numpy as np
+
+# std140 layout of the supported glsl types: numpy type, shape and base alignment in bytes
+std140_types = {
+    "float": ("<f4", (), 4),
+    "int": ("<i4", (), 4),
+    "vec2": ("<f4", (2,), 8),
+    "vec3": ("<f4", (3,), 16),
+    "vec4": ("<f4", (4,), 16),
+    "mat4": ("<f4", (4, 4), 16)
+    }
+
+def std140_dtype(members):
+    """
+    Expects a list of (glslType, name, count) block members in declaration order, count is 0 for members that aren't arrays
+    Returns a numpy structured dtype with the offsets and size of a layout(std140) uniform block.
+    Array elements are padded to 16 bytes, so arrays of n scalars or vectors are stored as (n, 4) fields.
+    """
+
+    names = []
+    formats = []
+    offsets = []
+    offset = 0
+
+    for glslType, name, count in members:
+
+        baseType, shape, alignment = std140_types[glslType]
+        size = int(np.prod(shape)) * 4
+
+        if count > 0:
+            # array elements are aligned like vec4 and the member following an array starts at a vec4 boundary
+            alignment = 16
+            if glslType == "mat4":
+                shape = (count, 4, 4)
+            else:
+                shape = (count, 4)
+            size = int(np.prod(shape)) * 4
+
+        offset = (offset + alignment - 1) // alignment * alignment
+
+        names.append(name)
+        formats.append((baseType, shape))
+        offsets.append(offset)
+
+        offset += size
+
+    # the buffer size of a block is a multiple of vec4
+    itemsize = (offset + 15) // 16 * 16
+
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": itemsize})
+
+def merge_ranges(ranges, mergeGap):
+    """
+    Expects list of (start, end) byte ranges, mergeGap: ranges closer than this many bytes are merged
+    Returns sorted list of non overlapping (start, end) ranges
+    """
+
+    mergedRanges = []
+
+    for start, end in sorted(ranges):
+        if len(mergedRanges) > 0 and start <= mergedRanges[-1][1] + mergeGap:
+            mergedRanges[-1][1] = max(mergedRanges[-1][1], end)
+        else:
+            mergedRanges.append([start, end])
+
+    return [(start, end) for start, end in mergedRanges]
+
+class UniformBlock():
+    """
+    CPU side copy of a layout(std140) uniform block
+    block[name] returns a writable view of a member with its glsl shape:
+    () for scalars, (3,) for vec3, (n,) for float arrays, (n, 3) for vec3 arrays, (n, 4, 4) for mat4 arrays
+    block.bytes is the block as it is laid out in the uniform buffer
+    Writes through block[name] = value are tracked, writes into a view have to be followed by markDirty(name, index),
+    takeDirtyRanges returns the byte ranges that need to be uploaded since it was last called.
+    """
+
+    def __init__(self, members):
+
+        self.dtype = std140_dtype(members)
+        self.bytes = np.zeros(self.dtype.itemsize, dtype=np.uint8)
+        self.data = self.bytes.view(self.dtype)
+
+        self.views = {}
+        self.ranges = {}
+
+        # byte ranges written since the last upload, marked from other threads than the one uploading
+        self.dirtyRanges = []
+        self.dirtyLock = threading.Lock()
+        self.markAllDirty()
+
+        for glslType, name, count in members:
+
+            offset = self.dtype.fields[name][1]
+            self.ranges[name] = (offset, self.dtype.fields[name][0].itemsize, max(count, 1))
+
+            field = self.data[name][0]
+
+            if count > 0 and glslType != "mat4":
+                componentCount = int(np.prod(std140_types[glslType][1]))
+                if componentCount == 1:
+                    field = field[:, 0]
+                else:
+                    field = field[:, :componentCount]
+
+            if glslType in ("float", "int") and count == 0:
+                field = self.data[name].reshape(())
+
+            self.views[name] = field
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    def __setitem__(self, name, value):
+        self.views[name][...] = value
+        self.markDirty(name)
+
+    def markDirty(self, name, index=None):
+
+        offset, size, count = self.ranges[name]
+
+        if index is not None:
+            size = size // count
+            offset += index * size
+
+        with self.dirtyLock:
+            self.dirtyRanges.append((offset, offset + size))
+
+    def markAllDirty(self):
+
+        with self.dirtyLock:
+            self.dirtyRanges.append((0, self.dtype.itemsize))
+
+    def isDirty(self):
+        return len(self.dirtyRanges) > 0
+
+    def takeDirtyRanges(self, mergeGap=256):
+        """
+        Expects mergeGap: ranges closer than this many bytes are merged into one upload
+        Returns sorted list of non overlapping (start, end) byte ranges and clears them
+        """
+
+        with self.dirtyLock:
+            dirtyRanges = self.dirtyRanges
+            self.dirtyRanges = []
+
+        return merge_ranges(dirtyRanges, mergeGap)
+
+    def getSize(self):
+        return self.dtype.itemsize
@@ -2,28 +2,114 @@ import numpy as np
 import transforms3d as t3d
 import OpenGL.GL as gl
 import ctypes
-import logging
 import time
 
 from skeleton import Skeleton
+from uniform_block import UniformBlock
+from primitive_buffer import PrimitiveBuffer
+from program_cache import ProgramCache
+from shader_program import ShaderProgram, enable_parallel_shader_compile
+from gpu_timer import GpuTimer
+from resolution_governor import ResolutionGovernor
+from bvh import build_sphere_tree, bounding_spheres, unbounded_radius
+from tile_binning import TileBinning
+
+# object primitives whose shape changes with iGlobalTime: mandelbulb_v2, merger, evolvingFractal, evolvingFractal2
+animated_object_primitives = [8, 9, 13, 14]
+
+def primitive_mask(primitives):
+    """
+    Expects array of primitive types, negative for primitives that aren't drawn
+    Returns bit mask with bit n set if primitive type n is in use
+    """
+    
+    mask = 0
+    
+    for primitive in np.unique(primitives.astype(np.int32)):
+        if primitive >= 0:
+            mask |= 1 << int(primitive)
+            
+    return mask
+
+# primitive_mask of every primitive type the shader knows
+all_primitives_mask = (1 << 17) - 1
 
 class Visualization():
-    def __init__(self, skeleton, vertexCode, fragmentCode):
+    def __init__(self, skeleton, vertexCode, fragmentCode, objectCount=10):
         self.skeleton = skeleton
         self.vertexCode = vertexCode
         self.fragmentCode = fragmentCode
         self.resolution = [1280.0, 720.0]
         
-        #self.jointCount = skeleton.getJointCount()
-        #self.edgeCount = skeleton.getEdgeCount()
-        
-        self.jointCount = 23
-        self.edgeCount = 22
-        self.objectCount = 10;
-        
-        self.shader_jointCount = 23;
-        self.shader_edgeCount = 22;
-        self.shader_objectCount = 10;
+        # dynamic resolution: the scene is ray marched into an offscreen framebuffer at a fraction of the window resolution
+        # chosen by the governor from the measured gpu time, and scaled up to the window
+        self.dynamicResolution = True
+        self.resolutionGovernor = ResolutionGovernor()
+        self.gpuTimer = GpuTimer()
+        self.sceneFramebufferSize = None
+        
+        # FrameProfiler or None, receives the durations of the upload, submit, gpu and frame stages
+        self.profiler = None
+        self.frameTime = None
+        
+        self.jointCount = skeleton.getJointCount()
+        self.edgeCount = skeleton.getEdgeCount()
+        self.objectCount = objectCount
+        
+        # sceneSDF walks trees of bounding spheres and skips the primitives farther away than the ones evaluated before them
+        self.primitiveCulling = True
+        
+        # linked shader programs saved on disk, None compiles from source on every start
+        self.programCache = ProgramCache()
+        
+        # shader variants by defines, the primitive setters request a new variant if the primitives in use change
+        self.shaderPrograms = {}
+        self.shaderDefinesChanged = False
+        
+        # compiles variants on a second context if the driver can't compile in parallel, set by the window before setupShader
+        self.shaderCompileThread = None
+        
+        # per frame scene state, uploaded as the SceneBlock uniform block of the fragment shader
+        self.sceneBlock = UniformBlock(self.getSceneBlockMembers())
+        self.sceneBlockBinding = 0
+        
+        # per primitive settings, uploaded as texture buffers with one record of RGBA32F texels per primitive
+        # joints and edges: 0-3 transform columns, 4 size xyz and rounding, 5 smoothing, primitive and edge length, 6 bounding sphere
+        # objects: 0-5 as for joints, 6 color and ambient scale, 7 occlusion color and diffuse scale,
+        # 8 frequency and specular scale, 9 amplitude and specular pow, 10 phase and occlusion scale,
+        # 11 occlusion range and occlusion resolution, 12 bounding sphere
+        self.jointData = PrimitiveBuffer(self.jointCount, 7)
+        self.edgeData = PrimitiveBuffer(self.edgeCount, 7)
+        self.objectData = PrimitiveBuffer(self.objectCount, 13)
+        self.jointDataUnit = 0
+        self.edgeDataUnit = 1
+        self.objectDataUnit = 2
+        
+        # trees of the bounding spheres of the drawn joints, edges and objects, traversed by sceneSDF if primitiveCulling is on
+        # one node per record: 0 sphere, 1 child node indices and primitive index, the tree of n primitives starts at node 2 * (primitives before)
+        self.bvhData = PrimitiveBuffer(2 * (self.jointCount + self.edgeCount + self.objectCount), 2)
+        self.bvhDataUnit = 3
+        self.jointBvhFirst = 0
+        self.edgeBvhFirst = 2 * self.jointCount
+        self.objectBvhFirst = 2 * (self.jointCount + self.edgeCount)
+        
+        # node index of the leaf of each primitive, -1 for primitives that aren't drawn
+        self.jointBvhLeaves = np.full(self.jointCount, -1, dtype=np.int32)
+        self.edgeBvhLeaves = np.full(self.edgeCount, -1, dtype=np.int32)
+        self.objectBvhLeaves = np.full(self.objectCount, -1, dtype=np.int32)
+        
+        # the primary rays of each screen tile only evaluate the primitives whose bounding sphere covers the tile,
+        # the bins hold the leaves of the primitives and are updated when the bounds, the camera or the resolution change
+        self.tileBinning = True
+        self.tileBins = TileBinning(32)
+        self.tileHeaderUnit = 4
+        self.tileEntryUnit = 5
+        self.tileBinsDirty = True
+        self.tileBinsKey = None
+        
+        # main only marches the part of the primary rays inside a sphere around all drawn primitives
+        self.sceneBounding = True
+        self.sceneBoundDirty = True
         
         self.skelPosition = np.array([0.0, 0.0, 0.0])
         
@@ -55,10 +141,12 @@ class Visualization():
         self.jointOcclusionResolution = 1.0
         self.jointOcclusionColor = np.array([0.0, 0.0, 0.0])
         
-        self.jointPrimitives = np.zeros((self.jointCount), dtype=np.int32) - 1
-        self.jointSizes = np.ones((self.jointCount, 3)) * 0.1
-        self.jointRoundings = np.ones((self.jointCount)) * 0.01
-        self.jointSmoothings = np.ones((self.jointCount)) * 0.01
+        self.jointTransforms = self.jointData.matrixView(0)
+        self.jointPrimitives = self.initArray(self.jointData.view(5, 1), np.zeros((self.jointCount)) - 1)
+        self.jointSizes = self.initArray(self.jointData.view(4, 0, 3), np.ones((self.jointCount, 3)) * 0.1)
+        self.jointRoundings = self.initArray(self.jointData.view(4, 3), np.ones((self.jointCount)) * 0.01)
+        self.jointSmoothings = self.initArray(self.jointData.view(5, 0), np.ones((self.jointCount)) * 0.01)
+        self.jointBounds = self.jointData.view(6, 0, 4)
         
         # skeleton edge settings
         self.edgeColor = np.array([1.0, 1.0, 1.0])
@@ -71,37 +159,42 @@ class Visualization():
         self.edgeOcclusionResolution = 1.0
         self.edgeOcclusionColor = np.array([0.0, 0.0, 0.0])
         
-        self.edgePrimitives = np.zeros((self.edgeCount), dtype=np.int32) - 1
-        self.edgeSizes = np.ones((self.edgeCount, 3))
+        self.edgeTransforms = self.edgeData.matrixView(0)
+        self.edgeLengths = self.edgeData.view(5, 2)
+        self.edgePrimitives = self.initArray(self.edgeData.view(5, 1), np.zeros((self.edgeCount)) - 1)
+        self.edgeSizes = self.initArray(self.edgeData.view(4, 0, 3), np.ones((self.edgeCount, 3)))
         self.edgeSizes[:, 0] *= 0.01
         self.edgeSizes[:, 1] *= 0.01
         self.edgeSizes[:, 2] *= 1.0
-        self.edgeRoundings = np.ones((self.jointCount)) * 0.01
-        self.edgeSmoothings = np.ones((self.edgeCount)) * 0.01
+        self.edgeRoundings = self.initArray(self.edgeData.view(4, 3), np.ones((self.edgeCount)) * 0.01)
+        self.edgeSmoothings = self.initArray(self.edgeData.view(5, 0), np.ones((self.edgeCount)) * 0.01)
+        self.edgeBounds = self.edgeData.view(6, 0, 4)
+        self.edgeBoundSizes = np.zeros((self.edgeCount, 3))
 
         # object settings
-        self.objectColors = np.ones((self.objectCount, 3))
-        self.objectAmbientScales = np.ones((self.objectCount))
-        self.objectDiffuseScales = np.ones((self.objectCount))
-        self.objectSpecularScales = np.ones((self.objectCount))
-        self.objectSpecularPows = np.ones((self.objectCount)) * 20.0
-        self.objectOcclusionScales = np.ones((self.objectCount))
-        self.objectOcclusionRanges = np.ones((self.objectCount))
-        self.objectOcclusionResolutions = np.ones((self.objectCount))
-        self.objectOcclusionColors = np.zeros((self.objectCount, 3))
-        
-        self.objectFrequencies = np.zeros((self.objectCount, 3))
-        self.objectAmplitudes = np.zeros((self.objectCount, 3))
-        self.objectPhases = np.zeros((self.objectCount, 3))
-
-        self.objectPrimitives = np.zeros((self.objectCount), dtype=np.int32) - 1
-        self.objectSizes = np.ones((self.objectCount, 3)) * 0.01
-        self.objectRoundings = np.ones((self.objectCount)) * 0.01
-        self.objectSmoothings = np.ones((self.objectCount)) * 0.01
+        self.objectColors = self.initArray(self.objectData.view(6, 0, 3), np.ones((self.objectCount, 3)))
+        self.objectAmbientScales = self.initArray(self.objectData.view(6, 3), np.ones((self.objectCount)))
+        self.objectDiffuseScales = self.initArray(self.objectData.view(7, 3), np.ones((self.objectCount)))
+        self.objectSpecularScales = self.initArray(self.objectData.view(8, 3), np.ones((self.objectCount)))
+        self.objectSpecularPows = self.initArray(self.objectData.view(9, 3), np.ones((self.objectCount)) * 20.0)
+        self.objectOcclusionScales = self.initArray(self.objectData.view(10, 3), np.ones((self.objectCount)))
+        self.objectOcclusionRanges = self.initArray(self.objectData.view(11, 0), np.ones((self.objectCount)))
+        self.objectOcclusionResolutions = self.initArray(self.objectData.view(11, 1), np.ones((self.objectCount)))
+        self.objectOcclusionColors = self.initArray(self.objectData.view(7, 0, 3), np.zeros((self.objectCount, 3)))
+        
+        self.objectFrequencies = self.initArray(self.objectData.view(8, 0, 3), np.zeros((self.objectCount, 3)))
+        self.objectAmplitudes = self.initArray(self.objectData.view(9, 0, 3), np.zeros((self.objectCount, 3)))
+        self.objectPhases = self.initArray(self.objectData.view(10, 0, 3), np.zeros((self.objectCount, 3)))
+
+        self.objectPrimitives = self.initArray(self.objectData.view(5, 1), np.zeros((self.objectCount)) - 1)
+        self.objectSizes = self.initArray(self.objectData.view(4, 0, 3), np.ones((self.objectCount, 3)) * 0.01)
+        self.objectRoundings = self.initArray(self.objectData.view(4, 3), np.ones((self.objectCount)) * 0.01)
+        self.objectSmoothings = self.initArray(self.objectData.view(5, 0), np.ones((self.objectCount)) * 0.01)
         self.objectPositions  = np.zeros((self.objectCount, 3))
         self.objectRotations  = np.zeros((self.objectCount, 4))
         self.objectRotations[:, 1] = 1.0
-        self.objectTransforms = np.zeros((self.objectCount, 4, 4))
+        self.objectTransforms = self.initArray(self.objectData.matrixView(0), np.zeros((self.objectCount, 4, 4)))
+        self.objectBounds = self.objectData.view(12, 0, 4)
         
         for oI in range(self.objectCount):
             self.updateObjectTransform(oI)
@@ -110,107 +203,44 @@ class Visualization():
         self.jointEdgeSmoothing = 0.01
         self.skelObjectSmoothing = 0.01
         
-    def setupShader(self, gl):
-        
-        # setup shader
-        self.program = gl.glCreateProgram()
-        self.vertex = gl.glCreateShader(gl.GL_VERTEX_SHADER)
-        self.fragment = gl.glCreateShader(gl.GL_FRAGMENT_SHADER)
+        self.updateSceneBlock()
         
-        logger = logging.getLogger(__name__)
-
-        # Set shaders source
-        gl.glShaderSource(self.vertex, self.vertexCode)
-        gl.glShaderSource(self.fragment, self.fragmentCode)
-
-        # Compile shaders
-        gl.glCompileShader(self.vertex)
-        if not gl.glGetShaderiv(self.vertex, gl.GL_COMPILE_STATUS):
-            error = gl.glGetShaderInfoLog(self.vertex).decode()
-            logger.error("Vertex shader compilation error: %s", error)
-
-        gl.glCompileShader(self.fragment)
-        if not gl.glGetShaderiv(self.fragment, gl.GL_COMPILE_STATUS):
-            error = gl.glGetShaderInfoLog(self.fragment).decode()
-            print(error)
-            raise RuntimeError("Fragment shader compilation error")
-
-        gl.glAttachShader(self.program, self.vertex)
-        gl.glAttachShader(self.program, self.fragment)
-        gl.glLinkProgram(self.program)
-
-        if not gl.glGetProgramiv(self.program, gl.GL_LINK_STATUS):
-            print(gl.glGetProgramInfoLog(self.program))
-            raise RuntimeError('Linking error')
-            
-        self.shader_iGlobalTime = gl.glGetUniformLocation(self.program, "iGlobalTime")
-        self.shader_iResolution = gl.glGetUniformLocation(self.program, "iResolution")
+        # frame index of the pose currently in the joint and edge buffers
+        self.sceneFrameIndex = -1
         
-        # camera settings
-        self.shader_camPosition = gl.glGetUniformLocation(self.program, "camPosition")
-        self.shader_camAngle = gl.glGetUniformLocation(self.program, "camAngle")
+    def setupShader(self, gl):
         
-        # light settings
-        self.shader_lightPosition = gl.glGetUniformLocation(self.program, "lightPosition")
-        self.shader_shadowSmooth = gl.glGetUniformLocation(self.program, "shadowSmooth")
-        self.shader_shadowStrength = gl.glGetUniformLocation(self.program, "shadowStrength")
+        # variants compile on driver threads if the context supports it, so switching them doesn't stall rendering
+        self.parallelShaderCompile = enable_parallel_shader_compile(gl)
         
-        # background settings
-        self.shader_bgColor = gl.glGetUniformLocation(self.program, "bgColor")
-        self.shader_bgOcclusionColor = gl.glGetUniformLocation(self.program, "bgOcclusionColor")
+        # scene uniform block
+        self.sceneBuffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.sceneBuffer)
+        gl.glBufferData(gl.GL_UNIFORM_BUFFER, self.sceneBlock.getSize(), None, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBufferBase(gl.GL_UNIFORM_BUFFER, self.sceneBlockBinding, self.sceneBuffer)
         
-        # fog settings
-        self.shader_fogMinDist = gl.glGetUniformLocation(self.program, "fog_min_dist")
-        self.shader_fogMaxDist = gl.glGetUniformLocation(self.program, "fog_max_dist")
+        # the new buffer holds no data yet
+        self.sceneBlock.markAllDirty()
         
-        # skeleton joint settings
-        self.shader_jointColor = gl.glGetUniformLocation(self.program, "jointColor")
-        self.shader_jointAmbientScale = gl.glGetUniformLocation(self.program, "jointAmbientScale")
-        self.shader_jointDiffuseScale = gl.glGetUniformLocation(self.program, "jointDiffuseScale")
-        self.shader_jointSpecularScale = gl.glGetUniformLocation(self.program, "jointSpecularScale")
-        self.shader_jointSpecularPow = gl.glGetUniformLocation(self.program, "jointSpecularPow")
-        self.shader_jointOcclusionScale = gl.glGetUniformLocation(self.program, "jointOcclusionScale")
-        self.shader_jointOcclusionRange = gl.glGetUniformLocation(self.program, "jointOcclusionRange")
-        self.shader_jointOcclusionResolution = gl.glGetUniformLocation(self.program, "jointOcclusionResolution")
-        self.shader_jointOcclusionColor = gl.glGetUniformLocation(self.program, "jointOcclusionColor")
+        # primitive texture buffers
+        self.jointDataBuffer, self.jointDataTexture = self.setupPrimitiveBuffer(gl, self.jointData, self.jointDataUnit)
+        self.edgeDataBuffer, self.edgeDataTexture = self.setupPrimitiveBuffer(gl, self.edgeData, self.edgeDataUnit)
+        self.objectDataBuffer, self.objectDataTexture = self.setupPrimitiveBuffer(gl, self.objectData, self.objectDataUnit)
+        self.bvhDataBuffer, self.bvhDataTexture = self.setupPrimitiveBuffer(gl, self.bvhData, self.bvhDataUnit)
         
-        # skeleton edge settings
-        self.shader_edgeColor = gl.glGetUniformLocation(self.program, "edgeColor")
-        self.shader_edgeAmbientScale = gl.glGetUniformLocation(self.program, "edgeAmbientScale")
-        self.shader_edgeDiffuseScale = gl.glGetUniformLocation(self.program, "edgeDiffuseScale")
-        self.shader_edgeSpecularScale = gl.glGetUniformLocation(self.program, "edgeSpecularScale")
-        self.shader_edgeSpecularPow = gl.glGetUniformLocation(self.program, "edgeSpecularPow")
-        self.shader_edgeOcclusionScale = gl.glGetUniformLocation(self.program, "edgeOcclusionScale")
-        self.shader_edgeOcclusionRange = gl.glGetUniformLocation(self.program, "edgeOcclusionRange")
-        self.shader_edgeOcclusionResolution = gl.glGetUniformLocation(self.program, "edgeOcclusionResolution")
-        self.shader_edgeOcclusionColor = gl.glGetUniformLocation(self.program, "edgeOcclusionColor")
-        
-        # combined smoothing factors
-        self.shader_jointEdgeSmoothing = gl.glGetUniformLocation(self.program, "jointEdgeSmoothing")
-        self.shader_skelObjectSmoothing = gl.glGetUniformLocation(self.program, "skelObjectSmoothing")
-
-        gl.glDetachShader(self.program, self.vertex)
-        gl.glDetachShader(self.program, self.fragment)
-
-        gl.glUseProgram(self.program)
+        # tile bin texture buffers
+        self.tileBins.setup(gl, self.tileHeaderUnit, self.tileEntryUnit)
+        self.tileBinsDirty = True
         
         # setup render quad
 
         # Build data
         data = np.zeros((4, 2), dtype=np.float32)
         # Request a buffer slot from GPU
-        buffer = gl.glGenBuffers(1)
+        self.quadBuffer = gl.glGenBuffers(1)
 
         # Make this buffer the default one
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
-
-        stride = data.strides[0]
-
-        offset = ctypes.c_void_p(0)
-        loc = gl.glGetAttribLocation(self.program, "position")
-        gl.glEnableVertexAttribArray(loc)
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
-        gl.glVertexAttribPointer(loc, 2, gl.GL_FLOAT, False, stride, offset)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.quadBuffer)
 
         # drawing quad
         data[...] = [(+1, -1), (+1, +1), (-1, -1), (-1, +1)]
@@ -218,650 +248,1000 @@ class Visualization():
         # Upload CPU data to GPU buffer
         gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_DYNAMIC_DRAW)
         
+        self.bindRenderQuad(gl)
         
-        self.start_time = time.time() 
-    
-    def render(self, gl):
-        gl.glUseProgram(self.program)
+        # offscreen framebuffer for dynamic resolution, its storage is allocated for the window size in render
+        self.sceneFramebuffer = gl.glGenFramebuffers(1)
+        self.sceneRenderbuffer = gl.glGenRenderbuffers(1)
+        self.sceneFramebufferSize = None
         
-        elapsed_time = time.time() - self.start_time
-
-        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        self.gpuTimer.setup(gl)
         
-        gl.glUniform1f(self.shader_iGlobalTime, elapsed_time)
-        gl.glUniform2f(self.shader_iResolution, *self.resolution)
+        # the first variant has to be ready before the first frame
+        self.activeShaderProgram = None
+        self.targetShaderProgram = self.getShaderProgram(gl)
         
-        # camera settings
-        gl.glUniform3f(self.shader_camPosition, *self.camPosition.tolist())
-        gl.glUniform1f(self.shader_camAngle, self.camAngle);
+        if self.targetShaderProgram.finish(gl) == False:
+            raise RuntimeError("shader program " + str(self.targetShaderProgram.defines) + " failed to compile or link")
         
-        # light settings
-        gl.glUniform3f(self.shader_lightPosition, *self.lightPosition.tolist())
-        gl.glUniform1f(self.shader_shadowSmooth, self.shadowSmooth);
-        gl.glUniform1f(self.shader_shadowStrength, self.shadowStrength);
-
-        # background settings
-        gl.glUniform3f(self.shader_bgColor, *self.bgColor.tolist())
-        gl.glUniform3f(self.shader_bgOcclusionColor, *self.bgOcclusionColor.tolist())
+        self.activateShaderProgram(gl, self.targetShaderProgram)
         
-        # fog settings
-        gl.glUniform1f(self.shader_fogMinDist, self.fogMinDist);
-        gl.glUniform1f(self.shader_fogMaxDist, self.fogMaxDist);
+        self.start_time = time.time() 
+    
+    def getShaderProgram(self, gl):
+        """
+        Returns the ShaderProgram for the current shader defines, its compilation is started if it doesn't exist yet
+        """
         
-        # skeleton joint settings
-        gl.glUniform3f(self.shader_jointColor, *self.jointColor.tolist())
-        gl.glUniform1f(self.shader_jointAmbientScale, self.jointAmbientScale)
-        gl.glUniform1f(self.shader_jointDiffuseScale, self.jointDiffuseScale)
-        gl.glUniform1f(self.shader_jointSpecularScale, self.jointSpecularScale)
-        gl.glUniform1f(self.shader_jointSpecularPow, self.jointSpecularPow)
-        gl.glUniform1f(self.shader_jointOcclusionScale, self.jointOcclusionScale)
-        gl.glUniform1f(self.shader_jointOcclusionRange, self.jointOcclusionRange)
-        gl.glUniform1f(self.shader_jointOcclusionResolution, self.jointOcclusionResolution)
-        gl.glUniform3f(self.shader_jointOcclusionColor, *self.jointOcclusionColor.tolist())
-        
-        jointCount = self.skeleton.getJointCount()
-
-        # joint transforms
-        jointTransforms = np.copy(self.skeleton.getJointTransforms())
-        for jI in range(jointCount):
-            
-            jointTransform = jointTransforms[jI]
-            
-            uniformName = "jointTransforms[" + str(jI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniformMatrix4fv(uniformLoc, 1, gl.GL_FALSE, jointTransform.tolist ())
+        defines = self.getShaderDefines()
+        key = tuple(sorted(defines.items()))
         
-        # joint primitives
-        for jI in range(jointCount):
-            
-            jointPrimitive = self.jointPrimitives[jI]
-            uniformName = "jointPrimitives[" + str(jI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1i(uniformLoc, jointPrimitive)
-
-        # joint sizes
-        for jI in range(jointCount):
+        if key not in self.shaderPrograms:
+            shaderProgram = ShaderProgram(self.vertexCode, self.fragmentCode, defines)
             
-            jointSize = self.jointSizes[jI]
-            uniformName = "jointSizes[" + str(jI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, jointSize.tolist())
-
-        # joint rounding
-        for jI in range(jointCount):
-            
-            jointRounding = self.jointRoundings[jI]
-            uniformName = "jointRoundings[" + str(jI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, jointRounding)
+            # the first variant is compiled on the render context, it is waited for anyway
+            if self.parallelShaderCompile == False and self.shaderCompileThread is not None and self.activeShaderProgram is not None:
+                self.shaderCompileThread.compile(shaderProgram, self.programCache)
+            else:
+                shaderProgram.start(gl, self.programCache, self.parallelShaderCompile)
                 
-        # joint smooths
-        for jI in range(jointCount):
-            
-            jointSmooth = self.jointSmoothings[jI]
-            uniformName = "jointSmoothings[" + str(jI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, jointSmooth)
+            self.shaderPrograms[key] = shaderProgram
             
-        # skeleton edge settings
-        gl.glUniform3f(self.shader_edgeColor, *self.edgeColor.tolist())
-        gl.glUniform1f(self.shader_edgeAmbientScale, self.edgeAmbientScale)
-        gl.glUniform1f(self.shader_edgeDiffuseScale, self.edgeDiffuseScale)
-        gl.glUniform1f(self.shader_edgeSpecularScale, self.edgeSpecularScale)
-        gl.glUniform1f(self.shader_edgeSpecularPow, self.edgeSpecularPow)
-        gl.glUniform1f(self.shader_edgeOcclusionScale, self.edgeOcclusionScale)
-        gl.glUniform1f(self.shader_edgeOcclusionRange, self.edgeOcclusionRange)
-        gl.glUniform1f(self.shader_edgeOcclusionResolution, self.edgeOcclusionResolution)
-        gl.glUniform3f(self.shader_edgeOcclusionColor, *self.edgeOcclusionColor.tolist())     
-        
-        edgeCount = self.skeleton.getEdgeCount()
-        
-        # edge transforms
-        edgeTransforms = np.copy(self.skeleton.getEdgeTransforms())
-        for eI in range(edgeCount):
-            
-            edgeTransform = edgeTransforms[eI]
-            uniformName = "edgeTransforms[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniformMatrix4fv(uniformLoc, 1, gl.GL_FALSE, edgeTransform.tolist ())
-            
-        # edge primitives
-        for eI in range(edgeCount):
-            
-            edgePrimitive = self.edgePrimitives[eI]
-            uniformName = "edgePrimitives[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1i(uniformLoc, edgePrimitive)
-            
-        # edge lengths
-        edgeLengths = np.copy(self.skeleton.getEdgeLengths())
-        for eI in range(edgeCount):
-
-            edgeLength = edgeLengths[eI]
-            uniformName = "edgeLengths[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, edgeLength)
-            
-        # edge sizes
-        for eI in range(edgeCount):
-
-            edgeSize = self.edgeSizes[eI]
-            uniformName = "edgeSizes[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, edgeSize.tolist())
- 
-        # edge rounding
-        for eI in range(edgeCount):
-            
-            edgeRounding = self.edgeRoundings[eI]
-            uniformName = "edgeRoundings[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, edgeRounding)           
- 
-        # edge smooths
-        for eI in range(edgeCount):
+        return self.shaderPrograms[key]
+    
+    def updateShaderProgram(self, gl):
+        """
+        Switches to the shader variant for the primitives in use once it is compiled, until then the active variant keeps rendering
+        """
+        
+        if self.shaderDefinesChanged == True:
+            self.shaderDefinesChanged = False
+            self.targetShaderProgram = self.getShaderProgram(gl)
             
-            edgeSmooth = self.edgeSmoothings[eI]
-            uniformName = "edgeSmoothings[" + str(eI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, edgeSmooth)        
+        if self.targetShaderProgram is self.activeShaderProgram:
+            return
         
-        # object colors
-        for oI in range(self.objectCount):
-            
-            objectColor = self.objectColors[oI]
-            
-            uniformName = "objectColors[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3f(uniformLoc, *objectColor.tolist())
-
-        # object ambient scales
-        for oI in range(self.objectCount):
-            
-            objectAmbientScale = self.objectAmbientScales[oI]
-            
-            uniformName = "objectAmbientScales[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectAmbientScale)   
-
-        # object diffuse scales
-        for oI in range(self.objectCount):
-            
-            objectDiffuseScale = self.objectDiffuseScales[oI]
-            uniformName = "objectDiffuseScales[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectDiffuseScale)    
-            
-        # object specular scales
-        for oI in range(self.objectCount):
-            
-            objectSpecularScale = self.objectSpecularScales[oI]
-            uniformName = "objectSpecularScales[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectSpecularScale)
+        # a variant that doesn't compile is dropped, the active variant keeps rendering
+        if self.targetShaderProgram.isFailed() == True:
+            self.targetShaderProgram = self.activeShaderProgram
+            self.deleteShaderPrograms(gl)
+            return
+        
+        if self.targetShaderProgram.isReady(gl) == False:
+            return
+        
+        self.activateShaderProgram(gl, self.targetShaderProgram)
+        self.deleteShaderPrograms(gl)
+    
+    def deleteShaderPrograms(self, gl):
+        """
+        Deletes the variants that are not active, except the ones the ShaderCompileThread still works on
+        """
+        
+        for key, shaderProgram in list(self.shaderPrograms.items()):
+            if shaderProgram is not self.activeShaderProgram and shaderProgram.isPending() == False:
+                shaderProgram.delete(gl)
+                del self.shaderPrograms[key]
+    
+    def activateShaderProgram(self, gl, shaderProgram):
+        """
+        Expects a linked ShaderProgram, queries its uniforms and binds the scene block and primitive buffers to it
+        """
+        
+        self.activeShaderProgram = shaderProgram
+        self.program = shaderProgram.program
+        
+        gl.glUseProgram(self.program)
+        
+        self.shader_iGlobalTime = gl.glGetUniformLocation(self.program, "iGlobalTime")
+        self.shader_iResolution = gl.glGetUniformLocation(self.program, "iResolution")
+        
+        # scene uniform block
+        self.shader_sceneBlock = gl.glGetUniformBlockIndex(self.program, "SceneBlock")
+        gl.glUniformBlockBinding(self.program, self.shader_sceneBlock, self.sceneBlockBinding)
+        
+        # the block declaration in the shader and getSceneBlockMembers have to agree
+        sceneBlockSize = np.zeros(1, dtype=np.int32)
+        gl.glGetActiveUniformBlockiv(self.program, self.shader_sceneBlock, gl.GL_UNIFORM_BLOCK_DATA_SIZE, sceneBlockSize)
+        sceneBlockSize = (int(sceneBlockSize[0]) + 15) // 16 * 16
+        if sceneBlockSize != self.sceneBlock.getSize():
+            raise RuntimeError("SceneBlock layout mismatch: shader " + str(sceneBlockSize) + " bytes, python " + str(self.sceneBlock.getSize()) + " bytes")
+        
+        # primitive texture buffers
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "jointData"), self.jointDataUnit)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "edgeData"), self.edgeDataUnit)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "objectData"), self.objectDataUnit)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "bvhData"), self.bvhDataUnit)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "tileHeaders"), self.tileHeaderUnit)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "tileEntries"), self.tileEntryUnit)
+    
+    def getShaderDefines(self):
+        """
+        Returns dict of the macros the fragment shader is compiled with
+        """
+        
+        # ripples only matter for objects that are drawn
+        objectRipples = np.any(self.objectAmplitudes[self.objectPrimitives >= 0] != 0.0)
+        
+        jointMask = primitive_mask(self.jointPrimitives)
+        edgeMask = primitive_mask(self.edgePrimitives)
+        objectMask = primitive_mask(self.objectPrimitives)
+        
+        # compiling a variant would stall the render thread, a single variant with all primitive types is used instead
+        if self.parallelShaderCompile == False and self.shaderCompileThread is None:
+            jointMask = edgeMask = objectMask = all_primitives_mask
+            objectRipples = True
+        
+        return {
+            "JOINT_COUNT": self.jointCount,
+            "EDGE_COUNT": self.edgeCount,
+            "OBJECT_COUNT": self.objectCount,
+            "JOINT_PRIMITIVES": jointMask,
+            "EDGE_PRIMITIVES": edgeMask,
+            "OBJECT_PRIMITIVES": objectMask,
+            "OBJECT_RIPPLES": int(objectRipples),
+            "PRIMITIVE_CULLING": int(self.primitiveCulling),
+            "BVH_STACK_SIZE": int(np.ceil(np.log2(max(self.jointCount, self.edgeCount, self.objectCount, 1)))) + 2,
+            "TILE_BINNING": int(self.tileBinning),
+            "TILE_SIZE": self.tileBins.tileSize
+            }
+    
+    def bindRenderQuad(self, gl):
+        """
+        Points the position attribute to the render quad, painting with QPainter between frames changes the attribute state
+        """
+        
+        # position has location 0 in shaderVert.glsl
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.quadBuffer)
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(0, 2, gl.GL_FLOAT, False, 2 * 4, ctypes.c_void_p(0))
+        
+    def recordStage(self, stage, startTime):
+        """
+        Expects the time.perf_counter() at which the stage started
+        Returns the time.perf_counter() at which the stage ended, the start of the next stage
+        """
+        
+        endTime = time.perf_counter()
+        
+        if self.profiler is not None:
+            self.profiler.record(stage, endTime - startTime)
             
-        # object specular pow
-        for oI in range(self.objectCount):
+        return endTime
+        
+    def setupPrimitiveBuffer(self, gl, primitiveBuffer, unit):
+        """
+        Expects a PrimitiveBuffer and the texture unit to bind it to
+        Returns buffer and texture ids
+        """
+        
+        buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, buffer)
+        gl.glBufferData(gl.GL_TEXTURE_BUFFER, primitiveBuffer.getSize(), None, gl.GL_DYNAMIC_DRAW)
+        
+        texture = gl.glGenTextures(1)
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(gl.GL_TEXTURE_BUFFER, texture)
+        gl.glTexBuffer(gl.GL_TEXTURE_BUFFER, gl.GL_RGBA32F, buffer)
+        
+        # the new buffer holds no data yet
+        primitiveBuffer.markDirty()
+        
+        return buffer, texture
+    
+    def uploadPrimitiveBuffer(self, gl, primitiveBuffer, buffer, updateBounds=None):
+        """
+        Uploads the ranges of a PrimitiveBuffer written since its last upload
+        Expects updateBounds: method that writes the bounding spheres of the primitives into the buffer, or None
+        """
+        
+        if primitiveBuffer.isDirty() == False:
+            return
+        
+        # bounds are computed from what was written before the ranges were taken, later writes mark the buffer dirty again
+        dirtyRanges = primitiveBuffer.takeDirtyRanges()
+        if updateBounds is not None and self.needsBounds() == True:
+            updateBounds()
+        
+        gl.glBindBuffer(gl.GL_TEXTURE_BUFFER, buffer)
+        
+        for start, end in dirtyRanges:
+            gl.glBufferSubData(gl.GL_TEXTURE_BUFFER, start, end - start, primitiveBuffer.bytes[start:end])
+    
+    def needsBounds(self):
+        """
+        Returns True if the bounding spheres of the primitives are in use
+        """
+        
+        return self.primitiveCulling == True or self.tileBinning == True or self.sceneBounding == True
+        
+    def updateJointBounds(self):
+        
+        bounding_spheres(self.jointTransforms, self.jointPrimitives, self.jointSizes, self.jointRoundings, self.jointSizes[:, 0], np.abs(self.jointSmoothings), self.jointBounds)
+        self.updateBvh(self.jointBounds, self.jointPrimitives, self.jointBvhFirst, self.jointBvhLeaves)
+        
+    def updateEdgeBounds(self):
+        
+        # the shader scales the length of edges with the distance between their joints
+        self.edgeBoundSizes[:] = self.edgeSizes
+        self.edgeBoundSizes[:, 2] *= self.edgeLengths
+        
+        bounding_spheres(self.edgeTransforms, self.edgePrimitives, self.edgeBoundSizes, self.edgeRoundings, self.edgeBoundSizes[:, 2], np.abs(self.edgeSmoothings), self.edgeBounds)
+        self.updateBvh(self.edgeBounds, self.edgePrimitives, self.edgeBvhFirst, self.edgeBvhLeaves)
+        
+    def updateObjectBounds(self):
+        
+        # ripples move the surface of boxes and cylinders outwards by up to twice their amplitude
+        padding = np.abs(self.objectSmoothings) + 2.0 * np.linalg.norm(self.objectAmplitudes, axis=1)
+        
+        bounding_spheres(self.objectTransforms, self.objectPrimitives, self.objectSizes, self.objectRoundings, self.objectSizes[:, 0], padding, self.objectBounds)
+        self.updateBvh(self.objectBounds, self.objectPrimitives, self.objectBvhFirst, self.objectBvhLeaves)
+        
+    def updateBvh(self, bounds, primitives, first, leaves):
+        """
+        Expects the bounding spheres and primitive types of the joints, edges or objects, the first node of their tree
+        and the array that receives the leaf node of each primitive
+        """
+        
+        # primitives that aren't drawn are left out of the tree
+        build_sphere_tree(bounds, np.nonzero(primitives >= 0)[0], self.bvhData.texels, first, leaves)
+        self.bvhData.markDirty()
+        self.tileBinsDirty = True
+        self.sceneBoundDirty = True
+        
+    def updateTileBins(self, gl):
+        """
+        Bins the drawn primitives into screen tiles by their bounding spheres and uploads the bins if the bounds, the camera or the resolution changed
+        """
+        
+        tileBinsKey = (tuple(self.camPosition), self.camAngle, tuple(self.resolution), self.jointEdgeSmoothing, self.skelObjectSmoothing)
+        
+        if self.tileBinsDirty == False and tileBinsKey == self.tileBinsKey:
+            return
+        
+        # a primitive left out of a tile has to be so far from the tile's rays that it changes neither the smooth union of its kind
+        # nor the combined unions there, which holds beyond twice the smoothing radii
+        padding = 2.0 * (abs(self.jointEdgeSmoothing) + abs(self.skelObjectSmoothing))
+        
+        groups = []
+        
+        for bounds, leaves, smoothings in [(self.jointBounds, self.jointBvhLeaves, self.jointSmoothings), (self.edgeBounds, self.edgeBvhLeaves, self.edgeSmoothings), (self.objectBounds, self.objectBvhLeaves, self.objectSmoothings)]:
+            spheres = bounds.astype(np.float64)
+            spheres[:, 3] += np.abs(smoothings) + padding
+            groups.append((spheres, leaves))
+        
+        # the camera looks at the origin with -z up, as in main of shaderFrag.glsl
+        self.tileBins.update(groups, np.asarray(self.camPosition, dtype=np.float64), np.zeros(3), np.array([0.0, 0.0, -1.0]), self.camAngle, self.resolution)
+        self.tileBins.upload(gl)
+        
+        self.tileBinsDirty = False
+        self.tileBinsKey = tileBinsKey
+        
+    def updateSceneBound(self):
+        """
+        Writes a sphere around all drawn primitives into the scene block, radius -1 if a primitive has no bound or sceneBounding is off
+        """
+        
+        self.sceneBoundDirty = False
+        
+        bounds = np.concatenate((self.jointBounds[self.jointPrimitives >= 0], self.edgeBounds[self.edgePrimitives >= 0], self.objectBounds[self.objectPrimitives >= 0])).astype(np.float64)
+        
+        if self.sceneBounding == False or np.any(bounds[:, 3] >= unbounded_radius):
+            self.sceneBlock["sceneBound"] = [0.0, 0.0, 0.0, -1.0]
+            return
+        
+        # nothing is drawn, every ray misses
+        if bounds.shape[0] == 0:
+            self.sceneBlock["sceneBound"] = [0.0, 0.0, 0.0, 0.0]
+            return
+        
+        lower = np.min(bounds[:, :3] - bounds[:, 3:], axis=0)
+        upper = np.max(bounds[:, :3] + bounds[:, 3:], axis=0)
+        center = (lower + upper) / 2.0
+        
+        # the smooth unions of joints, edges and objects pull the surface out by up to a quarter of their smoothing radius,
+        # the march stops within EPSILON of the surface
+        radius = np.max(np.linalg.norm(bounds[:, :3] - center, axis=1) + bounds[:, 3])
+        radius += abs(self.jointEdgeSmoothing) + abs(self.skelObjectSmoothing) + 0.001
+        
+        self.sceneBlock["sceneBound"] = [center[0], center[1], center[2], radius]
+        
+    def getSceneBlockMembers(self):
+        """
+        Returns the members of the SceneBlock uniform block in shaderFrag.glsl as (glslType, name, count), in declaration order
+        """
+        
+        return [
+            # camera settings
+            ("vec3", "camPosition", 0),
+            ("float", "camAngle", 0),
             
-            objectSpecularPow = self.objectSpecularPows[oI]
-            uniformName = "objectSpecularPows[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectSpecularPow)    
-
-        # object occlusion scale
-        for oI in range(self.objectCount):
+            # light settings
+            ("vec3", "lightPosition", 0),
+            ("float", "shadowSmooth", 0),
+            ("float", "shadowStrength", 0),
             
-            objectOcclusionScale = self.objectOcclusionScales[oI]
-            uniformName = "objectOcclusionScales[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectOcclusionScale)    
-
-        # object occlusion range
-        for oI in range(self.objectCount):
+            # background settings
+            ("vec3", "bgColor", 0),
+            ("vec3", "bgOcclusionColor", 0),
             
-            objectOcclusionRange = self.objectOcclusionRanges[oI]
-            uniformName = "objectOcclusionRanges[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectOcclusionRange)  
-
-        # object occlusion resolution
-        for oI in range(self.objectCount):
+            # fog settings
+            ("float", "fog_min_dist", 0),
+            ("float", "fog_max_dist", 0),
             
-            objectOcclusionResolution = self.objectOcclusionResolutions[oI]
-            uniformName = "objectOcclusionResolutions[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectOcclusionResolution)  
-
-        # object occlusion colors
-        for oI in range(self.objectCount):
+            # skeleton joint settings
+            ("vec3", "jointColor", 0),
+            ("float", "jointAmbientScale", 0),
+            ("float", "jointDiffuseScale", 0),
+            ("float", "jointSpecularScale", 0),
+            ("float", "jointSpecularPow", 0),
+            ("float", "jointOcclusionScale", 0),
+            ("float", "jointOcclusionRange", 0),
+            ("float", "jointOcclusionResolution", 0),
+            ("vec3", "jointOcclusionColor", 0),
             
-            objectOcclusionColor = self.objectOcclusionColors[oI]
-            uniformName = "objectOcclusionColors[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3f(uniformLoc, *objectOcclusionColor.tolist())
+            # skeleton edge settings
+            ("vec3", "edgeColor", 0),
+            ("float", "edgeAmbientScale", 0),
+            ("float", "edgeDiffuseScale", 0),
+            ("float", "edgeSpecularScale", 0),
+            ("float", "edgeSpecularPow", 0),
+            ("float", "edgeOcclusionScale", 0),
+            ("float", "edgeOcclusionRange", 0),
+            ("float", "edgeOcclusionResolution", 0),
+            ("vec3", "edgeOcclusionColor", 0),
             
-        # object frequencies
-        for oI in range(self.objectCount):
+            # combined smoothing factors
+            ("float", "jointEdgeSmoothing", 0),
+            ("float", "skelObjectSmoothing", 0),
             
-            objectFrequency = self.objectFrequencies[oI]
-            uniformName = "objectFrequencies[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, objectFrequency.tolist())
+            # sphere around all drawn primitives (center, radius), radius < 0 for none
+            ("vec4", "sceneBound", 0)
+            ]
     
-        # object amplitudes
-        for oI in range(self.objectCount):
-            
-            objectAmplitude = self.objectAmplitudes[oI]
-            uniformName = "objectAmplitudes[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, objectAmplitude.tolist())   
-            
-        # object phases
-        for oI in range(self.objectCount):
+    def initArray(self, array, values):
+        """
+        Expects a view into one of the primitive buffers and its initial values
+        Returns the view
+        """
+        
+        array[...] = values
+        
+        return array
+    
+    def updateSceneBlock(self):
+        """
+        Writes all scalar settings into the scene uniform block, the setters keep it up to date afterwards
+        """
+        
+        block = self.sceneBlock
+        
+        # camera settings
+        block["camPosition"] = self.camPosition
+        block["camAngle"] = self.camAngle
+        
+        # light settings
+        block["lightPosition"] = self.lightPosition
+        block["shadowSmooth"] = self.shadowSmooth
+        block["shadowStrength"] = self.shadowStrength
+        
+        # background settings
+        block["bgColor"] = self.bgColor
+        block["bgOcclusionColor"] = self.bgOcclusionColor
+        
+        # fog settings
+        block["fog_min_dist"] = self.fogMinDist
+        block["fog_max_dist"] = self.fogMaxDist
+        
+        # skeleton joint settings
+        block["jointColor"] = self.jointColor
+        block["jointAmbientScale"] = self.jointAmbientScale
+        block["jointDiffuseScale"] = self.jointDiffuseScale
+        block["jointSpecularScale"] = self.jointSpecularScale
+        block["jointSpecularPow"] = self.jointSpecularPow
+        block["jointOcclusionScale"] = self.jointOcclusionScale
+        block["jointOcclusionRange"] = self.jointOcclusionRange
+        block["jointOcclusionResolution"] = self.jointOcclusionResolution
+        block["jointOcclusionColor"] = self.jointOcclusionColor
+        
+        # skeleton edge settings
+        block["edgeColor"] = self.edgeColor
+        block["edgeAmbientScale"] = self.edgeAmbientScale
+        block["edgeDiffuseScale"] = self.edgeDiffuseScale
+        block["edgeSpecularScale"] = self.edgeSpecularScale
+        block["edgeSpecularPow"] = self.edgeSpecularPow
+        block["edgeOcclusionScale"] = self.edgeOcclusionScale
+        block["edgeOcclusionRange"] = self.edgeOcclusionRange
+        block["edgeOcclusionResolution"] = self.edgeOcclusionResolution
+        block["edgeOcclusionColor"] = self.edgeOcclusionColor
+        
+        # combined smoothing factors
+        block["jointEdgeSmoothing"] = self.jointEdgeSmoothing
+        block["skelObjectSmoothing"] = self.skelObjectSmoothing
+        
+    def setResolution(self, width, height):
+        """
+        Expects the size of the window's framebuffer in pixels
+        """
+        
+        self.resolution = [float(width), float(height)]
+        
+    def getRenderSize(self):
+        """
+        Returns width and height in pixels of the ray marched image
+        """
+        
+        scale = self.resolutionGovernor.scale if self.dynamicResolution == True else 1.0
+        
+        return max(int(self.resolution[0] * scale), 1), max(int(self.resolution[1] * scale), 1)
+        
+    def updateSceneFramebuffer(self, gl):
+        """
+        Allocates the offscreen framebuffer for the window size, smaller render sizes use a part of it
+        """
+        
+        size = (int(self.resolution[0]), int(self.resolution[1]))
+        
+        if size == self.sceneFramebufferSize:
+            return
+        
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.sceneRenderbuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, size[0], size[1])
+        
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.sceneFramebuffer)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, self.sceneRenderbuffer)
+        
+        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("scene framebuffer incomplete")
+        
+        self.sceneFramebufferSize = size
+        
+    def isAnimated(self):
+        """
+        Returns True if a drawn object changes over time without any new pose or setting
+        """
+        
+        return np.any(np.isin(self.objectPrimitives, animated_object_primitives))
+    
+    def needsRender(self):
+        """
+        Returns True if render would draw a different image than the last time:
+        a new pose has been committed, a setting changed, a shader variant is waiting to be swapped in or an object is animated
+        """
+        
+        if self.skeleton.getPoseFrameIndex() != self.sceneFrameIndex:
+            return True
+        
+        if self.sceneBlock.isDirty() == True:
+            return True
+        
+        if self.jointData.isDirty() == True or self.edgeData.isDirty() == True or self.objectData.isDirty() == True:
+            return True
+        
+        if self.shaderDefinesChanged == True or self.targetShaderProgram is not self.activeShaderProgram:
+            return True
+        
+        return self.isAnimated()
+        
+    def render(self, gl):
+        stageTime = time.perf_counter()
+        
+        if self.frameTime is not None:
+            self.recordStage("frame", self.frameTime)
+        self.frameTime = stageTime
+        
+        self.updateShaderProgram(gl)
+        
+        gl.glUseProgram(self.program)
+        self.bindRenderQuad(gl)
+        
+        elapsed_time = time.time() - self.start_time
+        
+        renderWidth, renderHeight = self.getRenderSize()
+        
+        if self.dynamicResolution == True:
+            # the framebuffer the caller wants to draw into, for QOpenGLWindow it isn't necessarily 0
+            windowFramebuffer = np.zeros(1, dtype=np.int32)
+            gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, windowFramebuffer)
             
-            objectPhase = self.objectPhases[oI]
-            uniformName = "objectPhases[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, objectPhase.tolist())
+            self.updateSceneFramebuffer(gl)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, self.sceneFramebuffer)
+            gl.glViewport(0, 0, renderWidth, renderHeight)
 
-        # object transforms
-        for oI in range(self.objectCount):
-            
-            objectTransform = self.objectTransforms[oI]
-            uniformName = "objectTransforms[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniformMatrix4fv(uniformLoc, 1, gl.GL_FALSE, objectTransform.tolist ())
-            
-        # object primitives
-        for oI in range(self.objectCount):
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        
+        gl.glUniform1f(self.shader_iGlobalTime, elapsed_time)
+        gl.glUniform2f(self.shader_iResolution, *self.resolution)
+        
+        # newest complete pose, the ingest thread won't touch it while we draw
+        pose = self.skeleton.acquirePoseSnapshot()
+        
+        if pose.frameIndex != self.sceneFrameIndex:
+            self.jointTransforms[:] = pose.jointTransforms
+            self.edgeTransforms[:] = pose.edgeTransforms
+            self.edgeLengths[:] = pose.edgeLengths
+            self.jointData.markDirty()
+            self.edgeData.markDirty()
+            self.sceneFrameIndex = pose.frameIndex
+        
+        # only the parts of the block and buffers written by setters or by a new pose since the last frame are uploaded
+        self.uploadPrimitiveBuffer(gl, self.jointData, self.jointDataBuffer, self.updateJointBounds)
+        self.uploadPrimitiveBuffer(gl, self.edgeData, self.edgeDataBuffer, self.updateEdgeBounds)
+        self.uploadPrimitiveBuffer(gl, self.objectData, self.objectDataBuffer, self.updateObjectBounds)
+        self.uploadPrimitiveBuffer(gl, self.bvhData, self.bvhDataBuffer)
+        
+        if self.tileBinning == True:
+            self.updateTileBins(gl)
+        
+        # the scene bound depends on the primitive bounds, so the block goes after the primitive buffers
+        if self.sceneBoundDirty == True:
+            self.updateSceneBound()
+        
+        if self.sceneBlock.isDirty() == True:
+            gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.sceneBuffer)
             
-            objectPrimitive = self.objectPrimitives[oI]
-            uniformName = "objectPrimitives[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1i(uniformLoc, objectPrimitive)
+            for start, end in self.sceneBlock.takeDirtyRanges():
+                gl.glBufferSubData(gl.GL_UNIFORM_BUFFER, start, end - start, self.sceneBlock.bytes[start:end])
         
-        # object sizes
-        for oI in range(self.objectCount):
+        stageTime = self.recordStage("upload", stageTime)
+        
+        # the measured time is tagged with the scale it was rendered at, results arrive a few frames later
+        self.gpuTimer.begin(gl, renderWidth / self.resolution[0])
+        gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)        
+        self.gpuTimer.end(gl)
+        
+        if self.dynamicResolution == True:
+            windowWidth, windowHeight = self.sceneFramebufferSize
             
-            objectSize = self.objectSizes[oI]
-            uniformName = "objectSizes[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform3fv(uniformLoc, 1, objectSize.tolist())
-
-        # object rounding
-        for oI in range(self.objectCount):
+            # upscale into the window
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.sceneFramebuffer)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, int(windowFramebuffer[0]))
+            gl.glViewport(0, 0, windowWidth, windowHeight)
+            gl.glBlitFramebuffer(0, 0, renderWidth, renderHeight, 0, 0, windowWidth, windowHeight, gl.GL_COLOR_BUFFER_BIT, gl.GL_LINEAR)
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, int(windowFramebuffer[0]))
             
-            objectRounding = self.objectRoundings[oI]
-            uniformName = "objectRoundings[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectRounding)
+        for gpuTime, scale in self.gpuTimer.takeResults(gl):
+            if self.dynamicResolution == True:
+                self.resolutionGovernor.update(gpuTime, scale)
+            if self.profiler is not None:
+                self.profiler.record("gpu", gpuTime)
                 
-        # object smooths
-        for oI in range(self.objectCount):
-            
-            objectSmooth = self.objectSmoothings[oI]
-            uniformName = "objectSmoothings[" + str(oI) + "]";
-            uniformLoc = gl.glGetUniformLocation(self.program, uniformName)
-            gl.glUniform1f(uniformLoc, objectSmooth)
-        
-        # combined smoothing factors
-        gl.glUniform1f(self.shader_jointEdgeSmoothing, self.jointEdgeSmoothing)
-        gl.glUniform1f(self.shader_skelObjectSmoothing, self.skelObjectSmoothing)
-
-
-        gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)        
+        self.recordStage("submit", stageTime)
         
     def setCamPosition(self, position):
         self.camPosition = position
+        self.sceneBlock["camPosition"] = position
         
     def setCamAngle(self, angle):
         self.camAngle = angle   
+        self.sceneBlock["camAngle"] = angle
         
     def setLightPosition(self, position):
         self.lightPosition = position
+        self.sceneBlock["lightPosition"] = position
         
     def setShadowStrength(self, strength):
         self.shadowStrength = strength;
+        self.sceneBlock["shadowStrength"] = strength
         
     def setShadowSmooth(self, smooth):
         self.shadowSmooth = smooth;
+        self.sceneBlock["shadowSmooth"] = smooth
         
     def setShadowSoftHardMixFactor(self, factor):
         self.shadowSoftHardMixFactor = factor;
         
     def setBGColor(self, color):
         self.bgColor = color
+        self.sceneBlock["bgColor"] = color
 
     def setBGOcclusionColor(self, color):
         self.bgOcclusionColor = color
+        self.sceneBlock["bgOcclusionColor"] = color
         
     def setFogMinDist(self, dist):
         self.fogMinDist = dist
+        self.sceneBlock["fog_min_dist"] = dist
         
     def setFogMaxDist(self, dist):
         self.fogMaxDist = dist
+        self.sceneBlock["fog_max_dist"] = dist
         
     def setJointColor(self, color):
         self.jointColor = color       
+        self.sceneBlock["jointColor"] = color
         
     def setJointAmbientScale(self, scale):
         self.jointAmbientScale = scale       
+        self.sceneBlock["jointAmbientScale"] = scale
 
     def setJointDiffuseScale(self, scale):
         self.jointDiffuseScale = scale      
+        self.sceneBlock["jointDiffuseScale"] = scale
 
     def setJointSpecularScale(self, scale):
         self.jointSpecularScale = scale     
+        self.sceneBlock["jointSpecularScale"] = scale
         
     def setJointSpecularPow(self, pow_):
         self.jointSpecularPow = pow_    
+        self.sceneBlock["jointSpecularPow"] = pow_
     
     def setJointOcclusionScale(self, scale):
         self.jointOcclusionScale = scale            
+        self.sceneBlock["jointOcclusionScale"] = scale
     
     def setJointOcclusionRange(self, range_):
         self.jointOcclusionRange = range_           
+        self.sceneBlock["jointOcclusionRange"] = range_
     
     def setJointOcclusionResolution(self, resolution):
         self.jointOcclusionResolution = resolution           
+        self.sceneBlock["jointOcclusionResolution"] = resolution
 
     def setJointOcclusionColor(self, color):
         self.jointOcclusionColor = color     
+        self.sceneBlock["jointOcclusionColor"] = color
     
     def setJointPrimitive(self, index, primitive):
         
-        if index >= self.shader_jointCount:
+        if index >= self.jointCount:
             return
         
         self.jointPrimitives[index] = primitive    
+        self.jointData.markDirty(index)
+        self.shaderDefinesChanged = True
 
     def setJointPrimitives(self, primitive):
         
         self.jointPrimitives[:] = primitive
+        self.jointData.markDirty()
+        self.shaderDefinesChanged = True
 
     def setJointSize(self, index, size):
         
-        if index >= self.shader_jointCount:
+        if index >= self.jointCount:
             return
         
         self.jointSizes[index] = size
+        self.jointData.markDirty(index)
         
     def setJointSizes(self, size):
         
         self.jointSizes[:] = size
+        self.jointData.markDirty()
         
     def setJointRounding(self, index, round):
         
-        if index >= self.shader_jointCount:
+        if index >= self.jointCount:
             return
         
         self.jointRoundings[index] = round
+        self.jointData.markDirty(index)
         
     def setJointRoundings(self, round):
         
         self.jointRoundings[:] = round
+        self.jointData.markDirty()
         
     def setJointSmoothing(self, index, smooth):
         
-        if index >= self.shader_jointCount:
+        if index >= self.jointCount:
             return
         
         self.jointSmoothings[index] = smooth
+        self.jointData.markDirty(index)
         
     def setJointSmoothings(self, smooth):
         
         self.jointSmoothings[:] = smooth   
+        self.jointData.markDirty()
 
     def setEdgeColor(self, color):
         self.edgeColor = color       
+        self.sceneBlock["edgeColor"] = color
         
     def setEdgeAmbientScale(self, scale):
         self.edgeAmbientScale = scale       
+        self.sceneBlock["edgeAmbientScale"] = scale
 
     def setEdgeDiffuseScale(self, scale):
         self.edgeDiffuseScale = scale      
+        self.sceneBlock["edgeDiffuseScale"] = scale
 
     def setEdgeSpecularScale(self, scale):
         self.edgeSpecularScale = scale     
+        self.sceneBlock["edgeSpecularScale"] = scale
         
     def setEdgeSpecularPow(self, pow_):
         self.edgeSpecularPow = pow_    
+        self.sceneBlock["edgeSpecularPow"] = pow_
     
     def setEdgeOcclusionScale(self, scale):
         self.edgeOcclusionScale = scale            
+        self.sceneBlock["edgeOcclusionScale"] = scale
     
     def setEdgeOcclusionRange(self, range_):
         self.edgeOcclusionRange = range_           
+        self.sceneBlock["edgeOcclusionRange"] = range_
     
     def setEdgeOcclusionResolution(self, resolution):
         self.edgeOcclusionResolution = resolution         
+        self.sceneBlock["edgeOcclusionResolution"] = resolution
         
     def setEdgeOcclusionColor(self, color):
         self.edgeOcclusionColor = color     
+        self.sceneBlock["edgeOcclusionColor"] = color
     
     def setEdgePrimitive(self, index, primitive):
         
-        if index >= self.shader_edgeCount:
+        if index >= self.edgeCount:
             return
         
         self.edgePrimitives[index] = primitive    
+        self.edgeData.markDirty(index)
+        self.shaderDefinesChanged = True
 
     def setEdgePrimitives(self, primitive):
         
         self.edgePrimitives[:] = primitive
+        self.edgeData.markDirty()
+        self.shaderDefinesChanged = True
 
     def setEdgeSize(self, index, size):
         
-        if index >= self.shader_edgeCount:
+        if index >= self.edgeCount:
             return
         
         self.edgeSizes[index] = size
+        self.edgeData.markDirty(index)
         
     def setEdgeSizes(self, size):
         
         self.edgeSizes[:] = size
+        self.edgeData.markDirty()
         
     def setEdgeRounding(self, index, round):
         
-        if index >= self.shader_edgeCount:
+        if index >= self.edgeCount:
             return
         
         self.edgeRoundings[index] = round
+        self.edgeData.markDirty(index)
         
     def setEdgeRoundings(self, round):
         
         self.edgeRoundings[:] = round
+        self.edgeData.markDirty()
         
     def setEdgeSmoothing(self, index, smooth):
         
-        if index >= self.shader_edgeCount:
+        if index >= self.edgeCount:
             return
         
         self.edgeSmoothings[index] = smooth
+        self.edgeData.markDirty(index)
         
     def setEdgeSmoothings(self, smooth):
         
         self.edgeSmoothings[:] = smooth   
+        self.edgeData.markDirty()
 
     def setObjectColor(self, index, color):
         
-        if index >= self.shader_edgeCount:
+        if index >= self.objectCount:
             return
         
         self.objectColors[index] = color     
+        self.objectData.markDirty(index)
         
     def setObjectColors(self, color):
         
         self.objectColors[:] = color
+        self.objectData.markDirty()
 
     def setObjectAmbientScale(self, index, scale):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectAmbientScales[index] = scale   
+        self.objectData.markDirty(index)
 
     def setObjectAmbientScales(self, scale):
         
         self.objectAmbientScales[:] = scale        
+        self.objectData.markDirty()
 
     def setObjectDiffuseScale(self, index, scale):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectDiffuseScales[index] = scale       
+        self.objectData.markDirty(index)
         
     def setObjectDiffuseScales(self, scale):
         
         self.objectDiffuseScales[:] = scale 
+        self.objectData.markDirty()
 
     def setObjectSpecularScale(self, index, scale):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectSpecularScales[index] = scale       
+        self.objectData.markDirty(index)
         
     def setObjectSpecularScales(self, scale):
         
         self.objectSpecularScales[:] = scale 
+        self.objectData.markDirty()
 
     def setObjectSpecularPow(self, index, pow_):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectSpecularPows[index] = pow_       
+        self.objectData.markDirty(index)
         
     def setObjectSpecularPows(self, pow_):
         
         self.objectSpecularPows[:] = pow_ 
+        self.objectData.markDirty()
         
     def setObjectOcclusionScale(self, index, scale):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectOcclusionScales[index] = scale       
+        self.objectData.markDirty(index)
         
     def setObjectOcclusionScales(self, scale):
         
         self.objectOcclusionScales[:] = scale 
+        self.objectData.markDirty()
 
     def setObjectOcclusionRange(self, index, range_):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectOcclusionRanges[index] = range_       
+        self.objectData.markDirty(index)
         
     def setObjectOcclusionRanges(self, range_):
         
         self.objectOcclusionRanges[:] = range_         
+        self.objectData.markDirty()
           
     def setObjectOcclusionResolution(self, index, resolution):
          
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
          
         self.objectOcclusionResolutions[index] = resolution       
+        self.objectData.markDirty(index)
          
     def setObjectOcclusionResolutions(self, resolution):
          
          self.objectOcclusionResolutions[:] = resolution      
+         self.objectData.markDirty()
 
     def setObjectOcclusionColor(self, index, color):
          
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
          
         self.objectOcclusionColors[index] = color       
+        self.objectData.markDirty(index)
          
     def setObjectOcclusionColors(self, color):
          
          self.objectOcclusionColors[:] = color  
+         self.objectData.markDirty()
          
     def setObjectFrequency(self, index, frequency):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectFrequencies[index] = frequency
+        self.objectData.markDirty(index)
         
     def setObjectFrequencies(self, frequency):
         
         self.objectFrequencies[:] = frequency        
+        self.objectData.markDirty()
 
     def setObjectAmplitude(self, index, amplitude):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectAmplitudes[index] = amplitude
+        self.objectData.markDirty(index)
+        self.shaderDefinesChanged = True
         
     def setObjectAmplitudes(self, amplitude):
         
         self.objectAmplitudes[:] = amplitude    
+        self.objectData.markDirty()
+        self.shaderDefinesChanged = True
 
     def setObjectPhase(self, index, phase):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectPhases[index] = phase
+        self.objectData.markDirty(index)
         
     def setObjectPhases(self, phase):
         
         self.objectPhases[:] = phase 
+        self.objectData.markDirty()
 
     def setObjectPrimitive(self, index, primitive):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectPrimitives[index] = primitive    
+        self.objectData.markDirty(index)
+        self.shaderDefinesChanged = True
 
     def setObjectPrimitives(self, primitive):
         
         self.objectPrimitives[:] = primitive
+        self.objectData.markDirty()
+        self.shaderDefinesChanged = True
 
     def setObjectSize(self, index, size):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectSizes[index] = size
+        self.objectData.markDirty(index)
         
     def setObjectSizes(self, size):
         
         self.objectSizes[:] = size
+        self.objectData.markDirty()
         
     def setObjectRounding(self, index, round):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectRoundings[index] = round
+        self.objectData.markDirty(index)
         
     def settObjectRoundings(self, round):
         
         self.objectRoundings[:] = round
+        self.objectData.markDirty()
         
     def setObjectSmoothing(self, index, smooth):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectSmoothings[index] = smooth
+        self.objectData.markDirty(index)
         
     def setObjectSmoothings(self, smooth):
         
         self.objectSmoothings[:] = smooth   
+        self.objectData.markDirty()
 
     def setObjectPosition(self, index, position):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectPositions[index] = position    
@@ -870,7 +1250,7 @@ class Visualization():
  
     def setObjectRotation(self, index, rotation):
         
-        if index >= self.shader_objectCount:
+        if index >= self.objectCount:
             return
         
         self.objectRotations[index] = rotation    
@@ -889,11 +1269,16 @@ class Visualization():
         objectRotMat = t3d.affines.compose(defaultPos, objectRotMat, defaultScale)
 
         self.objectTransforms[index] = np.transpose(np.matmul(objectRotMat, objectTransMat))
+        self.objectData.markDirty(index)
         
     def setJointEdgeSmoothing(self, smoothing):
         
         self.jointEdgeSmoothing = smoothing
+        self.sceneBlock["jointEdgeSmoothing"] = smoothing
+        self.sceneBoundDirty = True
         
     def setSkelObjectSmoothing(self, smoothing):
         
         self.skelObjectSmoothing = smoothing
+        self.sceneBlock["skelObjectSmoothing"] = smoothing
+        self.sceneBoundDirty = True
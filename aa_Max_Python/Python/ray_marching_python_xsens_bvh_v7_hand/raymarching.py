@@ -81,38 +81,42 @@ oscControl.fix_root = True
 GUI
 """
 
+# number of display refreshes per frame, frames are drawn after each buffer swap instead of by a timer
+swap_interval = 1
+
 frame_intervals = np.zeros(50)
 
 start_time = time.time()
 
 class MinimalGLWidget(QOpenGLWindow):
     
-    def __init__(self, visualization):
+    def __init__(self, visualization, swapInterval=1):
         self.visualization = visualization
         self.fullscreen = False
         
         super().__init__()
+        
+        # 0 doesn't wait for vsync
+        surfaceFormat = self.format()
+        surfaceFormat.setSwapInterval(swapInterval)
+        self.setFormat(surfaceFormat)
  
     
     def initializeGL(self):
         
         self.visualization.setupShader(gl)
 
-        self.renderTimer = QtCore.QTimer(self)
-        self.renderTimer.setInterval(1) # 40
-        self.renderTimer.timeout.connect(self.onRenderTimer)
-        self.renderTimer.start()
+        # the next frame is requested as soon as the previous one has been swapped
+        self.frameSwapped.connect(self.update)
+        self.update()
         
-    def onRenderTimer(self):
+    def paintGL(self):
         
         global start_time
         global frame_intervals
-        
-        frame_begin_time = time.time()
 
-        visualization.render(gl)
-        
-        self.update()
+        # render reads the newest pose right before drawing
+        self.visualization.render(gl)
         
         new_time = time.time()
         
@@ -139,7 +143,7 @@ class MinimalGLWidget(QOpenGLWindow):
 
 if __name__ == '__main__':
     app = QApplication([])
-    widget = MinimalGLWidget(visualization)
+    widget = MinimalGLWidget(visualization, swap_interval)
     widget.show()
     widget.resize(window_size[0], window_size[1])
     app.exec_()